@@ -1,31 +1,32 @@
 # app.py
 import streamlit as st
 import datetime
+import json
 import logging
-import os
-from pathlib import Path
 import pandas as pd
 from zoneinfo import ZoneInfo # Handle streamlit timezone
-import concurrent.futures
 
 # Local imports (adjust these as per your project structure)
-from eth_tools.room_allocation.room import Room
-from eth_tools.room_allocation.fix_scores import GetLocation
-from eth_tools.room_allocation.scraper import (
-    download_global_room_info,
-    load_global_room_info,
-    download_room_allocation,
-)
-from eth_tools.settings import ROOMS_DIR, ROOM_CONFIG
+from eth_tools.room_allocation.catalog import room_name
+from eth_tools.room_allocation.fix_scores import GetLocation, GetTypeScore
+from eth_tools.room_allocation.profiling import PROFILER
+from eth_tools.room_allocation.result_cache import ResultCache
+from eth_tools.room_allocation.scoring_config import FEATURES, default_scoring_config
+from eth_tools.room_allocation.service import RoomFinder
+from eth_tools.settings import SPREAD_HALF_LIFE
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 LOGGER = logging.getLogger(__name__)
-MAX_WORKERS = 8  # Adjust as needed
 
 # Define CET timezone (handles both CET and CEST automatically)
 CET = ZoneInfo("Europe/Zurich")
 
+# Age after which the shared room data is refreshed in the background
+DATA_TTL = datetime.timedelta(minutes=15)
+
+ROOM_TYPES = list(GetTypeScore().room_types_and_scores)
+
 def main():
     st.title("ETHZ Empty Room Finder")
 
@@ -33,6 +34,8 @@ def main():
     locations = GetLocation().locations
     location = st.selectbox("Select Location", options=locations)
     building = st.text_input("Building (optional)")
+    room_type = st.selectbox("Room type (optional)", options=[""] + ROOM_TYPES)
+    min_seats = st.number_input("Minimum number of seats", min_value=0, value=0)
     duration = st.number_input("Duration in hours", min_value=1, value=4)
     date = st.date_input("Date", value=datetime.date.today())
     
@@ -41,21 +44,43 @@ def main():
     time = st.time_input("Time", key="time")
     
     top_n = st.number_input("Number of top rooms to display", min_value=1, value=10)
+    free_only = st.checkbox("Only rooms that are free for the whole duration")
+    spread = st.checkbox(
+        "Spread students over more rooms",
+        help=(
+            "Rooms recommended often recently are ranked lower. A recommendation counts "
+            f"half after {SPREAD_HALF_LIFE.total_seconds() / 60:.0f} minutes."
+        ),
+    )
     user_force_update = st.checkbox("Force update room info")
+    scoring = scoring_sliders()
 
     # When the user clicks the 'Search' button
-    if st.button("Search"):
+    search = st.button("Search")
+    if search:
         # Combine date and time into a timezone-aware datetime object
         when = datetime.datetime.combine(date, time).replace(tzinfo=CET)
+        st.session_state["search"] = dict(
+            location=location,
+            duration=duration,
+            when=when,
+            top=top_n,
+            building=building,
+            free_only=free_only,
+            room_type=room_type or None,
+            min_seats=min_seats or None,
+            spread=spread,
+        )
+    # The last search is re-ranked when the scoring sliders change
+    if "search" in st.session_state:
         # Run the room search
         with st.spinner("Searching for available rooms..."):
             results = run_search(
-                location=location,
-                duration=duration,
-                when=when,
-                top=top_n,
-                building=building,
-                user_force_update=user_force_update
+                **st.session_state["search"],
+                user_force_update=search and user_force_update,
+                scoring=scoring,
+                # Recommendations are counted once per search, not per slider change
+                record=search,
             )
         # Display the results
         if results is not None and not results.empty:
@@ -64,7 +89,75 @@ def main():
         else:
             st.warning("No rooms found.")
 
-def run_search(location, duration, when, top, building, user_force_update):
+    show_metrics()
+
+def scoring_sliders():
+    """
+    Sidebar with the weights and parameters of the score, defaults from scoring.json.
+    Changing only the weights re-ranks the features of the last search.
+    """
+    config = default_scoring_config()
+    with st.sidebar.expander("Scoring"):
+        weights = [
+            st.slider(name.replace("_", " ").capitalize(), 0.0, 1.0, weight, step=0.01)
+            for name, weight in zip(FEATURES, config.weights)
+        ]
+        next_slot_hours = st.slider(
+            "Hours before the next slot for max points",
+            0.5,
+            max(8.0, config.next_slot_hours),
+            float(config.next_slot_hours),
+            step=0.5,
+        )
+        evening_hour = st.slider("Rooms close at (hour)", 1, 23, config.evening_hour)
+    return config.with_weights(weights)._replace(
+        next_slot_hours=next_slot_hours, evening_hour=evening_hour
+    )
+
+def show_metrics():
+    """
+    Panel with the phase timings and counters collected by all sessions of this process.
+    """
+    with st.sidebar.expander("Metrics"):
+        PROFILER.enable(st.checkbox("Collect metrics", value=PROFILER.enabled))
+        snapshot = PROFILER.snapshot()
+        if snapshot["phases"]:
+            st.dataframe(pd.DataFrame(snapshot["phases"]).set_index("phase").round(2))
+        if snapshot["counters"]:
+            st.dataframe(pd.Series(snapshot["counters"], name="value").sort_index())
+        st.download_button(
+            "Download Chrome trace",
+            data=json.dumps(PROFILER.chrome_trace(), default=str),
+            file_name="find-room-trace.json",
+            mime="application/json",
+        )
+        if st.button("Reset metrics"):
+            PROFILER.reset()
+
+@st.cache_resource(show_spinner="Loading room data...")
+def get_room_finder():
+    """
+    Process-wide room data shared by all sessions, search results are shared with
+    the CLI (--result_cache).
+    """
+    finder = RoomFinder(result_cache=ResultCache.shared())
+    finder.load()
+    return finder
+
+def run_search(
+    location,
+    duration,
+    when,
+    top,
+    building,
+    user_force_update,
+    free_only=False,
+    room_type=None,
+    min_seats=None,
+    scoring=None,
+    spread=False,
+    record=True,
+):
     # Validity check
     VALID_LOCATIONS = GetLocation().locations
     if location not in VALID_LOCATIONS:
@@ -78,97 +171,76 @@ def run_search(location, duration, when, top, building, user_force_update):
     from_date = when
     to_date = from_date + datetime.timedelta(hours=duration)
 
-    # Initialize force_update based on user input
-    force_update = user_force_update
-
     # Ensure data availability
-    room_info = None
-    if os.path.exists(ROOM_CONFIG) and os.path.exists(ROOMS_DIR) and not force_update:
-        room_info = load_global_room_info(ROOM_CONFIG)
-        target_rooms = get_rooms_info(room_info["rooms"], location, building)
-        target_rooms_names = {f"{room['building']}-{room['floor']}-{room['room']}" for room in target_rooms}
-        downloaded_rooms = {room.stem for room in Path(ROOMS_DIR).iterdir() if room.suffix == ".json"}
-
-        missing_rooms = target_rooms_names - downloaded_rooms
-        if missing_rooms:
-            st.info(f"{len(missing_rooms)} rooms are missing. Updating room information...")
-            force_update = True
-    else:
-        if user_force_update:
-            st.info("Force update flag is set. Updating room information...")
-        else:
-            st.info("Room information not found. Downloading room information...")
-        force_update = True
-
-    if force_update:
-        try:
-            global_room_info_path = download_global_room_info()
-            room_info = load_global_room_info(global_room_info_path)
-            rooms = get_rooms_info(room_info["rooms"], location, building)
-            total_rooms = len(rooms)
+    try:
+        finder = get_room_finder()
+    except Exception as e:
+        LOGGER.error(f"Error during room information update: {e}")
+        st.error(f"Error during room information update: {e}")
+        return None
 
-            if total_rooms == 0:
-                st.warning("No rooms found with the specified criteria.")
-                return None
+    target_rooms = get_rooms_info(
+        finder.snapshot.catalog, location, building, room_type, min_seats
+    )
+    if not target_rooms:
+        st.warning("No rooms found with the specified criteria.")
+        return None
 
-            # Process rooms in parallel
+    # Rooms without data for the requested window are downloaded before scoring,
+    # outdated data of all rooms is refreshed once in the background for all sessions.
+    if user_force_update:
+        st.info("Force update flag is set. Updating room allocations...")
+        rooms = [room_name(room) for room in target_rooms]
+    else:
+        rooms = finder.uncovered_rooms(
+            (room_name(room) for room in target_rooms), (from_date, to_date)
+        )
+        if rooms:
+            st.info(f"{len(rooms)} rooms are missing. Updating room allocations...")
+    if rooms:
+        try:
             with st.spinner("Downloading room allocations..."):
-                with concurrent.futures.ThreadPoolExecutor(max_workers=MAX_WORKERS) as executor:
-                    futures = [
-                        executor.submit(
-                            download_room_allocation,
-                            room=f"{room_data['building']} {room_data['floor']} {room_data['room']}",
-                            from_date=from_date.date().isoformat(),
-                            to_date=(from_date.date() + datetime.timedelta(days=7)).isoformat(),
-                        )
-                        for room_data in rooms
-                    ]
-
-                    progress_bar = st.progress(0)  # Initialize progress bar
-                    for i, future in enumerate(concurrent.futures.as_completed(futures), 1):
-                        try:
-                            future.result()
-                            progress_bar.progress(i / total_rooms)
-                        except Exception as e:
-                            LOGGER.error(f"Failed to download room {i}: {e}")
-                            st.error(f"Failed to download room {i}: {e}")
+                progress_bar = st.progress(0)  # Initialize progress bar
+                finder.refresh(
+                    force=user_force_update,
+                    rooms=rooms,
+                    window=(from_date, to_date),
+                    progress=lambda done, total: progress_bar.progress(done / total),
+                )
                 progress_bar.empty()  # Remove progress bar after completion
-
             st.success("All room allocations have been processed.")
         except Exception as e:
-            LOGGER.error(f"Error during room information update: {e}")
-            st.error(f"Error during room information update: {e}")
+            LOGGER.error(f"Error during room allocation update: {e}")
+            st.error(f"Error during room allocation update: {e}")
             return None
+    elif finder.is_stale(DATA_TTL) and finder.refresh_in_background():
+        LOGGER.info("Refreshing room data in the background.")
 
     # Calculate scores
-    scores = {}
     try:
-        for room_file in sorted(Path(ROOMS_DIR).iterdir()):
-            if room_file.suffix != ".json":
-                continue
-
-            room = Room(room_file, ROOM_CONFIG)
-
-            if room.room_info["location"]["areaDesc"] != location:
-                continue
-
-            if building and room.room_info["building"] != building:
-                continue
-
-            score = room.get_score(current_location=location, datetime_to=to_date)
-            scores[room.metadata['room']] = score
+        top_rooms = finder.search(
+            location,
+            building,
+            from_date,
+            duration,
+            top,
+            free_only,
+            room_type=room_type,
+            min_seats=min_seats,
+            scoring=scoring,
+            spread=spread,
+            record=record,
+        )
     except Exception as e:
         LOGGER.error(f"Error calculating scores: {e}")
         st.error(f"Error calculating scores: {e}")
         return None
 
-    if not scores:
+    if not top_rooms:
         st.warning("No rooms matched the criteria after processing.")
         return None
 
-    # Sort and prepare the results
-    sorted_scores = sorted(scores.items(), key=lambda x: x[1], reverse=True)
-    top_rooms = sorted_scores[:top] if top <= len(sorted_scores) else sorted_scores
+    # Prepare the results
     results = [{"Room": room, "Score": f"{score:.1f}"} for room, score in top_rooms]
 
     # Convert to DataFrame with custom index starting at 1
@@ -178,17 +250,15 @@ def run_search(location, duration, when, top, building, user_force_update):
 
     return df
 
-def get_rooms_info(rooms, location, building=None):
+def get_rooms_info(catalog, location, building=None, room_type=None, min_seats=None):
     """
-    Get rooms info from global room info.
+    Get rooms info from the room catalog.
     """
-    rooms_info = [room for room in rooms if room["location"]["areaDesc"] == location]
+    rooms_info = catalog.select(location, building, room_type, min_seats)
 
-    if building:
-        rooms_info = [room for room in rooms_info if room["building"] == building]
-        if not rooms_info:
-            st.error(f"No rooms found in building {building}. Check building name.")
-            return []
+    if building and not catalog.select(location, building):
+        st.error(f"No rooms found in building {building}. Check building name.")
+        return []
     return rooms_info
 
 if __name__ == '__main__':
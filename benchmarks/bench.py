@@ -0,0 +1,364 @@
+"""
+Benchmark suite of the loading and scoring paths.
+1. Generate synthetic fixtures for every requested (rooms, days) scale
+2. Time cold loading, warm scoring, top-k selection and the full `find-room` run
+3. Record the peak memory of every benchmark and write all results as JSON
+4. Check the startup of `find-room --help` and of a warm query against their budgets
+   and `--help` against heavy imports (`python -X importtime`)
+
+Usage:
+    python -m benchmarks.bench --rooms 100 1000 10000 --days 1 7 30 --output results.json
+    python -m benchmarks.bench --compare previous.json
+    python -m benchmarks.bench --rooms 100 --check  # Fails on startup regressions
+"""
+import argparse
+import datetime
+import gc
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from typing import Callable, List, Optional
+
+import numpy as np
+
+from benchmarks.fixtures import START_DATE, Fixture, generate
+from eth_tools.room_allocation import catalog as catalog_module
+from eth_tools.room_allocation.allocation_cache import (
+    load_allocation_store,
+    save_allocation_store,
+)
+from eth_tools.room_allocation.allocations import CET, AllocationStore
+from eth_tools.room_allocation.bucket_index import FreeRoomIndex
+from eth_tools.room_allocation.catalog import load_room_catalog, room_name
+from eth_tools.room_allocation.ingest import default_workers
+from eth_tools.room_allocation.room import Room
+from eth_tools.room_allocation.run import get_rooms_info
+from eth_tools.room_allocation.scoring import (
+    WEIGHTS,
+    feature_matrix,
+    score_rooms,
+    top_k,
+    weighted_sum,
+)
+from eth_tools.room_allocation.scraper import load_room_allocations
+
+LOCATION = "Zürich Zentrum"
+WHEN = datetime.datetime.combine(START_DATE, datetime.time(10)).replace(tzinfo=CET)
+DURATION = datetime.timedelta(hours=4)
+TOP = 10
+
+# Seconds a process may take on top of the bare interpreter startup (checked by --check)
+STARTUP_BUDGETS = {"startup_help": 0.1, "pipeline_warm": 0.5}
+# Modules that `find-room --help` must not import
+HELP_FORBIDDEN_IMPORTS = ("numpy", "tabulate", "requests", "aiohttp", "asyncio")
+
+
+def measure(fn: Callable, repeat: int = 5, setup: Optional[Callable] = None) -> dict:
+    """Returns the timings (seconds) and the peak memory (MB) of the given function
+
+    The peak memory is traced in an extra run, as tracing slows down the timed runs.
+    """
+    timings = []
+    for _ in range(repeat):
+        if setup is not None:
+            setup()
+        gc.collect()
+        start = time.perf_counter()
+        fn()
+        timings.append(time.perf_counter() - start)
+
+    if setup is not None:
+        setup()
+    gc.collect()
+    tracemalloc.start()
+    fn()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return dict(
+        repeat=repeat,
+        min_s=min(timings),
+        median_s=statistics.median(timings),
+        mean_s=statistics.fmean(timings),
+        peak_mb=peak / 2**20,
+    )
+
+
+def _clear_catalogs():
+    catalog_module._CATALOGS.clear()
+
+
+def run_process(fixture: Fixture, *args: str, python_args: tuple = ()) -> tuple:
+    """Runs a Python process on the given fixture
+
+    Returns:
+        tuple -- Wall time in seconds and stderr of the process
+    """
+    env = dict(os.environ, ETH_TOOLS_DATA_DIR=fixture.directory)
+    start = time.perf_counter()
+    process = subprocess.run(
+        [sys.executable, *python_args, *args], env=env, check=True, capture_output=True, text=True
+    )
+    return time.perf_counter() - start, process.stderr
+
+
+def run_find_room(fixture: Fixture, *args: str, python_args: tuple = ()) -> tuple:
+    """Runs `find-room` with the given arguments, see `run_process`."""
+    return run_process(
+        fixture, "-m", "eth_tools.room_allocation.run", *args, python_args=python_args
+    )
+
+
+def imported_modules(importtime: str) -> tuple:
+    """Parses the `-X importtime` output of a process
+
+    Returns:
+        tuple -- Cumulative import time in seconds per module and the total import time
+            (of the modules imported at the top level)
+    """
+    modules, total = {}, 0.0
+    for line in importtime.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        _, cumulative, name = line.split("|")
+        if cumulative.strip().isdigit():
+            modules[name.strip()] = int(cumulative) / 1e6
+            if not name[1:].startswith(" "):
+                total += int(cumulative) / 1e6
+    return modules, total
+
+
+def _timings(timings: List[float]) -> dict:
+    return dict(
+        repeat=len(timings),
+        min_s=min(timings),
+        median_s=statistics.median(timings),
+        mean_s=statistics.fmean(timings),
+        peak_mb=None,  # Not traced in the child process
+    )
+
+
+def bench_fixture(fixture: Fixture, repeat: int, legacy_limit: int) -> List[dict]:
+    """Returns the results of all benchmarks on the given fixture"""
+    window = (WHEN, WHEN + DURATION)
+    results = []
+
+    def record(name, result, **extra):
+        result = dict(
+            name=name, rooms=fixture.rooms, days=fixture.days, slots=fixture.slots, **result
+        )
+        result.update(extra)
+        results.append(result)
+        peak = "-" if result["peak_mb"] is None else f"{result['peak_mb']:.1f}"
+        print(
+            f"{name:<24} rooms={fixture.rooms:<6} days={fixture.days:<3} "
+            f"median={result['median_s'] * 1000:10.2f} ms  peak={peak:>8} MB"
+        )
+
+    # Cold loading
+    record(
+        "catalog_load",
+        measure(lambda: load_room_catalog(fixture.room_info), repeat, setup=_clear_catalogs),
+    )
+    catalog = load_room_catalog(fixture.room_info)
+    record(
+        "get_rooms_info",
+        measure(lambda: get_rooms_info(catalog, LOCATION), repeat),
+    )
+    record("json_load", measure(lambda: load_room_allocations(fixture.rooms_dir), repeat))
+
+    filepaths = sorted(
+        os.path.join(fixture.rooms_dir, filename)
+        for filename in os.listdir(fixture.rooms_dir)
+        if filename.endswith(".json")
+    )
+    record(
+        "store_build_serial",
+        measure(lambda: AllocationStore.from_files(filepaths, workers=1), repeat),
+    )
+    record(
+        "store_build",
+        measure(lambda: AllocationStore.from_files(filepaths), repeat),
+        workers=default_workers(),
+    )
+    store = AllocationStore.from_files(filepaths)
+    store_dir = os.path.join(fixture.directory, "store")
+    record("store_save", measure(lambda: save_allocation_store(store, store_dir), repeat))
+    record("store_load_mmap", measure(lambda: load_allocation_store(store_dir), repeat))
+
+    # Warm scoring
+    candidates = sorted(get_rooms_info(catalog, LOCATION), key=room_name)
+    record(
+        "score_rooms",
+        measure(lambda: score_rooms(candidates, LOCATION, window, store, top=TOP), repeat),
+        candidates=len(candidates),
+    )
+    features = feature_matrix(candidates, LOCATION, window, store)
+    scores = weighted_sum(features, WEIGHTS)
+    record("top_k", measure(lambda: top_k(scores, TOP), repeat), candidates=len(candidates))
+    record(
+        "full_sort",
+        measure(lambda: np.argsort(-scores, kind="stable")[:TOP], repeat),
+        candidates=len(candidates),
+    )
+    record("free_index_build", measure(lambda: FreeRoomIndex.from_store(store), repeat))
+    index = FreeRoomIndex.from_store(store)
+    record("free_rooms", measure(lambda: index.free_rooms(*window), repeat))
+
+    # Per-room path of `Room`, limited as it scales with the number of slots
+    legacy = filepaths[:legacy_limit]
+    rooms = []
+    record(
+        "room_construct",
+        measure(
+            lambda: rooms.extend(Room(filepath, fixture.room_info) for filepath in legacy),
+            repeat,
+            setup=rooms.clear,
+        ),
+        limit=len(legacy),
+    )
+    located = [room for room in rooms if room.room_info["location"]["areaDesc"] == LOCATION]
+    record(
+        "room_get_score",
+        measure(lambda: [room.get_score(LOCATION, *window) for room in located], repeat),
+        candidates=len(located),
+    )
+
+    # Process startup and full pipeline of `find-room`
+    interpreter = _timings([run_process(fixture, "-c", "pass")[0] for _ in range(repeat)])
+    record("interpreter", interpreter)
+
+    def record_budget(name, timings, **extra):
+        result = _timings(timings)
+        result["overhead_s"] = result["median_s"] - interpreter["median_s"]
+        if name in STARTUP_BUDGETS:
+            result["budget_s"] = STARTUP_BUDGETS[name]
+            result["within_budget"] = result["overhead_s"] <= STARTUP_BUDGETS[name]
+        record(name, result, **extra)
+
+    _, importtime = run_find_room(fixture, "--help", python_args=("-X", "importtime"))
+    modules, import_s = imported_modules(importtime)
+    record_budget(
+        "startup_help",
+        [run_find_room(fixture, "--help")[0] for _ in range(repeat)],
+        import_s=import_s,
+        imported=len(modules),
+        forbidden_imports=sorted(
+            module for module in modules if module.split(".")[0] in HELP_FORBIDDEN_IMPORTS
+        ),
+    )
+    query = ("-l", LOCATION, "--when", WHEN.strftime("%Y-%m-%dT%H:%M:%S"), "--top", str(TOP))
+    record_budget("pipeline_cold", [run_find_room(fixture, *query)[0]])  # Builds the cache
+    record_budget("pipeline_warm", [run_find_room(fixture, *query)[0] for _ in range(repeat)])
+    return results
+
+
+def check(results: List[dict]) -> List[str]:
+    """Returns the startup budget and import violations of the given results"""
+    violations = []
+    for result in results:
+        where = f"{result['name']} (rooms={result['rooms']}, days={result['days']})"
+        if result.get("within_budget") is False:
+            violations.append(
+                f"{where}: {result['overhead_s'] * 1000:.0f} ms over the interpreter startup, "
+                f"budget {result['budget_s'] * 1000:.0f} ms"
+            )
+        if result.get("forbidden_imports"):
+            violations.append(f"{where}: imports {', '.join(result['forbidden_imports'])}")
+    return violations
+
+
+def _git_revision() -> Optional[str]:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "HEAD"],
+            cwd=os.path.dirname(os.path.abspath(__file__)),
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(results: List[dict], previous_path: str):
+    """Prints the median time of every benchmark relative to a previous result file."""
+    with open(previous_path) as f:
+        previous = {
+            (result["name"], result["rooms"], result["days"]): result
+            for result in json.load(f)["results"]
+        }
+    print(f"\nCompared to {previous_path}:")
+    for result in results:
+        before = previous.get((result["name"], result["rooms"], result["days"]))
+        if before is None or not before["median_s"]:
+            continue
+        ratio = result["median_s"] / before["median_s"]
+        print(
+            f"{result['name']:<24} rooms={result['rooms']:<6} days={result['days']:<3} "
+            f"{ratio:6.2f}x"
+        )
+
+
+def main():
+    """Run benchmark suite."""
+    parser = argparse.ArgumentParser(description="Benchmarks of the room loading and scoring.")
+    parser.add_argument("--rooms", type=int, nargs="+", default=[100, 1000], help="Room counts.")
+    parser.add_argument("--days", type=int, nargs="+", default=[7], help="Days of slots.")
+    parser.add_argument("--repeat", type=int, default=5, help="Timed runs per benchmark.")
+    parser.add_argument(
+        "--legacy_limit",
+        type=int,
+        default=1000,
+        help="Maximum number of rooms of the per-room `Room` benchmarks.",
+    )
+    parser.add_argument("--seed", type=int, default=0, help="Random seed of the fixtures.")
+    parser.add_argument(
+        "--output", type=str, default="benchmark_results.json", help="JSON result file."
+    )
+    parser.add_argument("--compare", type=str, help="Previous JSON result file to compare to.")
+    parser.add_argument(
+        "--check",
+        action="store_true",
+        help="Exit with an error if a startup budget is exceeded or --help imports heavy modules.",
+    )
+    args = parser.parse_args()
+
+    results = []
+    for n_rooms in args.rooms:
+        for days in args.days:
+            with tempfile.TemporaryDirectory() as directory:
+                fixture = generate(directory, rooms=n_rooms, days=days, seed=args.seed)
+                results.extend(bench_fixture(fixture, args.repeat, args.legacy_limit))
+
+    with open(args.output, "w") as f:
+        json.dump(
+            dict(
+                created_at=datetime.datetime.now().isoformat(timespec="seconds"),
+                revision=_git_revision(),
+                python=platform.python_version(),
+                numpy=np.__version__,
+                platform=platform.platform(),
+                results=results,
+            ),
+            f,
+            indent=2,
+        )
+    print(f"Results written to {args.output}")
+    if args.compare:
+        compare(results, args.compare)
+    if args.check:
+        violations = check(results)
+        for violation in violations:
+            print(f"Startup regression: {violation}")
+        if violations:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,126 @@
+"""
+Synthetic campus-scale fixtures in the format written by the scraper.
+1. Generate room_info.json with rooms spread over all locations, types and sizes
+2. Generate one allocation file per room with a day of slots per day, closed over
+   night (belegungsserie.belegungstyp, date_from/date_to as returned by the ETH API)
+3. Stamp the files as freshly downloaded so that no refresh is planned
+"""
+import datetime
+import json
+import os
+import random
+from typing import NamedTuple
+
+from eth_tools.room_allocation.fix_scores import GetLocation, GetTypeScore
+
+START_DATE = datetime.date(2024, 3, 4)  # A Monday, fixed to keep results comparable
+ROOMS_PER_BUILDING = 20
+OPENING_HOUR = 7
+CLOSING_HOUR = 22
+# belegungstyp -> relative frequency, 7 = "frei", 15 = "Studierendenarbeitsplätze",
+# 8 = "geschlossen", other types are lectures, exams, events, ...
+SLOT_TYPES = {1: 40, 2: 10, 3: 5, 7: 20, 8: 10, 15: 15}
+
+
+class Fixture(NamedTuple):
+    directory: str
+    room_info: str
+    rooms_dir: str
+    rooms: int
+    days: int
+    slots: int
+
+
+def _room_infos(n_rooms: int, rng: random.Random) -> list:
+    locations = GetLocation().locations
+    types = list(GetTypeScore().room_types_and_scores)
+    rooms = []
+    for i in range(n_rooms):
+        building = i // ROOMS_PER_BUILDING
+        rooms.append(
+            dict(
+                building=f"B{building:03d}",
+                floor=f"{(i // 10) % 5}",
+                room=f"{100 + i % ROOMS_PER_BUILDING}",
+                # Zürich Zentrum (the benchmarked location) first
+                location=dict(areaDesc=locations[-1 - building % len(locations)]),
+                type=rng.choice(types),
+                seats=str(rng.randint(5, 400)),
+            )
+        )
+    return rooms
+
+
+def _allocation(days: int, rng: random.Random) -> list:
+    allocation = []
+    types, weights = list(SLOT_TYPES), list(SLOT_TYPES.values())
+    for day in range(days):
+        date = START_DATE + datetime.timedelta(days=day)
+        minute = OPENING_HOUR * 60 + rng.choice([0, 15, 30, 45])
+        while True:
+            length = rng.choice([45, 60, 90, 120, 180])
+            if minute + length > CLOSING_HOUR * 60:
+                break
+            start = datetime.datetime.combine(date, datetime.time()) + datetime.timedelta(
+                minutes=minute
+            )
+            end = start + datetime.timedelta(minutes=length)
+            allocation.append(
+                dict(
+                    date_from=start.isoformat(),
+                    date_to=end.isoformat(),
+                    belegungsserie=dict(belegungstyp=rng.choices(types, weights)[0]),
+                )
+            )
+            minute += length + rng.choice([0, 0, 15, 30, 60])
+        # Rooms are closed over night
+        allocation.append(
+            dict(
+                date_from=f"{date.isoformat()}T{CLOSING_HOUR}:00:00",
+                date_to=f"{date.isoformat()}T23:59:00",
+                belegungsserie=dict(belegungstyp=8),
+            )
+        )
+    rng.shuffle(allocation)  # The API does not return the slots in order
+    return allocation
+
+
+def generate(directory: str, rooms: int = 1000, days: int = 7, seed: int = 0) -> Fixture:
+    """Writes a fixture of the given scale to the given directory
+
+    Arguments:
+        directory {str} -- Data directory (used as ETH_TOOLS_DATA_DIR)
+
+    Keyword Arguments:
+        rooms {int} -- Number of rooms (default: {1000})
+        days {int} -- Days of slots per room, starting at START_DATE (default: {7})
+        seed {int} -- Random seed (default: {0})
+
+    Returns:
+        Fixture -- Paths and size of the fixture
+    """
+    rng = random.Random(seed)
+    rooms_dir = os.path.join(directory, "room_allocations")
+    os.makedirs(rooms_dir, exist_ok=True)
+    downloaded_at = datetime.datetime.now().isoformat(timespec="seconds")
+
+    room_infos = _room_infos(rooms, rng)
+    room_info = os.path.join(directory, "room_info.json")
+    with open(room_info, "w") as f:
+        json.dump(dict(rooms=room_infos, metadata=dict(ts=downloaded_at)), f)
+
+    n_slots = 0
+    to_date = (START_DATE + datetime.timedelta(days=days)).isoformat()
+    for info in room_infos:
+        name = f"{info['building']} {info['floor']} {info['room']}"
+        allocation = _allocation(days, rng)
+        n_slots += len(allocation)
+        metadata = dict(
+            room=name,
+            from_date=START_DATE.isoformat(),
+            to_date=to_date,
+            downloaded_at=downloaded_at,
+        )
+        with open(os.path.join(rooms_dir, f"{'-'.join(name.split())}.json"), "w") as f:
+            json.dump(dict(room_allocation=allocation, metadata=metadata), f)
+    return Fixture(directory, room_info, rooms_dir, rooms, days, n_slots)
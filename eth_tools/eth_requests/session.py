@@ -4,11 +4,13 @@
 
 from requests import Session
 
+DEFAULT_HEADERS = {"User-Agent": "Mozilla/5.0", "Accept": "*/*"}
+
 
 class ETHSession(Session):
     def __init__(self) -> None:
         super().__init__()
-        self.headers.update({"User-Agent": "Mozilla/5.0", "Accept": "*/*"})
+        self.headers.update(DEFAULT_HEADERS)
 
 
 class ETHSessionWithAuth(ETHSession):
@@ -1,3 +1,20 @@
-"""ETH tools room allocation scraper and score calculator."""
+"""ETH tools room allocation scraper and score calculator.
 
-from .run import main as run_main
\ No newline at end of file
+Submodules are imported on first use, so that `find-room --help` does not load
+numpy or the HTTP clients.
+"""
+
+
+def run_main():
+    """Entry point of `find-room`."""
+    from .run import main
+
+    main()
+
+
+def __getattr__(name: str):
+    if name == "score_rooms":
+        from .scoring import score_rooms
+
+        return score_rooms
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -0,0 +1,171 @@
+"""
+Persistent binary cache of the allocation store.
+1. Save the store as one .npy file per column plus a JSON index
+2. Load the store memory-mapped, without parsing any allocation file
+3. Merge freshly downloaded allocation files into the cache
+4. Refresh the metadata of rooms whose download was unchanged
+
+The JSON files written by the scraper are only read when merging them into the
+cache; queries read the cache.
+"""
+import json
+import os
+import shutil
+import time
+from typing import Dict, Iterable, Optional
+
+import numpy as np
+
+from eth_tools.room_allocation.allocations import AllocationStore
+from eth_tools.room_allocation.profiling import count, span, timed
+from eth_tools.settings import ALLOCATION_STORE, ROOMS_DIR
+
+COLUMNS = ("room", "start", "end", "typ", "rank")
+INDEX_FILE = "index.json"
+KEEP_VERSIONS = 2  # Readers may still be opening the previous version
+
+
+def _save_index(store: AllocationStore, directory: str) -> str:
+    """Atomically replaces the index with the one of the given store version"""
+    index_path = os.path.join(directory, INDEX_FILE)
+    tmp_path = f"{index_path}.{time.time_ns():x}.tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(
+            dict(
+                version=store.version,
+                rooms=store.names,
+                metadata=store.metadata,
+                max_duration=store.max_duration,
+            ),
+            f,
+        )
+    os.replace(tmp_path, index_path)
+    return index_path
+
+
+@timed("index.save_store")
+def save_allocation_store(store: AllocationStore, directory: str = ALLOCATION_STORE) -> str:
+    """Saves the store as a new version of the cache
+
+    The columns are written to a new version directory before the index is atomically
+    replaced, so concurrent readers always see a complete version.
+
+    Arguments:
+        store {AllocationStore} -- Store to save
+
+    Keyword Arguments:
+        directory {str} -- Cache directory (default: {ALLOCATION_STORE})
+
+    Returns:
+        str -- Path to the index file
+    """
+    version = f"{time.time_ns():x}"
+    os.makedirs(os.path.join(directory, version))
+    for column in COLUMNS:
+        np.save(os.path.join(directory, version, f"{column}.npy"), getattr(store, column))
+
+    store.version = version
+    index_path = _save_index(store, directory)
+
+    versions = sorted(
+        (entry for entry in os.listdir(directory) if os.path.isdir(os.path.join(directory, entry))),
+        key=lambda entry: int(entry, 16),
+    )
+    for old_version in versions[:-KEEP_VERSIONS]:
+        shutil.rmtree(os.path.join(directory, old_version), ignore_errors=True)
+    return index_path
+
+
+@timed("load.store")
+def load_allocation_store(
+    directory: str = ALLOCATION_STORE, mmap: bool = True
+) -> Optional[AllocationStore]:
+    """Loads the cached store
+
+    Keyword Arguments:
+        directory {str} -- Cache directory (default: {ALLOCATION_STORE})
+        mmap {bool} -- Memory-map the columns instead of reading them (default: {True})
+
+    Returns:
+        AllocationStore -- Cached store or None if there is no cache yet
+    """
+    index_path = os.path.join(directory, INDEX_FILE)
+    if not os.path.exists(index_path):
+        return None
+    with open(index_path, "r") as fh:
+        index = json.load(fh)
+
+    columns = {
+        column: np.load(
+            os.path.join(directory, index["version"], f"{column}.npy"),
+            mmap_mode="r" if mmap else None,
+        )
+        for column in COLUMNS
+    }
+    store = AllocationStore(
+        index["rooms"], metadata=index["metadata"], max_duration=index["max_duration"], **columns
+    )
+    store.version = index["version"]
+    return store
+
+
+def update_allocation_store(
+    filepaths: Iterable[str],
+    directory: str = ALLOCATION_STORE,
+    metadata: Optional[Dict[str, dict]] = None,
+) -> Optional[AllocationStore]:
+    """Merges the given allocation files into the cache
+
+    Arguments:
+        filepaths {Iterable[str]} -- Paths to (re-)downloaded allocation files
+
+    Keyword Arguments:
+        directory {str} -- Cache directory (default: {ALLOCATION_STORE})
+        metadata {dict} -- New metadata per cached room whose allocation is unchanged.
+            Updating only metadata keeps the version of the cache. (default: {None})
+
+    Returns:
+        AllocationStore -- Updated store (None if there is neither a cache nor a file)
+    """
+    filepaths = list(filepaths)
+    if filepaths:
+        update = AllocationStore.from_files(filepaths)
+        store = load_allocation_store(directory, mmap=False)
+        with span("index.merge_store", files=len(filepaths)):
+            store = update if store is None else store.merge(update)
+    else:
+        store = load_allocation_store(directory)
+    if store is None:
+        return None
+
+    metadata = {room: value for room, value in (metadata or {}).items() if room in store.ids}
+    store.metadata.update(metadata)
+    if filepaths:
+        save_allocation_store(store, directory)
+    elif metadata:
+        _save_index(store, directory)
+    return store
+
+
+def get_allocation_store(
+    directory: str = ALLOCATION_STORE, rooms_dir: str = ROOMS_DIR
+) -> Optional[AllocationStore]:
+    """Returns the cached store, building the cache from the allocation files if missing
+
+    Keyword Arguments:
+        directory {str} -- Cache directory (default: {ALLOCATION_STORE})
+        rooms_dir {str} -- Directory of the allocation files (default: {ROOMS_DIR})
+
+    Returns:
+        AllocationStore -- Cached store or None if nothing has been downloaded yet
+    """
+    store = load_allocation_store(directory)
+    count("store.cache_hits" if store is not None else "store.cache_misses")
+    if store is not None or not os.path.exists(rooms_dir):
+        return store
+    filepaths = [
+        os.path.join(rooms_dir, filename)
+        for filename in os.listdir(rooms_dir)
+        if filename.endswith(".json")
+    ]
+    return update_allocation_store(filepaths, directory) if filepaths else None
@@ -0,0 +1,271 @@
+"""
+Columnar store of the room allocations of many rooms.
+1. Convert the room allocations once into contiguous arrays sorted by start
+2. Answer availability queries for all rooms at once with vectorized operations
+3. Answer them for many windows in one sweep (one row per window)
+
+Times are stored as int64 minutes since 1970-01-01 on the Zurich wall clock, which
+is how `Room` compares and subtracts its CET datetimes. Queries take timezone aware
+datetimes and keep the exact semantics of the per-room queries of `Room`.
+"""
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from eth_tools.room_allocation.ingest import ingest_files
+from eth_tools.room_allocation.profiling import span
+from eth_tools.room_allocation.scoring_config import EVENING_HOUR
+from eth_tools.room_allocation.slots import (
+    CET,
+    FREE_TYPES,
+    Slot,
+    SlotType,
+    epoch_seconds,
+    window_minutes,
+)
+
+CLOSED_TYPE = SlotType.CLOSED
+
+_DAY_SECONDS = 24 * 60 * 60
+
+
+class AllocationStore:
+    """Room allocations of many rooms as contiguous arrays sorted by start.
+
+    Attributes:
+        names {list} -- Room names in format BUILDING FLOOR ROOM, indexed by room id
+        room {np.ndarray} -- Room id of each slot
+        start {np.ndarray} -- Start of each slot in epoch minutes
+        end {np.ndarray} -- End of each slot in epoch minutes
+        typ {np.ndarray} -- belegungstyp of each slot (-1 if unknown)
+        rank {np.ndarray} -- Position of each slot in its room's allocation sorted by date_to
+        metadata {dict} -- File metadata per room name
+        merged {tuple} -- (version of the store merged into, names of the rooms that
+            replaced or extended its rooms) of a store built by `merge`, None otherwise
+    """
+
+    def __init__(self, names, room, start, end, typ, rank, metadata=None, max_duration=None):
+        """Wraps columns that are already sorted by start (see `from_columns`)."""
+        self.names = list(names)
+        self.ids = {name: i for i, name in enumerate(self.names)}
+        self.metadata = metadata or {}
+        self.version = None
+        self.merged = None
+        self.room = room
+        self.start = start
+        self.end = end
+        self.typ = typ
+        self.rank = rank
+        if max_duration is None:
+            max_duration = int((end - start).max()) if len(start) else 0
+        self.max_duration = max_duration
+
+    def __len__(self):
+        return len(self.names)
+
+    @classmethod
+    def from_columns(cls, names, room, start, end, typ, rank, metadata=None) -> "AllocationStore":
+        """Builds the store from unsorted slot columns."""
+        order = np.argsort(start, kind="stable")
+        return cls(
+            names,
+            np.asarray(room, dtype=np.int32)[order],
+            np.asarray(start, dtype=np.int64)[order],
+            np.asarray(end, dtype=np.int64)[order],
+            np.asarray(typ, dtype=np.int16)[order],
+            np.asarray(rank, dtype=np.int32)[order],
+            metadata,
+        )
+
+    @classmethod
+    def from_allocations(
+        cls, allocations: Dict[str, List[Slot]], metadata: Optional[dict] = None
+    ) -> "AllocationStore":
+        """Builds the store from room allocations as returned by `load_room_allocation`
+
+        Arguments:
+            allocations {dict} -- Room allocation per room name
+
+        Keyword Arguments:
+            metadata {dict} -- File metadata per room name (default: {None})
+
+        Returns:
+            AllocationStore -- Store of the given allocations
+        """
+        names, room, start, end, typ, rank = [], [], [], [], [], []
+        for room_id, (name, allocation) in enumerate(allocations.items()):
+            names.append(name)
+            for i, slot in enumerate(sorted(allocation, key=lambda x: x.end)):
+                room.append(room_id)
+                start.append(slot.start)
+                end.append(slot.end)
+                typ.append(slot.belegungstyp)
+                rank.append(i)
+        return cls.from_columns(names, room, start, end, typ, rank, metadata)
+
+    @classmethod
+    def from_files(
+        cls, filepaths: Iterable[str], workers: Optional[int] = None
+    ) -> "AllocationStore":
+        """Builds the store from room allocation files
+
+        Arguments:
+            filepaths {Iterable[str]} -- Paths to room allocation files
+
+        Keyword Arguments:
+            workers {int} -- Number of worker processes parsing the files
+                (default: {None} = one per core, see `ingest.ingest_files`)
+
+        Returns:
+            AllocationStore -- Store of the allocations in the given files
+        """
+        filepaths = list(filepaths)
+        records = [None] * len(filepaths)
+        with span("load.allocation_files", files=len(filepaths)):
+            for position, record in ingest_files(filepaths, workers):
+                records[position] = record
+
+        with span("index.build_store", rooms=len(records)):
+            # Rooms in file order, a later file of the same room replaces an earlier one
+            by_room = {record.metadata["room"]: record for record in records}
+            names = list(by_room)
+            records = list(by_room.values())
+            lengths = [len(record.start) for record in records]
+            return cls.from_columns(
+                names,
+                np.repeat(np.arange(len(records)), lengths),
+                np.concatenate([record.start for record in records] or [[]]),
+                np.concatenate([record.end for record in records] or [[]]),
+                np.concatenate([record.typ for record in records] or [[]]),
+                np.concatenate([np.arange(length) for length in lengths] or [[]]),
+                {name: record.metadata for name, record in by_room.items()},
+            )
+
+    def merge(self, other: "AllocationStore") -> "AllocationStore":
+        """Returns a new store with the rooms of other replacing or extending those of self."""
+        keep = np.array([name not in other.ids for name in self.names], dtype=bool)
+        names = [name for name in self.names if name not in other.ids] + other.names
+        kept_ids = np.cumsum(keep) - 1
+        slots = keep[self.room]
+        metadata = {name: self.metadata[name] for name in self.names if name in self.metadata}
+        metadata.update(other.metadata)
+        store = AllocationStore.from_columns(
+            names,
+            np.concatenate([kept_ids[self.room[slots]], other.room + int(keep.sum())]),
+            np.concatenate([self.start[slots], other.start]),
+            np.concatenate([self.end[slots], other.end]),
+            np.concatenate([self.typ[slots], other.typ]),
+            np.concatenate([self.rank[slots], other.rank]),
+            metadata,
+        )
+        store.merged = (self.version, list(other.names))
+        return store
+
+    def room_ids(self, names: Optional[Iterable[str]] = None) -> np.ndarray:
+        """Returns the room ids of the given room names (all rooms by default)."""
+        if names is None:
+            return np.arange(len(self.names))
+        return np.array([self.ids[name] for name in names], dtype=np.int64)
+
+    def _overlapping(self, windows: Sequence[Tuple]) -> Tuple[np.ndarray, np.ndarray]:
+        """Returns the (window, slot) index pairs of the slots overlapping each window
+
+        Arguments:
+            windows {Sequence[tuple]} -- (datetime_from, datetime_to) per window, closed
+
+        Returns:
+            tuple -- Window index and slot index of every overlapping pair
+        """
+        bounds = np.array([window_minutes(*window) for window in windows], dtype=np.int64)
+        from_minute, to_minute = bounds.reshape(-1, 2).T
+        lo = np.searchsorted(self.start, from_minute - self.max_duration, side="left")
+        hi = np.searchsorted(self.start, to_minute, side="right")
+
+        # Candidate slots lo..hi of every window, flattened
+        counts = np.maximum(hi - lo, 0)
+        window = np.repeat(np.arange(len(bounds)), counts)
+        offsets = np.arange(len(window)) - np.repeat(np.cumsum(counts) - counts, counts)
+        slots = lo[window] + offsets
+        overlapping = self.end[slots] >= from_minute[window]
+        return window[overlapping], slots[overlapping]
+
+    def _any(self, n_windows: int, window: np.ndarray, slots: np.ndarray) -> np.ndarray:
+        """Returns per window and room whether any of the given pairs belongs to it."""
+        result = np.zeros((n_windows, len(self.names)), dtype=bool)
+        result[window, self.room[slots]] = True
+        return result
+
+    def is_available_many(self, windows: Sequence[Tuple]) -> np.ndarray:
+        """Returns per window and room whether the room is fully available in the window
+
+        A room is available if all slots overlapping the window are of type
+        "frei" or "Studierendenarbeitsplätze".
+
+        Arguments:
+            windows {Sequence[tuple]} -- (datetime_from, datetime_to) per window
+
+        Returns:
+            np.ndarray -- Boolean array of shape (len(windows), rooms)
+        """
+        window, slots = self._overlapping(windows)
+        occupied = ~np.isin(self.typ[slots], FREE_TYPES)
+        return ~self._any(len(windows), window[occupied], slots[occupied])
+
+    def has_previous_slots_many(self, datetimes_from: Sequence) -> np.ndarray:
+        """Returns per datetime and room whether the room has been used earlier the same
+        day (ignoring closures), as array of shape (len(datetimes_from), rooms)."""
+        window, slots = self._overlapping(
+            [(dt.replace(hour=0, minute=0, second=0), dt) for dt in datetimes_from]
+        )
+        used = self.typ[slots] != CLOSED_TYPE
+        return self._any(len(datetimes_from), window[used], slots[used])
+
+    def minutes_to_next_slot_many(
+        self, datetimes_from: Sequence, evening_hour: int = EVENING_HOUR
+    ) -> np.ndarray:
+        """Returns per datetime and room the minutes until the next slot of the room
+
+        Mirrors `Room.get_delta_to_next_slot(...).seconds // 60`: the next slot is
+        the first slot by date_to overlapping [datetime_from, evening]; rooms without
+        such a slot count until the evening.
+
+        Arguments:
+            datetimes_from {Sequence} -- Timezone aware starts
+
+        Keyword Arguments:
+            evening_hour {int} -- Hour at which rooms close (default: {EVENING_HOUR})
+
+        Returns:
+            np.ndarray -- Array of shape (len(datetimes_from), rooms)
+        """
+        evenings = [dt.replace(hour=evening_hour, minute=0, second=0) for dt in datetimes_from]
+        until_evening = np.array(
+            [(evening - dt).seconds // 60 for dt, evening in zip(datetimes_from, evenings)],
+            dtype=np.int64,
+        )
+        result = np.repeat(until_evening.reshape(-1, 1), len(self.names), axis=1)
+
+        window, slots = self._overlapping(list(zip(datetimes_from, evenings)))
+        order = np.lexsort((self.rank[slots], self.room[slots], window))
+        window, slots = window[order], slots[order]
+        keys = window * len(self.names) + self.room[slots]
+        _, first = np.unique(keys, return_index=True)
+        window, slots = window[first], slots[first]
+
+        from_ceil = np.array([epoch_seconds(dt)[1] for dt in datetimes_from], dtype=np.int64)
+        delta = (self.start[slots] * 60 - from_ceil[window]) % _DAY_SECONDS
+        result[window, self.room[slots]] = delta // 60
+        return result
+
+    def is_available(self, datetime_from, datetime_to) -> np.ndarray:
+        """Returns per room whether it is fully available in the given window."""
+        return self.is_available_many([(datetime_from, datetime_to)])[0]
+
+    def has_previous_slots(self, datetime_from) -> np.ndarray:
+        """Returns per room whether it has been used earlier the same day (ignoring closures)."""
+        return self.has_previous_slots_many([datetime_from])[0]
+
+    def minutes_to_next_slot(self, datetime_from, evening_hour: int = EVENING_HOUR) -> np.ndarray:
+        """Returns per room the minutes until its next slot (see `minutes_to_next_slot_many`)."""
+        return self.minutes_to_next_slot_many([datetime_from], evening_hour)[0]
+
@@ -0,0 +1,281 @@
+"""
+Batch room search answering many queries against one loaded dataset.
+1. Read the queries from a JSON Lines file (one search per line)
+2. Select the candidate rooms of every query from the catalog (location, building,
+   type, minimal seats) before any allocation is touched
+3. Score all queries together, computing the features of each distinct window once,
+   or rank their rooms by the time they stay free (`search_free`)
+4. Answer repeated queries on the same data from a `ResultCache`, and re-rank the
+   cached features of queries whose scoring config only changed in its weights
+
+Example queries.jsonl:
+    {"location": "Zürich Zentrum", "when": "2024-03-04T08:00:00", "duration": 1}
+    {"location": "Zürich Hönggerberg", "building": "HCI", "when": "2024-03-04T09:00:00"}
+    {"location": "Zürich Hönggerberg", "near": "HCI", "when": "2024-03-04T09:00:00"}
+    {"location": "Zürich Zentrum", "room_type": "Seminars / Courses", "min_seats": 20}
+"""
+import datetime
+import json
+from typing import Iterable, List, NamedTuple, Optional, Tuple
+
+from eth_tools.room_allocation.allocations import CET, AllocationStore
+from eth_tools.room_allocation.bucket_index import FreeRoomIndex
+from eth_tools.room_allocation.catalog import RoomCatalog, room_name
+from eth_tools.room_allocation.fix_scores import GetLocation
+from eth_tools.room_allocation.result_cache import (
+    ResultCache,
+    bucket_start,
+    data_version,
+    search_key,
+)
+from eth_tools.room_allocation.scoring import ScoreQuery, feature_batch
+from eth_tools.room_allocation.scoring_config import DEFAULT_SCORING, ScoringConfig
+from eth_tools.room_allocation.timeline import FreeTimeline
+
+WHEN_FORMAT = "%Y-%m-%dT%H:%M:%S"
+
+VALID_LOCATIONS = GetLocation().locations
+
+
+class Query(NamedTuple):
+    """One room search, as accepted by `find-room`."""
+
+    location: str
+    building: Optional[str] = None
+    when: Optional[datetime.datetime] = None  # Timezone aware, None = now
+    duration: float = 4
+    top: int = 10
+    free_only: bool = False
+    near: Optional[str] = None  # Building of the user, ranks by building travel times
+    room_type: Optional[str] = None
+    min_seats: Optional[int] = None
+
+    def window(self, now: Optional[datetime.datetime] = None) -> Tuple:
+        """Returns (datetime_from, datetime_to) of the query."""
+        datetime_from = self.when or now or datetime.datetime.now(CET)
+        return datetime_from, datetime_from + datetime.timedelta(hours=self.duration)
+
+    def to_dict(self) -> dict:
+        return dict(
+            self._asdict(), when=self.when.strftime(WHEN_FORMAT) if self.when else None
+        )
+
+
+def parse_query(data: dict, defaults: Optional[dict] = None) -> Query:
+    """Returns the query of the given JSON object
+
+    Arguments:
+        data {dict} -- Query with the fields of `Query`, when in format YYYY-MM-DDTHH:MM:SS
+
+    Keyword Arguments:
+        defaults {dict} -- Values of fields missing in data (default: {None})
+
+    Returns:
+        Query -- Parsed query
+    """
+    if not isinstance(data, dict):
+        raise ValueError(f"A query must be an object, got {type(data).__name__}.")
+    # Fields of data override the defaults, None counts as missing
+    data = {
+        key: value
+        for fields in (defaults or {}, data)
+        for key, value in fields.items()
+        if value is not None
+    }
+    if "location" not in data:
+        raise ValueError("Missing field location.")
+    unknown = set(data) - set(Query._fields)
+    if unknown:
+        raise ValueError(f"Unknown fields {', '.join(sorted(unknown))}.")
+    for field in ("location", "building", "near", "room_type"):
+        if not isinstance(data.get(field, ""), str):
+            raise ValueError(f"Field {field} must be a string.")
+    when = data.get("when")
+    if isinstance(when, str):
+        when = datetime.datetime.strptime(when, WHEN_FORMAT)
+    elif when is not None and not isinstance(when, datetime.datetime):
+        raise ValueError(f"Invalid when {when!r}, expected format YYYY-MM-DDTHH:MM:SS.")
+    if when is not None:
+        when = when.replace(tzinfo=CET) if when.tzinfo is None else when.astimezone(CET)
+    try:
+        return Query(
+            location=data["location"],
+            building=data.get("building") or None,
+            when=when,
+            duration=float(data.get("duration", Query._field_defaults["duration"])),
+            top=int(data.get("top", Query._field_defaults["top"])),
+            free_only=bool(data.get("free_only", False)),
+            near=data.get("near") or None,
+            room_type=data.get("room_type") or None,
+            min_seats=int(data["min_seats"]) if data.get("min_seats") else None,
+        )
+    except TypeError as e:  # E.g. a list as duration
+        raise ValueError(f"Invalid query: {e}") from None
+
+
+def load_queries(filepath: str, defaults: Optional[dict] = None) -> List[Query]:
+    """Loads the queries of the given JSON Lines file (empty lines are skipped)
+
+    Arguments:
+        filepath {str} -- Path to the queries file
+
+    Keyword Arguments:
+        defaults {dict} -- Values of fields missing in a query (default: {None})
+
+    Returns:
+        list -- Queries in file order
+    """
+    queries = []
+    with open(filepath, "r") as fh:
+        for line_number, line in enumerate(fh, 1):
+            if not line.strip():
+                continue
+            try:
+                queries.append(parse_query(json.loads(line), defaults))
+            except ValueError as e:
+                raise ValueError(f"{filepath}:{line_number}: {e}") from None
+    return queries
+
+
+def candidate_rooms(catalog: RoomCatalog, query: Query) -> List[dict]:
+    """Returns the rooms of the catalog matching the location, building, room type and
+    minimal seats of the query."""
+    if query.location not in VALID_LOCATIONS:
+        raise ValueError(f"Invalid location. Valid locations are: {', '.join(VALID_LOCATIONS)}")
+    candidates = catalog.select(query.location, query.building, query.room_type, query.min_seats)
+    if query.building and not candidates and not catalog.select(query.location, query.building):
+        raise ValueError(f"No rooms found in building {query.building}. Check building name.")
+    return sorted(candidates, key=room_name)
+
+
+def batch_window(queries: Iterable[Query], now: Optional[datetime.datetime] = None) -> Tuple:
+    """Returns the window (datetime_from, datetime_to) spanning all given queries."""
+    windows = [query.window(now) for query in queries]
+    return min(window[0] for window in windows), max(window[1] for window in windows)
+
+
+def search_batch(
+    queries: List[Query],
+    catalog: RoomCatalog,
+    store: AllocationStore,
+    index: Optional[FreeRoomIndex] = None,
+    now: Optional[datetime.datetime] = None,
+    cache: Optional[ResultCache] = None,
+    config: ScoringConfig = DEFAULT_SCORING,
+    features: Optional[ResultCache] = None,
+) -> List[List[Tuple[str, float]]]:
+    """Returns the best rooms for every query
+
+    Arguments:
+        queries {List[Query]} -- Queries to answer
+        catalog {RoomCatalog} -- Room infos
+        store {AllocationStore} -- Allocations of the rooms
+
+    Keyword Arguments:
+        index {FreeRoomIndex} -- Free room index of the store, built if a query needs it
+            (default: {None})
+        now {datetime.datetime} -- Start of queries without when (default: {None} = now)
+        cache {ResultCache} -- Cache of previous results, queries without when start
+            at the beginning of the current bucket when given (default: {None})
+        config {ScoringConfig} -- Weights and parameters of the score
+            (default: {DEFAULT_SCORING})
+        features {ResultCache} -- In-memory cache of the candidate features, re-ranked
+            when only the weights of config change (default: {None})
+
+    Returns:
+        list -- (room name, score) sorted by descending score, per query
+    """
+    now = now or datetime.datetime.now(CET)
+    results = [None] * len(queries)
+    keys = [None] * len(queries)
+    feature_keys = [None] * len(queries)
+    version = None
+    if cache is not None or features is not None:
+        version = data_version(catalog, store)
+    if version is not None:
+        now = bucket_start(now)  # Searches for now share the results of their bucket
+        for i, query in enumerate(queries):
+            fields = query._replace(when=query.window(now)[0]).to_dict()
+            if cache is not None:
+                keys[i] = search_key(list(fields.values()), config.key, version)
+            if features is not None:
+                # Any top can be ranked from the features of all candidates
+                del fields["top"]
+                feature_keys[i] = search_key(list(fields.values()), config.features_key, version)
+    if cache is not None and version is not None:
+        cache.use_version(version)
+        for i, key in enumerate(keys):
+            cached = cache.get(key)
+            if cached is not None:
+                results[i] = [tuple(result) for result in cached]
+                keys[i] = None  # Up to date already
+        cache.log_stats(len(queries), sum(result is not None for result in results))
+
+    missing = []
+    if features is not None and version is not None:
+        features.use_version(version)
+        hits = 0
+        for i, result in enumerate(results):
+            if result is not None:
+                continue
+            candidate_features = features.get(feature_keys[i])
+            if candidate_features is None:
+                missing.append(i)
+                continue
+            hits += 1
+            results[i] = candidate_features.rank(config.weights, queries[i].top)
+        features.log_stats(hits + len(missing), hits)
+    else:
+        missing = [i for i, result in enumerate(results) if result is None]
+
+    score_queries = []
+    for i in missing:
+        query = queries[i]
+        window = query.window(now)
+        candidates = candidate_rooms(catalog, query)
+        if query.free_only:
+            if index is None:
+                index = FreeRoomIndex.from_store(store)
+            free_rooms = set(index.free_rooms(*window))
+            candidates = [room for room in candidates if room_name(room) in free_rooms]
+        score_queries.append(
+            ScoreQuery(candidates, query.location, window, query.top, query.near)
+        )
+    computed = feature_batch(score_queries, store, catalog.travel_times, config)
+    for i, candidate_features in zip(missing, computed):
+        if feature_keys[i] is not None:
+            features.put(feature_keys[i], candidate_features)
+        results[i] = candidate_features.rank(config.weights, queries[i].top)
+
+    for key, result in zip(keys, results):
+        if key is not None:
+            cache.put(key, result)
+    return results
+
+
+def search_free(
+    query: Query,
+    catalog: RoomCatalog,
+    timeline: FreeTimeline,
+    now: Optional[datetime.datetime] = None,
+) -> List[Tuple[str, datetime.datetime]]:
+    """Returns the rooms of the query that stay free the longest from its start on
+
+    Arguments:
+        query {Query} -- Query, rooms must be free for at least its duration
+        catalog {RoomCatalog} -- Room infos
+        timeline {FreeTimeline} -- Free intervals of the rooms
+
+    Keyword Arguments:
+        now {datetime.datetime} -- Start of the query without when (default: {None} = now)
+
+    Returns:
+        list -- (room name, free until) sorted by descending free time
+    """
+    datetime_from, datetime_to = query.window(now)
+    return timeline.longest_free(
+        datetime_from,
+        query.top,
+        min_duration=datetime_to - datetime_from,
+        names=[room_name(room) for room in candidate_rooms(catalog, query)],
+    )
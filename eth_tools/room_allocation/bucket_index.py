@@ -0,0 +1,154 @@
+"""
+Time-bucketed inverted index of free rooms.
+1. Split the allocations into 15 minute buckets
+2. Keep one bitset of rooms per bucket for "frei", "Studierendenarbeitsplätze" and
+   occupied slots (any other type, including closures)
+3. Answer "which rooms are free from T to T + D" by combining the bitsets of the
+   D x 4 buckets, and re-index single rooms after they are downloaded again
+
+Buckets are numbered by epoch minute // 15, i.e. (date, time of day) in one number.
+Queries are answered at bucket granularity: a window touching a bucket counts the
+whole bucket.
+"""
+import datetime
+from typing import Iterable, List
+
+import numpy as np
+
+from eth_tools.room_allocation.allocations import AllocationStore, epoch_seconds
+from eth_tools.room_allocation.profiling import timed
+
+BUCKET_MINUTES = 15
+FREE, WORKSPACE, OCCUPIED = 0, 1, 2
+KINDS = {7: FREE, 15: WORKSPACE}  # belegungstyp -> kind, any other type is OCCUPIED
+
+
+class FreeRoomIndex:
+    """Bitsets of rooms per (kind, bucket).
+
+    Attributes:
+        names {list} -- Room names, bit i of a bitset is room names[i]
+        first_bucket {int} -- Bucket number of row 0
+        bits {np.ndarray} -- uint8 array of shape (3 kinds, buckets, bytes)
+    """
+
+    def __init__(self, names: Iterable[str] = ()):
+        self.names = []
+        self.ids = {}
+        self.first_bucket = 0
+        self.bits = np.zeros((3, 0, 0), dtype=np.uint8)
+        self._add_rooms(names)
+
+    @classmethod
+    @timed("index.free_rooms")
+    def from_store(cls, store: AllocationStore) -> "FreeRoomIndex":
+        """Builds the index of all rooms of the given store."""
+        index = cls(store.names)
+        index._set(np.asarray(store.room), store.start, store.end, store.typ)
+        return index
+
+    def copy(self) -> "FreeRoomIndex":
+        """Returns a copy to update while searches still read this index."""
+        index = FreeRoomIndex()
+        index.names = list(self.names)
+        index.ids = dict(self.ids)
+        index.first_bucket = self.first_bucket
+        index.bits = self.bits.copy()
+        return index
+
+    def _add_rooms(self, names: Iterable[str]):
+        for name in names:
+            if name not in self.ids:
+                self.ids[name] = len(self.names)
+                self.names.append(name)
+        n_bytes = -(-len(self.names) // 8)
+        if n_bytes > self.bits.shape[2]:
+            self.bits = np.pad(self.bits, ((0, 0), (0, 0), (0, n_bytes - self.bits.shape[2])))
+
+    def _cover(self, first: int, last: int):
+        """Grows the bucket axis to cover buckets first..last."""
+        if not self.bits.shape[1]:
+            self.first_bucket = first
+        before = max(self.first_bucket - first, 0)
+        after = max(last - (self.first_bucket + self.bits.shape[1] - 1), 0)
+        if before or after:
+            self.bits = np.pad(self.bits, ((0, 0), (before, after), (0, 0)))
+            self.first_bucket -= before
+
+    def _set(self, rooms: np.ndarray, start: np.ndarray, end: np.ndarray, typ: np.ndarray):
+        """Sets the bits of the given slots (room ids of this index)."""
+        if not len(rooms):
+            return
+        first = start // BUCKET_MINUTES
+        last = (np.maximum(end, start + 1) - 1) // BUCKET_MINUTES
+        self._cover(int(first.min()), int(last.max()))
+
+        # One entry per (slot, bucket)
+        counts = last - first + 1
+        slots = np.repeat(np.arange(len(rooms)), counts)
+        offsets = np.arange(len(slots)) - np.repeat(np.cumsum(counts) - counts, counts)
+        buckets = first[slots] + offsets - self.first_bucket
+        kinds = np.full(len(rooms), OCCUPIED, dtype=np.int64)
+        for belegungstyp, kind in KINDS.items():
+            kinds[typ == belegungstyp] = kind
+        slot_rooms = rooms[slots]
+        np.bitwise_or.at(
+            self.bits,
+            (kinds[slots], buckets, slot_rooms >> 3),
+            (1 << (slot_rooms & 7)).astype(np.uint8),
+        )
+
+    @timed("index.free_rooms_update")
+    def update(self, store: AllocationStore, rooms: Iterable[str]):
+        """Re-indexes the given rooms from the (re-downloaded) store
+
+        Arguments:
+            store {AllocationStore} -- Store holding the current allocation of the rooms
+            rooms {Iterable[str]} -- Room names to re-index
+        """
+        rooms = [room for room in rooms if room in store.ids]
+        self._add_rooms(rooms)
+        ids = np.array([self.ids[room] for room in rooms], dtype=np.int64)
+
+        # Clear the columns of the rooms
+        mask = np.zeros(self.bits.shape[2], dtype=np.uint8)
+        np.bitwise_or.at(mask, ids >> 3, (1 << (ids & 7)).astype(np.uint8))
+        self.bits &= ~mask
+
+        store_ids = np.array([store.ids[room] for room in rooms], dtype=np.int64)
+        slots = np.flatnonzero(np.isin(store.room, store_ids))
+        to_index = np.zeros(len(store.names), dtype=np.int64)
+        to_index[store_ids] = ids
+        self._set(
+            to_index[store.room[slots]], store.start[slots], store.end[slots], store.typ[slots]
+        )
+
+    def _buckets(self, datetime_from: datetime.datetime, datetime_to: datetime.datetime):
+        """Returns the row range [lo, hi) of the buckets touched by the window."""
+        from_floor, _ = epoch_seconds(datetime_from)
+        _, to_ceil = epoch_seconds(datetime_to)
+        first = from_floor // 60 // BUCKET_MINUTES
+        last = max(-(-to_ceil // 60 // BUCKET_MINUTES) - 1, first)
+        lo = min(max(first - self.first_bucket, 0), self.bits.shape[1])
+        hi = min(max(last - self.first_bucket + 1, 0), self.bits.shape[1])
+        return lo, hi
+
+    def _rooms(self, bitset: np.ndarray) -> List[str]:
+        bits = np.unpackbits(bitset, bitorder="little")[: len(self.names)]
+        return [self.names[i] for i in np.flatnonzero(bits)]
+
+    @timed("query.free_rooms")
+    def free_rooms(self, datetime_from, datetime_to) -> List[str]:
+        """Returns the rooms without an occupied slot in any bucket of the window."""
+        lo, hi = self._buckets(datetime_from, datetime_to)
+        occupied = np.bitwise_or.reduce(self.bits[OCCUPIED, lo:hi], axis=0)
+        return self._rooms(~occupied)
+
+    def workspace_rooms(self, datetime_from, datetime_to) -> List[str]:
+        """Returns the free rooms that are student workspace during the whole window."""
+        lo, hi = self._buckets(datetime_from, datetime_to)
+        if hi <= lo:
+            return []
+        workspace = np.bitwise_and.reduce(self.bits[WORKSPACE, lo:hi], axis=0)
+        occupied = np.bitwise_or.reduce(self.bits[OCCUPIED, lo:hi], axis=0)
+        return self._rooms(workspace & ~occupied)
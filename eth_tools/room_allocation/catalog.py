@@ -0,0 +1,137 @@
+"""
+Shared index over the global room info.
+1. Parse room_info.json once per process (re-parsed only when the file changes)
+2. Look up a room by its name in format BUILDING FLOOR ROOM
+3. Select rooms by location (areaDesc), building, type and minimal number of seats,
+   starting from the smallest matching index
+4. Code the buildings as integers with the location of each building, for the
+   travel time lookups of `travel.TravelTimes`
+"""
+import functools
+import os
+from collections import defaultdict
+from typing import Dict, List, Optional, Tuple
+
+from eth_tools.room_allocation.profiling import count, span
+from eth_tools.room_allocation.scraper import load_global_room_info
+from eth_tools.settings import ROOM_CONFIG
+
+_CATALOGS: Dict[str, Tuple[Tuple[int, int], "RoomCatalog"]] = {}
+
+
+def room_name(room_data: dict) -> str:
+    """Returns the room name in format BUILDING FLOOR ROOM
+
+    Arguments:
+        room_data {dict} -- Room entry of the global room info
+
+    Returns:
+        str -- Room name in format BUILDING FLOOR ROOM
+    """
+    return f"{room_data['building']} {room_data['floor']} {room_data['room']}"
+
+
+def room_seats(room_data: dict) -> int:
+    """Returns the number of seats of the given room entry (0 if unknown)."""
+    return int(room_data.get("seats") or 0)
+
+
+class RoomCatalog:
+    """Index over the global room info with O(1) lookups."""
+
+    def __init__(self, rooms: List[dict], metadata: Optional[dict] = None):
+        self.rooms = rooms
+        self.metadata = metadata or {}
+        self.version = None  # mtime and size of the room info file, see `load_room_catalog`
+        self.by_name = {}
+        self.by_location = defaultdict(list)
+        self.by_building = defaultdict(list)
+        self.by_type = defaultdict(list)
+        for room in rooms:
+            self.by_name[room_name(room)] = room
+            self.by_location[room["location"]["areaDesc"]].append(room)
+            self.by_building[room["building"]].append(room)
+            self.by_type[room.get("type")].append(room)
+        # Building codes in order of appearance, a building lies at one location
+        self.buildings = list(self.by_building)
+        self.building_codes = {building: i for i, building in enumerate(self.buildings)}
+        self.building_locations = [
+            self.by_building[building][0]["location"]["areaDesc"] for building in self.buildings
+        ]
+
+    def __len__(self):
+        return len(self.rooms)
+
+    def __contains__(self, name):
+        return name in self.by_name
+
+    def get(self, name: str) -> Optional[dict]:
+        """Returns the room info of the given room name or None if unknown."""
+        return self.by_name.get(name)
+
+    @functools.cached_property
+    def travel_times(self) -> "TravelTimes":
+        """Travel times between the buildings of the catalog (see `travel.TravelTimes`)."""
+        from eth_tools.room_allocation.travel import TravelTimes
+
+        return TravelTimes.from_catalog(self)
+
+    def select(
+        self,
+        location: str,
+        building: Optional[str] = None,
+        room_type: Optional[str] = None,
+        min_seats: Optional[int] = None,
+    ) -> List[dict]:
+        """Returns the rooms at the given location, optionally constrained to a building,
+        a room type and a minimal number of seats
+
+        The rooms are taken from the smallest of the location, building and type
+        indices and only these are filtered, a query for one building costs the rooms
+        of the building.
+        """
+        indexed = [
+            (self.by_location, location, lambda room: room["location"]["areaDesc"]),
+            (self.by_building, building, lambda room: room["building"]),
+            (self.by_type, room_type, lambda room: room.get("type")),
+        ]
+        indexed = [(index, key, field) for index, key, field in indexed if key]
+        smallest = min(indexed, key=lambda item: len(item[0].get(item[1], [])))
+        rooms = smallest[0].get(smallest[1], [])
+        checks = [(key, field) for index, key, field in indexed if index is not smallest[0]]
+        if not checks and not min_seats:
+            return rooms
+        return [
+            room
+            for room in rooms
+            if all(field(room) == key for key, field in checks)
+            and (not min_seats or room_seats(room) >= min_seats)
+        ]
+
+
+def load_room_catalog(filepath: str = ROOM_CONFIG) -> RoomCatalog:
+    """Returns the catalog of the given room info file
+
+    The catalog is built once per process and rebuilt only when the mtime or size
+    of the file changes.
+
+    Keyword Arguments:
+        filepath {str} -- Path to room info file (default: {ROOM_CONFIG})
+
+    Returns:
+        RoomCatalog -- Catalog of the given room info file
+    """
+    filepath = os.path.abspath(filepath)
+    stat = os.stat(filepath)
+    version = (stat.st_mtime_ns, stat.st_size)
+    cached = _CATALOGS.get(filepath)
+    if cached is not None and cached[0] == version:
+        count("catalog.cache_hits")
+        return cached[1]
+    count("catalog.cache_misses")
+    with span("load.catalog"):
+        room_info = load_global_room_info(filepath)
+        catalog = RoomCatalog(room_info["rooms"], room_info.get("metadata"))
+    catalog.version = f"{version[0]:x}-{version[1]:x}"
+    _CATALOGS[filepath] = (version, catalog)
+    return catalog
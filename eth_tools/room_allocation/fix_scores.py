@@ -1,12 +1,18 @@
 
 
 class GetLocation:
-    """Memory efficient location matrix."""
+    """Memory efficient location matrix.
+
+    Locations are integer coded (index in `locations`), unknown locations get the code
+    `len(locations)` whose row and column are infinite. `travel.TravelTimes` gathers
+    from the same matrix as NumPy array.
+    """
     
     def __init__(self):
         self.locations = ["Schwerzenbach", "Basel", "Lindau Eschikon", 
                   "Zürich Universität", "Zürich Hönggerberg", 
                   "Zürich Oerlikon", "Zürich Zentrum"]
+        self.codes = {location: i for i, location in enumerate(self.locations)}
         
         # Values = time in minutes to travel from city1 to city2 by public transport
         distances = [
@@ -19,18 +25,21 @@ class GetLocation:
             [33, 67, 63, 2, 24, 19, 0]
         ]
 
-        self.distances = {(city1, city2): distances[i][j]
-                          for i, city1 in enumerate(self.locations)
-                          for j, city2 in enumerate(self.locations)}
+        unknown = [float('inf')] * (len(self.locations) + 1)
+        self.distances = [row + [float('inf')] for row in distances] + [unknown]
+
+    def code(self, location):
+        """Returns the code of the given location (len(locations) if unknown)."""
+        return self.codes.get(location, len(self.locations))
 
     def __call__(self, location1, location2):
-        return self.distances.get((location1, location2), float('inf'))
+        return self.distances[self.code(location1)][self.code(location2)]
     
 
 class GetTypeScore:
-    """Memory efficient room type score."""
+    """Memory efficient room type score, scores of overrides replace the defaults."""
     
-    def __init__(self):
+    def __init__(self, overrides=None):
         self.room_types_and_scores = {
             "Seminars / Courses": 100,
             "Meeting room": 100,
@@ -45,6 +54,7 @@ class GetTypeScore:
             "Laboratory internship": 0,
             "Microscopy": 0,
         }
+        self.room_types_and_scores.update(overrides or {})
 
     def __call__(self, room_type):
         return self.room_types_and_scores.get(room_type, 0)
\ No newline at end of file
@@ -0,0 +1,113 @@
+"""
+Parallel ingestion of room allocation files.
+1. Parse the files across a process pool (serially for few files or one core),
+   with orjson when it is installed
+2. Convert every file in the worker into a compact record of slot columns instead
+   of returning the parsed dicts
+3. Stream the records to the caller as the workers finish them
+
+Slot columns have the layout of `AllocationStore`: epoch minutes on the Zurich wall
+clock, belegungstyp (-1 if unknown), slots sorted by date_to.
+"""
+import math
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from typing import Iterator, List, NamedTuple, Optional, Sequence, Tuple
+
+import numpy as np
+
+from eth_tools.room_allocation.profiling import count, span
+from eth_tools.room_allocation.scraper import read_json
+from eth_tools.room_allocation.slots import to_minutes
+
+MIN_PARALLEL_FILES = 1000  # Below, starting the workers costs more than it saves
+CHUNKS_PER_WORKER = 4  # Several chunks per worker balance uneven file sizes
+
+
+class RoomRecord(NamedTuple):
+    """Slots of one allocation file, sorted by date_to."""
+
+    metadata: dict
+    start: np.ndarray  # Epoch minutes
+    end: np.ndarray  # Epoch minutes
+    typ: np.ndarray  # belegungstyp, -1 if unknown
+
+
+def _minutes(dates: Sequence[str]) -> np.ndarray:
+    """Returns the given allocation dates (2023-09-01T08:00:00) in epoch minutes."""
+    try:
+        return np.array(dates, dtype="datetime64[s]").astype(np.int64) // 60
+    except ValueError:  # Not plain ISO dates, e.g. with a UTC offset
+        return np.array([to_minutes(str(date)) for date in dates], dtype=np.int64)
+
+
+def parse_room_file(filepath: str) -> RoomRecord:
+    """Parses the given allocation file into a compact record
+
+    Arguments:
+        filepath {str} -- Path to the room allocation file
+
+    Returns:
+        RoomRecord -- Metadata and slot columns of the file
+    """
+    content = read_json(filepath)
+    allocation = content["room_allocation"]
+    date_to = np.array([slot["date_to"] for slot in allocation], dtype=str)
+    typ = [slot.get("belegungsserie", {}).get("belegungstyp") for slot in allocation]
+    # Stable sort by date_to as `load_room_file`
+    order = np.argsort(date_to, kind="stable")
+    return RoomRecord(
+        content["metadata"],
+        _minutes([slot["date_from"] for slot in allocation])[order],
+        _minutes(date_to)[order],
+        np.array([-1 if value is None else value for value in typ], dtype=np.int16)[order],
+    )
+
+
+def _parse_chunk(chunk: Sequence[Tuple[int, str]]) -> List[Tuple[int, RoomRecord]]:
+    return [(position, parse_room_file(filepath)) for position, filepath in chunk]
+
+
+def default_workers() -> int:
+    """Returns the number of cores available to this process."""
+    if hasattr(os, "sched_getaffinity"):
+        return len(os.sched_getaffinity(0))
+    return os.cpu_count() or 1
+
+
+def ingest_files(
+    filepaths: Sequence[str], workers: Optional[int] = None
+) -> Iterator[Tuple[int, RoomRecord]]:
+    """Parses the given allocation files, yielding the records as they are finished
+
+    Arguments:
+        filepaths {Sequence[str]} -- Paths to room allocation files
+
+    Keyword Arguments:
+        workers {int} -- Number of worker processes (default: {None} = one per core,
+            files are parsed in this process below MIN_PARALLEL_FILES files)
+
+    Yields:
+        tuple -- Position of the file in filepaths and its record, in completion order
+    """
+    filepaths = list(filepaths)
+    workers = min(workers or default_workers(), math.ceil(len(filepaths) / CHUNKS_PER_WORKER))
+    if workers <= 1 or len(filepaths) < MIN_PARALLEL_FILES:
+        for position, filepath in enumerate(filepaths):
+            count("files.parsed")
+            yield position, parse_room_file(filepath)
+        return
+
+    indexed = list(enumerate(filepaths))
+    chunk_size = math.ceil(len(indexed) / (workers * CHUNKS_PER_WORKER))
+    chunks = [indexed[i : i + chunk_size] for i in range(0, len(indexed), chunk_size)]
+    # Spawned workers do not inherit the locks of threads running in this process
+    context = multiprocessing.get_context("spawn")
+    with span("load.ingest_pool", workers=workers, files=len(filepaths)):
+        with ProcessPoolExecutor(workers, mp_context=context) as executor:
+            futures = [executor.submit(_parse_chunk, chunk) for chunk in chunks]
+            for future in as_completed(futures):
+                for position, record in future.result():
+                    count("files.parsed")
+                    yield position, record
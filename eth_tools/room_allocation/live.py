@@ -0,0 +1,194 @@
+"""
+Live ranking of rooms that follows the clock ("best room now" boards).
+1. Group the slots of the candidate rooms once, so that single rooms can be rescored
+   from their own slots
+2. Keep per room the next minute at which one of its features can change, in an event
+   queue: slot boundaries entering or leaving the window, midnight, and the minutes in
+   which the time to the next slot is within the scored range
+3. On every tick, rescore only the rooms whose events are due and update the ranking;
+   ticks without due events do no work
+
+Ticks are truncated to the minute, the ranking of a tick equals `score_rooms` for
+the window [tick, tick + duration].
+"""
+import datetime
+import heapq
+from typing import List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from eth_tools.room_allocation.allocations import CET, AllocationStore
+from eth_tools.room_allocation.catalog import room_name
+from eth_tools.room_allocation.profiling import count, span
+from eth_tools.room_allocation.scoring import (
+    _feature_matrix,
+    top_k,
+    weighted_sum,
+    window_features,
+)
+from eth_tools.room_allocation.scoring_config import DEFAULT_SCORING, ScoringConfig
+from eth_tools.room_allocation.slots import epoch_seconds, from_minutes, window_minutes
+from eth_tools.room_allocation.travel import TravelTimes
+
+_DAY_MINUTES = 24 * 60
+_NEVER = np.iinfo(np.int64).max
+
+
+class LiveRanking:
+    """Ranking of a fixed set of candidate rooms, updated incrementally as time passes.
+
+    Attributes:
+        names {list} -- Names of the candidates with allocation in the store
+        scores {np.ndarray} -- Score of each candidate at the last tick
+        minute {int} -- Last tick in epoch minutes (None before the first tick)
+        rescored {int} -- Number of candidates rescored at the last tick
+    """
+
+    def __init__(
+        self,
+        candidates: Sequence[dict],
+        location: str,
+        store: AllocationStore,
+        duration: float = 4,
+        top: int = 10,
+        travel: Optional[TravelTimes] = None,
+        near: Optional[str] = None,
+        config: ScoringConfig = DEFAULT_SCORING,
+    ):
+        """Groups the slots of the given candidates
+
+        Arguments:
+            candidates {Sequence[dict]} -- Room infos of the candidates
+            location {str} -- Location of the user
+            store {AllocationStore} -- Allocations of the candidates
+
+        Keyword Arguments:
+            duration {float} -- Hours that the rooms should be free (default: {4})
+            top {int} -- Number of rooms to rank (default: {10})
+            travel {TravelTimes} -- Travel times, e.g. `RoomCatalog.travel_times`
+                (default: {None} = location travel times of the candidates)
+            near {str} -- Building of the user, for building travel times (default: {None})
+            config {ScoringConfig} -- Weights and parameters of the score
+                (default: {DEFAULT_SCORING})
+        """
+        self.candidates = [room for room in candidates if room_name(room) in store.ids]
+        self.names = [room_name(room) for room in self.candidates]
+        self.location = location
+        self.store = store
+        self.duration = datetime.timedelta(hours=duration)
+        self.top = top
+        self.travel = travel if travel is not None else TravelTimes.from_rooms(self.candidates)
+        self.near = near
+        self.config = config
+
+        # Slots of the candidates grouped by candidate and sorted by start
+        position = np.full(len(store.names), -1, dtype=np.int64)
+        position[store.room_ids(self.names)] = np.arange(len(self.names))
+        slots = np.flatnonzero(position[store.room] >= 0)
+        owner = position[store.room[slots]]
+        order = np.lexsort((store.start[slots], owner))
+        self._slots = slots[order]
+        self._offsets = np.searchsorted(owner[order], np.arange(len(self.names) + 1))
+
+        self.scores = np.zeros(len(self.names))
+        self.minute = None
+        self.rescored = 0
+        self._due = np.full(len(self.names), _NEVER, dtype=np.int64)
+        self._events = []  # (minute, candidate), stale when minute != self._due[candidate]
+        self._ranking = []
+
+    def _substore(self, dirty: np.ndarray) -> AllocationStore:
+        """Returns the store of the slots of the given candidates (room ids = positions
+        in dirty)."""
+        lengths = self._offsets[dirty + 1] - self._offsets[dirty]
+        slots = np.concatenate(
+            [self._slots[self._offsets[i] : self._offsets[i + 1]] for i in dirty.tolist()]
+        )
+        local = np.repeat(np.arange(len(dirty)), lengths)
+        store = self.store
+        return AllocationStore.from_columns(
+            [self.names[i] for i in dirty],
+            local,
+            store.start[slots],
+            store.end[slots],
+            store.typ[slots],
+            store.rank[slots],
+        )
+
+    def _rescore(self, dirty: np.ndarray, minute: int):
+        """Rescores the given candidates at minute and schedules their next change."""
+        datetime_from = from_minutes(minute)
+        window = (datetime_from, datetime_from + self.duration)
+        substore = self._substore(dirty)
+        ids = np.arange(len(dirty))
+        features = window_features([window], substore, self.config.evening_hour)
+        matrix = _feature_matrix(
+            [self.candidates[i] for i in dirty],
+            self.location,
+            ids,
+            features,
+            0,
+            self.travel,
+            self.near,
+            self.config,
+        )
+        self.scores[dirty] = weighted_sum(matrix, self.config.weights)
+
+        # Slots entering the window (start - duration), leaving the window and the
+        # next slot candidates (end + 1) and entering the previous usage (start)
+        due = np.full(len(dirty), minute - minute % _DAY_MINUTES + _DAY_MINUTES)
+        to_minute = window_minutes(*window)[1]
+        for events in (
+            substore.start - (to_minute - minute),
+            substore.end + 1,
+            substore.start,
+        ):
+            later = events > minute
+            np.minimum.at(due, substore.room[later], events[later])
+
+        # The time to the next slot counts down every minute, its feature changes while
+        # it is within next_slot_minutes - 100 and next_slot_minutes, and wraps at 0
+        next_slot = minute + features.minutes_to_next_slot[0]
+        ramp_start = np.maximum(next_slot - self.config.next_slot_minutes + 1, minute + 1)
+        ramp_end = next_slot - self.config.next_slot_minutes + 100
+        due = np.minimum(due, np.where(ramp_start <= ramp_end, ramp_start, _NEVER))
+        due = np.minimum(due, next_slot + 1)
+
+        self._due[dirty] = due
+        for candidate, minute_due in zip(dirty.tolist(), due.tolist()):
+            heapq.heappush(self._events, (minute_due, candidate))
+
+    def tick(self, now: Optional[datetime.datetime] = None) -> List[Tuple[str, float]]:
+        """Returns the top rooms at the given time, rescoring the rooms that changed since
+        the last tick
+
+        Keyword Arguments:
+            now {datetime.datetime} -- Timezone aware time of the tick, truncated to the
+                minute (default: {None} = now)
+
+        Returns:
+            list -- (room name, score) sorted by descending score
+        """
+        minute = epoch_seconds(now or datetime.datetime.now(CET))[0] // 60
+        count("live.ticks")
+        if self.minute is None or minute < self.minute:
+            # First tick or the clock went back, the scheduled events do not apply
+            self._events = []
+            dirty = np.arange(len(self.names))
+        else:
+            due = set()
+            while self._events and self._events[0][0] <= minute:
+                minute_due, candidate = heapq.heappop(self._events)
+                if self._due[candidate] == minute_due:
+                    due.add(candidate)
+            dirty = np.array(sorted(due), dtype=np.int64)
+        self.minute = minute
+        self.rescored = len(dirty)
+        if len(dirty):
+            count("live.rescored", len(dirty))
+            with span("live.rescore", rooms=len(dirty)):
+                self._rescore(dirty, minute)
+                self._ranking = [
+                    (self.names[i], float(self.scores[i])) for i in top_k(self.scores, self.top)
+                ]
+        return self._ranking
@@ -0,0 +1,162 @@
+"""
+Lightweight instrumentation of the hot paths.
+1. Time phases with the `span` context manager or the `timed` decorator
+2. Count events (HTTP requests, bytes downloaded, files parsed, cache hits/misses)
+3. Report per-phase totals as a table or export a Chrome trace (chrome://tracing, Perfetto)
+
+Instrumentation is disabled by default, spans and counters return immediately until
+`PROFILER.enable()` is called.
+"""
+import contextlib
+import functools
+import json
+import os
+import threading
+import time
+from collections import Counter
+from typing import Callable, Dict, List, NamedTuple, Optional
+
+MAX_SPANS = 100_000  # Spans kept for the trace, phase totals are always kept
+
+
+class Span(NamedTuple):
+    name: str
+    start: float  # time.perf_counter()
+    duration: float
+    thread: int
+    args: dict
+
+
+class Profiler:
+    """Thread-safe collector of spans and counters.
+
+    Attributes:
+        enabled {bool} -- Whether spans and counters are recorded
+        spans {list} -- Recorded spans (at most MAX_SPANS) for the trace
+        counters {Counter} -- Value per counter name
+    """
+
+    def __init__(self):
+        self.enabled = False
+        self._lock = threading.Lock()
+        self.reset()
+
+    def enable(self, enabled: bool = True):
+        self.enabled = enabled
+
+    def reset(self):
+        """Drops all recorded spans and counters."""
+        with self._lock:
+            self.started = time.perf_counter()
+            self.spans: List[Span] = []
+            self.counters = Counter()
+            self._phases: Dict[str, list] = {}  # name -> [first start, calls, total, max]
+
+    @contextlib.contextmanager
+    def span(self, name: str, **args):
+        """Times the enclosed block as phase `name` (args are shown in the trace)."""
+        if not self.enabled:
+            yield
+            return
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            duration = time.perf_counter() - start
+            with self._lock:
+                phase = self._phases.setdefault(name, [start, 0, 0.0, 0.0])
+                phase[0] = min(phase[0], start)
+                phase[1] += 1
+                phase[2] += duration
+                phase[3] = max(phase[3], duration)
+                if len(self.spans) < MAX_SPANS:
+                    self.spans.append(Span(name, start, duration, threading.get_ident(), args))
+
+    def timed(self, name: Optional[str] = None) -> Callable:
+        """Decorator timing every call of the function (default name: module.qualname)."""
+
+        def decorator(fn):
+            span_name = name or f"{fn.__module__.rsplit('.', 1)[-1]}.{fn.__qualname__}"
+
+            @functools.wraps(fn)
+            def wrapper(*args, **kwargs):
+                if not self.enabled:
+                    return fn(*args, **kwargs)
+                with self.span(span_name):
+                    return fn(*args, **kwargs)
+
+            return wrapper
+
+        return decorator
+
+    def count(self, name: str, value: int = 1):
+        """Adds value to the counter `name`."""
+        if self.enabled:
+            with self._lock:
+                self.counters[name] += value
+
+    def phases(self) -> List[dict]:
+        """Returns the totals per phase in order of their first start"""
+        with self._lock:
+            phases = sorted(self._phases.items(), key=lambda item: item[1][0])
+            return [
+                dict(
+                    phase=name,
+                    calls=calls,
+                    total_ms=total * 1000,
+                    mean_ms=total / calls * 1000,
+                    max_ms=maximum * 1000,
+                )
+                for name, (_, calls, total, maximum) in phases
+            ]
+
+    def snapshot(self) -> dict:
+        """Returns the phase totals and counters as JSON serializable dict."""
+        with self._lock:
+            counters = dict(self.counters)
+        return dict(phases=self.phases(), counters=counters)
+
+    def chrome_trace(self) -> dict:
+        """Returns the spans and counters in the Chrome trace event format"""
+        pid = os.getpid()
+        with self._lock:
+            spans = list(self.spans)
+            counters = dict(self.counters)
+            end = time.perf_counter()
+        events = [
+            dict(
+                name=span.name,
+                cat=span.name.split(".", 1)[0],
+                ph="X",
+                ts=(span.start - self.started) * 1e6,
+                dur=span.duration * 1e6,
+                pid=pid,
+                tid=span.thread,
+                args=span.args,
+            )
+            for span in spans
+        ]
+        events.extend(
+            dict(name=name, ph="C", ts=(end - self.started) * 1e6, pid=pid, args={name: value})
+            for name, value in counters.items()
+        )
+        return dict(traceEvents=events, displayTimeUnit="ms")
+
+    def export_chrome_trace(self, filepath: str) -> str:
+        """Writes the Chrome trace to the given file
+
+        Arguments:
+            filepath {str} -- Path to the trace file (open in chrome://tracing or Perfetto)
+
+        Returns:
+            str -- Path to the trace file
+        """
+        with open(filepath, "w") as f:
+            json.dump(self.chrome_trace(), f, default=str)
+        return filepath
+
+
+PROFILER = Profiler()
+span = PROFILER.span
+timed = PROFILER.timed
+count = PROFILER.count
@@ -0,0 +1,200 @@
+"""
+Refresh planner for the downloaded room data.
+1. Decide whether the global room info needs to be downloaded again
+2. Select the rooms whose allocation is missing, does not cover the requested
+   window or is older than the TTL
+3. Download only the missing date ranges of rooms that are up to date otherwise,
+   the full range of missing and expired rooms
+4. Merge the downloads into the allocation cache
+"""
+import datetime
+import logging
+import os
+from typing import Callable, Iterable, List, Optional, Tuple
+
+from eth_tools.room_allocation.allocations import AllocationStore
+from eth_tools.room_allocation.allocation_cache import update_allocation_store
+from eth_tools.room_allocation.catalog import RoomCatalog, load_room_catalog
+from eth_tools.room_allocation.profiling import timed
+from eth_tools.room_allocation.scraper import (
+    MAX_CONCURRENCY,
+    download_global_room_info,
+    download_room_allocations,
+    missing_ranges,
+)
+from eth_tools.settings import (
+    ALLOCATION_HORIZON,
+    ALLOCATION_TTL,
+    DOWNLOAD_DAYS,
+    ROOM_CONFIG,
+    ROOM_INFO_TTL,
+)
+
+LOGGER = logging.getLogger(__name__)
+
+
+def _downloaded_at(metadata: dict) -> Optional[datetime.datetime]:
+    """Returns the download timestamp of the given file metadata (None for older files)."""
+    downloaded_at = metadata.get("downloaded_at")
+    return datetime.datetime.fromisoformat(downloaded_at) if downloaded_at else None
+
+
+def is_expired(metadata: dict, ttl: datetime.timedelta, now=None) -> bool:
+    """Returns whether the file with the given metadata is older than the TTL."""
+    downloaded_at = _downloaded_at(metadata)
+    now = now or datetime.datetime.now()
+    return downloaded_at is None or now - downloaded_at > ttl
+
+
+def covers(metadata: dict, window: Tuple) -> bool:
+    """Returns whether the downloaded date range of the file covers the given window."""
+    datetime_from, datetime_to = window
+    return (
+        metadata["from_date"] <= datetime_from.date().isoformat()
+        and datetime_to.date().isoformat() <= metadata["to_date"]
+    )
+
+
+def download_range(window: Tuple) -> Tuple[str, str]:
+    """Returns the date range (from_date, to_date) to download for the given window."""
+    datetime_from, datetime_to = window
+    to_date = max(
+        datetime_from.date() + datetime.timedelta(days=DOWNLOAD_DAYS), datetime_to.date()
+    )
+    return datetime_from.date().isoformat(), to_date.isoformat()
+
+
+def room_info_needs_refresh(
+    filepath: str = ROOM_CONFIG, ttl: datetime.timedelta = ROOM_INFO_TTL
+) -> bool:
+    """Returns whether the global room info is missing or older than the TTL
+
+    The mtime of the file is used, which is also bumped when a conditional download
+    finds the room info unchanged.
+    """
+    if not os.path.exists(filepath):
+        return True
+    downloaded_at = datetime.datetime.fromtimestamp(os.path.getmtime(filepath))
+    return datetime.datetime.now() - downloaded_at > ttl
+
+
+@timed("refresh.plan")
+def plan_refresh(
+    rooms: Iterable[str],
+    store: Optional[AllocationStore],
+    window: Tuple,
+    ttl: datetime.timedelta = ALLOCATION_TTL,
+) -> List[str]:
+    """Returns the rooms whose allocation needs to be downloaded for the given window
+
+    Arguments:
+        rooms {Iterable[str]} -- Room names in format BUILDING FLOOR ROOM
+        store {AllocationStore} -- Downloaded allocations (None if nothing is downloaded)
+        window {tuple} -- (datetime_from, datetime_to) that must be covered
+
+    Keyword Arguments:
+        ttl {datetime.timedelta} -- Maximum age of a download (default: {ALLOCATION_TTL})
+
+    Returns:
+        list -- Rooms that are missing, do not cover the window or are expired
+    """
+    metadata = store.metadata if store is not None else {}
+    now = datetime.datetime.now()
+    missing, uncovered, expired = [], [], []
+    for room in rooms:
+        if room not in metadata:
+            missing.append(room)
+        elif not covers(metadata[room], window):
+            uncovered.append(room)
+        elif is_expired(metadata[room], ttl, now):
+            expired.append(room)
+    LOGGER.debug(
+        f"Refresh plan: {len(missing)} missing, {len(uncovered)} not covering the window, "
+        f"{len(expired)} expired."
+    )
+    return missing + uncovered + expired
+
+
+def refresh_room_info(force: bool = False, filepath: str = ROOM_CONFIG) -> RoomCatalog:
+    """Returns the room catalog, downloading the global room info first if needed
+
+    Keyword Arguments:
+        force {bool} -- Download even if the room info is up to date (default: {False})
+        filepath {str} -- Path to room info file (default: {ROOM_CONFIG})
+
+    Returns:
+        RoomCatalog -- Catalog of the (re-)downloaded room info
+    """
+    catalog = load_room_catalog(filepath) if os.path.exists(filepath) else None
+    if force or room_info_needs_refresh(filepath):
+        LOGGER.debug("Pulling new room info.")
+        validators = catalog.metadata.get("validators") if catalog is not None else None
+        catalog = load_room_catalog(download_global_room_info(filepath, validators=validators))
+    return catalog
+
+
+def refresh_allocations(
+    rooms: Iterable[str],
+    store: Optional[AllocationStore],
+    window: Tuple,
+    ttl: datetime.timedelta = ALLOCATION_TTL,
+    force: bool = False,
+    concurrency: int = MAX_CONCURRENCY,
+    progress: Optional[Callable[[int, int], None]] = None,
+    horizon: Optional[Tuple[int, int]] = ALLOCATION_HORIZON,
+) -> Optional[AllocationStore]:
+    """Downloads the planned rooms and merges them into the allocation cache
+
+    Rooms that are up to date but do not cover the window only download the missing
+    date ranges, which are merged into their files.
+
+    Arguments:
+        rooms {Iterable[str]} -- Room names in format BUILDING FLOOR ROOM
+        store {AllocationStore} -- Downloaded allocations (None if nothing is downloaded)
+        window {tuple} -- (datetime_from, datetime_to) that must be covered
+
+    Keyword Arguments:
+        ttl {datetime.timedelta} -- Maximum age of a download (default: {ALLOCATION_TTL})
+        force {bool} -- Download all given rooms (default: {False})
+        concurrency {int} -- Maximum number of concurrent downloads (default: {MAX_CONCURRENCY})
+        progress {Callable} -- Called with (done, total) after every room (default: {None})
+        horizon {tuple} -- Days (past, future) around today kept in merged files
+            (default: {ALLOCATION_HORIZON})
+
+    Returns:
+        AllocationStore -- Updated store (the given store if nothing was downloaded)
+    """
+    rooms = list(rooms) if force else plan_refresh(rooms, store, window, ttl)
+    if not rooms:
+        LOGGER.debug("All room allocations are up to date.")
+        return store
+
+    from_date, to_date = download_range(window)
+    metadata = store.metadata if store is not None else {}
+    now = datetime.datetime.now()
+    ranges = {
+        room: missing_ranges(metadata[room], from_date, to_date)
+        for room in rooms
+        if not force and room in metadata and not is_expired(metadata[room], ttl, now)
+    }
+    LOGGER.info(
+        f"Downloading {len(rooms)} room allocations, {len(ranges)} of them partially."
+    )
+    downloads = download_room_allocations(
+        rooms,
+        from_date,
+        to_date,
+        metadata=metadata,
+        ranges=ranges,
+        horizon=horizon,
+        concurrency=concurrency,
+        progress=progress,
+    )
+    changed = [download.filepath for download in downloads.values() if download.changed]
+    LOGGER.info(
+        f"{len(downloads)}/{len(rooms)} room allocations have been downloaded, "
+        f"{len(changed)} changed."
+    )
+    return update_allocation_store(
+        changed, metadata={room: download.metadata for room, download in downloads.items()}
+    )
@@ -0,0 +1,212 @@
+"""
+Cache of search results in front of the scoring step.
+1. Key a search by its fields (location, building, filters, start, duration, top), the
+   scoring config and the version of the data
+2. Keep the results of recent searches in memory with LRU eviction
+3. Optionally share them between processes (CLI, Streamlit app, server) through a
+   directory with one file per search, evicting the least recently used files. The
+   number of files is kept in a counter file, the directory is only listed to evict
+
+The data version combines the version of the allocation store, which changes whenever
+downloaded allocation files are merged into it, and the version of room_info.json, so
+results of changed data are never served. Searches for now are answered for the
+start of the current bucket (see `bucket_start`) so that they share results.
+"""
+import datetime
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, List, Optional
+
+from eth_tools.room_allocation.bucket_index import BUCKET_MINUTES
+from eth_tools.room_allocation.profiling import count
+from eth_tools.settings import RESULT_CACHE
+
+LOGGER = logging.getLogger(__name__)
+
+MAX_ENTRIES = 1024  # Searches kept in memory
+MAX_FILES = 10000  # Searches kept on disk
+EVICT_TO = 0.9  # Fraction of max_files kept by an eviction, the directory is scanned once
+# per (1 - EVICT_TO) * max_files new files
+COUNT_FILE = "count"  # Number of files in the directory, shared by all processes
+
+
+def bucket_start(dt: datetime.datetime) -> datetime.datetime:
+    """Returns the start of the BUCKET_MINUTES bucket of the given datetime."""
+    return dt.replace(minute=dt.minute - dt.minute % BUCKET_MINUTES, second=0, microsecond=0)
+
+
+def data_version(catalog, store) -> Optional[str]:
+    """Returns the version of the given `RoomCatalog` and `AllocationStore`, None if
+    either is not versioned (not loaded from disk)."""
+    if catalog.version is None or store.version is None:
+        return None
+    return f"{store.version}:{catalog.version}"
+
+
+class ResultCache:
+    """LRU cache of search results, optionally backed by a shared directory.
+
+    Attributes:
+        hits {int} -- Searches answered from the cache
+        misses {int} -- Searches not found in the cache
+    """
+
+    def __init__(
+        self,
+        max_entries: int = MAX_ENTRIES,
+        directory: Optional[str] = None,
+        max_files: int = MAX_FILES,
+        name: str = "result_cache",
+    ):
+        """Creates an empty cache
+
+        Keyword Arguments:
+            max_entries {int} -- Searches kept in memory (default: {MAX_ENTRIES})
+            directory {str} -- Directory shared between processes (default: {None} =
+                memory only, RESULT_CACHE is the directory shared by the CLI and the app)
+            max_files {int} -- Searches kept in directory (default: {MAX_FILES})
+            name {str} -- Prefix of the profiling counters (default: {"result_cache"})
+        """
+        self.name = name
+        self.max_entries = max_entries
+        self.directory = directory
+        self.max_files = max_files
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._version = None
+        self._lock = threading.Lock()
+        if directory is not None:
+            os.makedirs(directory, exist_ok=True)
+
+    @classmethod
+    def shared(cls) -> "ResultCache":
+        """Returns a cache backed by the directory shared by the CLI and the app."""
+        return cls(directory=RESULT_CACHE)
+
+    @property
+    def hit_rate(self) -> float:
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+    def use_version(self, version: str):
+        """Drops the searches kept in memory if the data version changed."""
+        with self._lock:
+            if version != self._version:
+                self._entries.clear()
+                self._version = version
+
+    def _scan(self) -> List[os.DirEntry]:
+        return [entry for entry in os.scandir(self.directory) if entry.name.endswith(".json")]
+
+    def _count_files(self) -> Optional[int]:
+        """Returns the number of files of the counter file, None if there is none."""
+        try:
+            with open(os.path.join(self.directory, COUNT_FILE), "r") as fh:
+                return int(fh.read())
+        except (OSError, ValueError):  # Missing or partially written
+            return None
+
+    def _set_count(self, files: int):
+        path = os.path.join(self.directory, COUNT_FILE)
+        tmp_path = f"{path}.{os.getpid()}.{time.time_ns():x}.tmp"
+        with open(tmp_path, "w") as fh:
+            fh.write(str(files))
+        os.replace(tmp_path, path)
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, f"{hashlib.sha1(key.encode('utf-8')).hexdigest()}.json")
+
+    def _read(self, key: str) -> Optional[Any]:
+        path = self._path(key)
+        try:
+            with open(path, "r") as fh:
+                entry = json.load(fh)
+            os.utime(path)  # Recently used
+        except (OSError, ValueError):  # Missing, evicted meanwhile or partially written
+            return None
+        return entry["results"] if entry.get("key") == key else None
+
+    def _write(self, key: str, results: Any):
+        path = self._path(key)
+        tmp_path = f"{path}.{os.getpid()}.{time.time_ns():x}.tmp"
+        with open(tmp_path, "w") as fh:
+            json.dump(dict(key=key, results=results), fh, ensure_ascii=False)
+        new = not os.path.exists(path)
+        os.replace(tmp_path, path)
+        if not new:
+            return
+        with self._lock:
+            # Concurrent writers may lose an increment, the next eviction recounts
+            files = self._count_files()
+            files = len(self._scan()) if files is None else files + 1
+            if files <= self.max_files:
+                self._set_count(files)
+                return
+            entries = self._scan()
+            keep = int(self.max_files * EVICT_TO)
+            self._set_count(min(len(entries), keep))
+        entries.sort(key=lambda entry: entry.stat().st_mtime_ns)
+        for entry in entries[: len(entries) - keep]:
+            try:
+                os.remove(entry.path)
+            except OSError:  # Evicted by another process
+                pass
+
+    def get(self, key: str) -> Optional[Any]:
+        """Returns the results of the given search key, None if they are not cached."""
+        with self._lock:
+            results = self._entries.get(key)
+            if results is not None:
+                self._entries.move_to_end(key)
+        if results is None and self.directory is not None:
+            results = self._read(key)
+            if results is not None:
+                self._put(key, results)
+        with self._lock:
+            if results is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        count(f"{self.name}.misses" if results is None else f"{self.name}.hits")
+        return results
+
+    def _put(self, key: str, results: Any):
+        with self._lock:
+            self._entries[key] = results
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def put(self, key: str, results: Any):
+        """Caches the results of the given search key (JSON serializable with a directory)."""
+        self._put(key, results)
+        if self.directory is not None:
+            self._write(key, results)
+
+    def clear(self):
+        """Drops all cached searches, in memory and in the directory."""
+        with self._lock:
+            self._entries.clear()
+        if self.directory is not None:
+            for entry in self._scan():
+                os.remove(entry.path)
+            self._set_count(0)
+
+    def log_stats(self, searches: int, hits: int):
+        """Logs the hits of the last searches and the overall hit rate."""
+        LOGGER.debug(
+            f"{self.name.replace('_', ' ').capitalize()}: {hits}/{searches} searches cached, "
+            f"hit rate {self.hit_rate:.0%} ({self.hits}/{self.hits + self.misses})."
+        )
+
+
+def search_key(fields: List[Any], scoring: List[Any], version: str) -> str:
+    """Returns the cache key of a search with the given fields, scoring parameters
+    (`ScoringConfig.key`) and data version."""
+    return json.dumps([version, scoring, *fields], ensure_ascii=False, default=str)
@@ -1,22 +1,23 @@
 import datetime
 import os
-import numpy as np
-from zoneinfo import ZoneInfo
-
-CET = ZoneInfo("Europe/Zurich")
 
 # Local imports
 from eth_tools.room_allocation.scraper import (
     download_room_allocation,
+    get_filepath,
     load_file_metadata,
-    load_global_room_info,
-    load_room_allocation,
+    load_room_file,
+    update_room_allocation,
 )
+from eth_tools.room_allocation.catalog import load_room_catalog, room_name
+from eth_tools.settings import ROOM_CONFIG, ROOMS_DIR
 
-from eth_tools.room_allocation.fix_scores import GetLocation, GetTypeScore
+from eth_tools.room_allocation.fix_scores import GetLocation
+from eth_tools.room_allocation.profiling import timed
+from eth_tools.room_allocation.scoring_config import DEFAULT_SCORING, EVENING_HOUR
+from eth_tools.room_allocation.slots import CET, SlotType, epoch_seconds, window_minutes
 
 get_location = GetLocation()
-get_type_score = GetTypeScore()
 
 def _midnight_datetime():
     naive_dt = datetime.datetime.combine(datetime.date.today(), datetime.time.max)
@@ -26,35 +27,83 @@ def _now_datetime():
     return datetime.datetime.now(CET).replace(minute=0, second=0, microsecond=0)
 
 
-def _parse_datetime(date_str):
-    # 2023-09-01T08:00:00
-    naive_dt = datetime.datetime.strptime(date_str, "%Y-%m-%dT%H:%M:%S")
-    return naive_dt.replace(tzinfo=CET)
+def _clip(value, low, high):
+    return min(max(value, low), high)
+
+
+def _weighted_sum(scores, weights):
+    """Sums the weighted scores in order, as `scoring.weighted_sum` does for each row
+    (skipping weights of 0, whose infinite distances would make the sum NaN)."""
+    total = 0.0
+    for score, weight in zip(scores, weights):
+        if weight != 0:
+            total += score * weight
+    return total
 
 
 class Room:
-    def __init__(self, filepath, room_info_filepath=None):
+    """Allocation and score of one room.
+
+    Construction does no I/O: the allocation file is read when a slot query first
+    needs it and the room info is looked up in the catalog on first use, so rooms
+    selected from the catalog (`Room.from_info`) only cost what is queried.
+    """
+
+    def __init__(self, filepath, room_info_filepath=None, room_info=None):
         self.filepath = filepath
-        self.metadata = load_file_metadata(filepath)
-        self.allocation = load_room_allocation(filepath)
         self.room_info_filepath = room_info_filepath or os.path.dirname(
             os.path.dirname(self.filepath)
         )
-        self.room_info = next(filter(
-            lambda x: f"{x['building']} {x['floor']} {x['room']}" == self.metadata["room"],
-            load_global_room_info(room_info_filepath)["rooms"],
-        ))
+        self._catalog_filepath = room_info_filepath or ROOM_CONFIG
+        self._metadata = None
+        self._allocation = None
+        self._room_info = room_info
+
+    @classmethod
+    def from_info(cls, room_info, rooms_dir=ROOMS_DIR, room_info_filepath=None):
+        """Returns the room of the given catalog entry, stored in rooms_dir."""
+        filepath = get_filepath(room_name(room_info), rooms_dir)
+        return cls(filepath, room_info_filepath, room_info=room_info)
+
+    @timed("load.room")
+    def _load(self):
+        self._metadata, allocation = load_room_file(self.filepath)
+        self._set_allocation(allocation)
+
+    @property
+    def metadata(self):
+        if self._metadata is None:
+            # The metadata alone is read from the end of the file
+            self._metadata = load_file_metadata(self.filepath)
+        return self._metadata
+
+    @property
+    def allocation(self):
+        if self._allocation is None:
+            self._load()
+        return self._allocation
+
+    @property
+    def room_info(self):
+        if self._room_info is None:
+            self._room_info = load_room_catalog(self._catalog_filepath).get(self.metadata["room"])
+        return self._room_info
+
+    def _set_allocation(self, allocation):
+        """Sets the allocation (slots sorted by date_to)."""
+        self._allocation = allocation
 
     def update_allocation(
         self, datetime_from=_now_datetime(), datetime_to=_midnight_datetime(), force=False
     ):
-        download_room_allocation(
+        # Only the days missing in the file are downloaded and merged into it
+        update_room_allocation(
             self.metadata["room"],
-            date_from=datetime_from.date().isoformat(),
-            date_to=(datetime_to.date() + datetime.timedelta(days=7)).isoformat(),  # 7 spare days
-            filepath=self.room_info_filepath,
+            from_date=datetime_from.date().isoformat(),
+            to_date=(datetime_to.date() + datetime.timedelta(days=7)).isoformat(),  # 7 spare days
+            output_dir=os.path.dirname(self.filepath),
         )
-        self.allocation = load_room_allocation(self.filepath)
+        self._load()
 
     def get_slots(self, datetime_from=_now_datetime(), datetime_to=_midnight_datetime()):
         """Returns the slots of the room for the given datetimes
@@ -72,16 +121,15 @@ class Room:
         if not self.allocation:
             return []
         # update slots if they are not up to date
-        elif _parse_datetime(self.allocation[-1]["date_to"]) < datetime_to:
+        elif self.allocation[-1].end * 60 < epoch_seconds(datetime_to)[1]:
             self.update_allocation(datetime_to=datetime_to)
         # filter slots
-        return list(
-            filter(
-                lambda x: _parse_datetime(x.get("date_from")) <= datetime_to and
-                          _parse_datetime(x.get("date_to")) >= datetime_from,
-                self.allocation,
-            )
-        )
+        from_minute, to_minute = window_minutes(datetime_from, datetime_to)
+        return [
+            slot
+            for slot in self.allocation
+            if slot.start <= to_minute and slot.end >= from_minute
+        ]
 
     def get_available_slots(
         self, datetime_from=_now_datetime(), datetime_to=_midnight_datetime()
@@ -96,13 +144,7 @@ class Room:
             datetime_to (_type_, optional): _description_. Defaults to
                 _midnight_datetime__().
         """
-        available_slots = []
-        for allocation in self.get_slots(datetime_from, datetime_to):
-            belegungsserie = allocation.get("belegungsserie", {})
-            belegungstyp = belegungsserie.get("belegungstyp")
-            if belegungstyp in [7, 15]:
-                available_slots.append(allocation)
-        return available_slots
+        return [slot for slot in self.get_slots(datetime_from, datetime_to) if slot.is_free]
 
     def is_available(self, datetime_from=_now_datetime(), datetime_to=_midnight_datetime()):
         """Checks if the room is fully available for the given datetimes"""
@@ -117,22 +159,22 @@ class Room:
             datetime_from (_type_, optional): _description_: Current timestamp. Defaults to
                 _now_datetime().
         """
-        ignore_slot_type = [8] # 8 = "geschlossen"
+        ignore_slot_type = [SlotType.CLOSED]
 
         previous_slots = self.get_slots(datetime_from.replace(hour=0, minute=0, second=0), 
                                         datetime_from)
-        return list(filter(lambda x: x.get("belegungsserie", {}).get("belegungstyp") 
-                           not in ignore_slot_type, previous_slots))
+        return list(filter(lambda x: x.type not in ignore_slot_type, previous_slots))
     
     
-    def get_delta_to_next_slot(self, datetime_from=_now_datetime()):
+    def get_delta_to_next_slot(self, datetime_from=_now_datetime(), evening_hour=EVENING_HOUR):
         """Returns the time delta to the next slot
         
         Args:
             datetime_from (_type_, optional): _description_: Current timestamp. Defaults to
                 _now_datetime().
+            evening_hour (int, optional): Hour at which rooms close. Defaults to EVENING_HOUR.
         """
-        evening = datetime_from.replace(hour=22, minute=00, second=00) # Many rooms close at 22:00
+        evening = datetime_from.replace(hour=evening_hour, minute=00, second=00)
 
         next_slots = self.get_slots(datetime_from, evening)
         next_slot = next_slots[0] if next_slots else None
@@ -140,44 +182,53 @@ class Room:
         if not next_slot:
             return evening - datetime_from
         else:
-            return _parse_datetime(next_slot["date_from"]) - datetime_from
+            return next_slot.date_from - datetime_from
     
     def get_distance_to_location(self, current_location):
         """Returns distance of room to current location."""
         return get_location(current_location, self.room_info["location"]['areaDesc'])
 
-    def get_score(self, current_location, datetime_from=_now_datetime(), datetime_to=_midnight_datetime()):
-        """Returns the score of the room for the given datetimes"""
+    @timed("score.room")
+    def get_score(
+        self,
+        current_location,
+        datetime_from=_now_datetime(),
+        datetime_to=_midnight_datetime(),
+        config=DEFAULT_SCORING,
+    ):
+        """Returns the score of the room for the given datetimes (weights and parameters
+        of the given `ScoringConfig`)"""
 
+        weights = config.weights
         scores = []
         scores_weights = []
         
         # 1. Is room available?
         scores.append(100*self.is_available(datetime_from, datetime_to))
-        scores_weights.append(0.51)
+        scores_weights.append(weights[0])
         
         # 2. Distance to location
         scores.append(-self.get_distance_to_location(current_location))
-        scores_weights.append(0.15)
+        scores_weights.append(weights[1])
 
         # 3. Has room been used before?
         previous_slots = self.get_previous_slots(datetime_from)
         scores.append(100 if previous_slots else 0)
-        scores_weights.append(0.11)
+        scores_weights.append(weights[2])
 
         # 4. Room type (e.g. prioritise seminar room over lecture hall)
-        scores.append(get_type_score(self.room_info["type"]))
-        scores_weights.append(0.09)
+        scores.append(config.type_score(self.room_info["type"]))
+        scores_weights.append(weights[3])
 
         # 5. Time to next slot (4 hours before next slot yield max points)
-        delta = self.get_delta_to_next_slot(datetime_from).seconds // 60
-        scores.append(np.clip(100 - (4*60 - delta), 0, 100))
-        scores_weights.append(0.09)
+        delta = self.get_delta_to_next_slot(datetime_from, config.evening_hour).seconds // 60
+        scores.append(_clip(100 - (config.next_slot_minutes - delta), 0, 100))
+        scores_weights.append(weights[4])
 
         # 6. Room capacity - Larger rooms attract more people
         number_of_seats = int(self.room_info.get("seats", 0))
-        scores.append(np.clip(100 - number_of_seats, 0, 100))
-        scores_weights.append(0.05)
+        scores.append(_clip(100 - number_of_seats, 0, 100))
+        scores_weights.append(weights[5])
 
         # details = f"""
         # Room {self.metadata["room"]}:
@@ -191,7 +242,7 @@ class Room:
         # Total score: {np.dot(scores, scores_weights):.2f}
         # """
 
-        return np.dot(scores, scores_weights)
+        return _weighted_sum(scores, scores_weights)
     
     # def get_score(self, current_location, datetime_from=_now_datetime(), datetime_to=_midnight_datetime()):
     #     """Returns the score of the room for the given datetimes"""
@@ -1,54 +1,120 @@
-import os
 import datetime
-from tabulate import tabulate
+import json
 
 import logging
 import argparse
-import concurrent.futures  # New import for parallelism
+import sys
+from zoneinfo import ZoneInfo
 
-# Local imports
-from eth_tools.room_allocation.room import Room
+# Local imports, modules using numpy, tabulate or the HTTP clients are imported
+# when needed to keep `--help` and `--server` queries fast
 from eth_tools.room_allocation.fix_scores import GetLocation
-from eth_tools.room_allocation.scraper import (
-    download_global_room_info,
-    load_global_room_info,
-    download_room_allocation,
-)
-
-from eth_tools.settings import ROOMS_DIR, ROOM_CONFIG
+from eth_tools.room_allocation.profiling import PROFILER
+from eth_tools.room_allocation.scraper import MAX_CONCURRENCY
+from eth_tools.settings import ALLOCATION_HORIZON, ALLOCATION_TTL
 
 LOGGER = logging.getLogger(__name__)
-MAX_WORKERS = 8
 
-def process_room(i, room_data, from_date, total_rooms):
+def get_rooms_info(catalog, location, building=None, room_type=None, min_seats=None):
     """
-    Worker function to download room allocation.
+    Get rooms info from the room catalog.
     """
-    try:
-        LOGGER.info(f"Downloading room {i+1}/{total_rooms}")
-        download_room_allocation(
-            room=f"{room_data['building']} {room_data['floor']} {room_data['room']}",
-            from_date=from_date.date().isoformat(),
-            to_date=(from_date.date() + datetime.timedelta(days=7)).isoformat(),
+    rooms_info = catalog.select(location, building, room_type, min_seats)
+
+    if building and not rooms_info:
+        assert catalog.select(location, building), (
+            f"No rooms found in building {building}. Check building name."
         )
-    except Exception as e:
-        LOGGER.error(f"Failed to download room {i+1}: {e}")
+
+    return rooms_info
 
 
-def get_rooms_info(rooms, location, building=None):
+def search_server(args):
     """
-    Get rooms info from global room info.
+    Get scores (or free rooms with --longest_free) from a running `find-room serve` instance.
     """
-    rooms_info = ([room for room in rooms \
-                   if room["location"]["areaDesc"] == location])
-    
-    if building:
-        rooms_info = ([room for room in rooms_info \
-                      if room["building"] == building])
-        assert rooms_info, f"No rooms found in building {building}. Check building name."
+    from urllib import error, parse, request
+
+    query = parse.urlencode(
+        dict(
+            location=args.location,
+            building=args.building or "",
+            when=args.when or "",
+            duration=args.duration,
+            top=args.top,
+            free_only=int(args.free_only),
+            near=args.near or "",
+            room_type=args.room_type or "",
+            min_seats=args.min_seats or "",
+            weights=",".join(map(str, args.weights)) if args.weights else "",
+            scoring=json.dumps(read_scoring_file(args)) if args.scoring else "",
+            spread=int(args.spread),
+        )
+    )
+    path = "/free" if args.longest_free else "/search"
+    try:
+        with request.urlopen(f"{args.server.rstrip('/')}{path}?{query}") as response:
+            payload = json.load(response)
+    except error.HTTPError as e:
+        raise AssertionError(json.load(e).get("error", e.reason)) from None
+    LOGGER.debug(f"Server answered in {payload['took_ms']:.1f} ms (version {payload['version']}).")
+    if args.longest_free:
+        return [(result["room"], result["free_until"]) for result in payload["results"]]
+    return [(result["room"], result["score"]) for result in payload["results"]]
+
+
+def search_server_batch(args, queries):
+    """
+    Get scores of many queries from a running `find-room serve` instance.
+    """
+    from urllib import error, request
+
+    body = dict(queries=[query.to_dict() for query in queries], spread=args.spread)
+    if args.scoring:
+        body["scoring"] = read_scoring_file(args)
+    if args.weights:
+        body["weights"] = args.weights
+    body = json.dumps(body).encode("utf-8")
+    req = request.Request(
+        f"{args.server.rstrip('/')}/batch",
+        data=body,
+        headers={"Content-Type": "application/json"},
+    )
+    try:
+        with request.urlopen(req) as response:
+            payload = json.load(response)
+    except error.HTTPError as e:
+        raise AssertionError(json.load(e).get("error", e.reason)) from None
+    LOGGER.debug(f"Server answered in {payload['took_ms']:.1f} ms (version {payload['version']}).")
+    return [
+        [(result["room"], result["score"]) for result in query_results]
+        for query_results in payload["results"]
+    ]
+
+
+def read_scoring_file(args) -> dict:
+    """
+    JSON object of the --scoring file, sent to the server which parses it.
+    """
+    with open(args.scoring, "r") as fh:
+        return json.load(fh)
+
+
+def get_scoring_config(args):
+    """
+    Scoring config of the --scoring file (default scoring.json in the data directory),
+    with the weights of --weights.
+    """
+    from eth_tools.room_allocation.scoring_config import (
+        default_scoring_config,
+        load_scoring_config,
+    )
+
+    config = load_scoring_config(args.scoring) if args.scoring else default_scoring_config()
+    if args.weights:
+        config = config.with_weights(args.weights)
+    return config
 
-    return rooms_info
-        
 
 def run(args):
     if args.verbose:
@@ -56,6 +122,90 @@ def run(args):
     else:
         logging.basicConfig(level=logging.INFO)
 
+    command = run_batch if args.batch else search
+    if args.profile or args.trace:
+        PROFILER.enable()
+        try:
+            command(args)
+        finally:
+            print_profile(args.trace)
+    else:
+        command(args)
+
+def run_batch(args):
+    """
+    Answer all queries of a JSON Lines file, printing one JSON result per line.
+    """
+    from eth_tools.room_allocation.allocations import CET, AllocationStore
+    from eth_tools.room_allocation.allocation_cache import get_allocation_store
+    from eth_tools.room_allocation.batch import (
+        batch_window,
+        candidate_rooms,
+        load_queries,
+        search_batch,
+    )
+    from eth_tools.room_allocation.catalog import room_name
+    from eth_tools.room_allocation.refresh import refresh_allocations, refresh_room_info
+
+    # Command line arguments are the defaults of fields missing in a query
+    defaults = dict(
+        location=args.location,
+        building=args.building,
+        when=args.when,
+        duration=args.duration,
+        top=args.top,
+        free_only=args.free_only or None,
+        near=args.near,
+        room_type=args.room_type,
+        min_seats=args.min_seats,
+    )
+    queries = load_queries(args.batch, defaults)
+
+    if args.server:
+        results = search_server_batch(args, queries)
+    else:
+        now = datetime.datetime.now(CET)
+        catalog = refresh_room_info(force=args.force_update)
+        rooms = {room_name(room) for query in queries for room in candidate_rooms(catalog, query)}
+        store = refresh_allocations(
+            sorted(rooms),
+            get_allocation_store(),
+            batch_window(queries, now),
+            ttl=datetime.timedelta(hours=args.ttl),
+            force=args.force_update,
+            concurrency=args.concurrency,
+            progress=lambda done, total: LOGGER.debug(f"Downloaded room {done}/{total}"),
+            horizon=args.horizon,
+        )
+        if store is None:
+            store = AllocationStore.from_allocations({})
+        cache = None
+        if args.result_cache:
+            from eth_tools.room_allocation.result_cache import ResultCache
+
+            cache = ResultCache.shared()
+        results = search_batch(
+            # Load spreading ranks all candidates by their penalized scores
+            [query._replace(top=None) for query in queries] if args.spread else queries,
+            catalog,
+            store,
+            now=now,
+            cache=cache,
+            config=get_scoring_config(args),
+        )
+        if args.spread:
+            from eth_tools.room_allocation.spreading import LoadSpreader
+
+            spreader = LoadSpreader()
+            results = [
+                spreader.recommend(scores, query.top) for query, scores in zip(queries, results)
+            ]
+
+    for query, scores in zip(queries, results):
+        rooms = [dict(room=room, score=score) for room, score in scores]
+        print(json.dumps(dict(query.to_dict(), results=rooms), ensure_ascii=False))
+
+def search(args):
     # ==============
     # Validity check
     # ==============
@@ -65,10 +215,24 @@ def run(args):
     assert args.location in VALID_LOCATIONS, f"Invalid location. Valid locations are: {', '.join(VALID_LOCATIONS)}"
     assert args.top > 1, "Top rooms should be greater than 1."
 
+    if args.server:
+        if args.longest_free:
+            print_free_rooms(search_server(args), args.when, args.top)
+        else:
+            print_scores(search_server(args), args.top)
+        return
+
+    from eth_tools.room_allocation.allocations import CET, AllocationStore
+    from eth_tools.room_allocation.allocation_cache import get_allocation_store
+    from eth_tools.room_allocation.bucket_index import FreeRoomIndex
+    from eth_tools.room_allocation.catalog import room_name
+    from eth_tools.room_allocation.refresh import refresh_allocations, refresh_room_info
+    from eth_tools.room_allocation.scoring import score_rooms
+
     from_date = (
-        datetime.datetime.strptime(args.when, "%Y-%m-%dT%H:%M:%S")
+        datetime.datetime.strptime(args.when, "%Y-%m-%dT%H:%M:%S").replace(tzinfo=CET)
         if args.when
-        else datetime.datetime.now()
+        else datetime.datetime.now(CET)
     )
 
     to_date = from_date + datetime.timedelta(hours=args.duration)
@@ -77,84 +241,166 @@ def run(args):
     # Ensure data availability
     # ========================
 
-    # Check if desired rooms are present
-    if os.path.exists(ROOM_CONFIG) and os.path.exists(ROOMS_DIR) and not args.force_update:
-        room_info = load_global_room_info(ROOM_CONFIG)
-        
-        target_rooms = get_rooms_info(room_info["rooms"], args.location, args.building)
-        target_rooms_names = {f"{room['building']}-{room['floor']}-{room['room']}" for room in target_rooms}
-        downloaded_rooms = {room.stem for room in ROOMS_DIR.iterdir() if room.suffix == ".json"}
-
-        if target_rooms_names.intersection(downloaded_rooms) != target_rooms_names:
-            args.force_update = True
-            LOGGER.debug("Not all room files present. Forcing update.")
-
-    # Fetch missing room information
-    if not os.path.exists(ROOM_CONFIG) or args.force_update:
-
-        if args.force_update:
-            LOGGER.debug("Force update flag set. Pulling new room info.")
-        else:
-            LOGGER.debug("Room info file not found. Pulling new one.")
-
-        global_room_info_path = download_global_room_info()
-        room_info = load_global_room_info(global_room_info_path)
-
-        rooms = get_rooms_info(room_info["rooms"], args.location, args.building)
-
-        total_rooms = len(rooms)
-
-        with concurrent.futures.ThreadPoolExecutor(max_workers=MAX_WORKERS) as executor:
-            # Prepare futures
-            futures = [
-                executor.submit(process_room, i, room_data, from_date, total_rooms)
-                for i, room_data in enumerate(rooms)
-            ]
-
-            # Process as they complete
-            for future in concurrent.futures.as_completed(futures):
-                future.result()
+    catalog = refresh_room_info(force=args.force_update)
+    target_rooms = sorted(
+        get_rooms_info(catalog, args.location, args.building, args.room_type, args.min_seats),
+        key=room_name,
+    )
 
-        LOGGER.info("All room allocations have been processed.")
-    else:
-        LOGGER.debug("Room info file found.")
+    # Fetch missing or outdated room allocations
+    store = refresh_allocations(
+        (room_name(room) for room in target_rooms),
+        get_allocation_store(),
+        (from_date, to_date),
+        ttl=datetime.timedelta(hours=args.ttl),
+        force=args.force_update,
+        concurrency=args.concurrency,
+        progress=lambda done, total: LOGGER.debug(f"Downloaded room {done}/{total}"),
+        horizon=args.horizon,
+    )
 
     # ================
     # Calculate scores
     # ================
 
-    scores = {}
-    for room_file in sorted(ROOMS_DIR.iterdir()):
-        if room_file.suffix != ".json":
-            continue
-
-        room = Room(room_file, ROOM_CONFIG)
+    config = get_scoring_config(args)
 
-        if room.room_info["location"]["areaDesc"] != args.location:
-            continue
+    if store is None:
+        store = AllocationStore.from_allocations({})
 
-        if args.building and room.room_info["building"] != args.building:
-            continue
+    if args.longest_free:
+        from eth_tools.room_allocation.timeline import FreeTimeline
 
-        scores[room.metadata['room']] = room.get_score(
-            current_location=args.location, datetime_to=to_date
+        free_rooms = FreeTimeline.from_store(store).longest_free(
+            from_date,
+            args.top,
+            min_duration=to_date - from_date,
+            names=[room_name(room) for room in target_rooms],
+        )
+        print_free_rooms(
+            [(room, until.strftime("%Y-%m-%dT%H:%M:%S")) for room, until in free_rooms],
+            from_date.strftime("%Y-%m-%dT%H:%M:%S"),
+            args.top,
+        )
+        return
+
+    # Load spreading ranks all candidates by their penalized scores
+    top = None if args.spread else args.top
+
+    if args.result_cache:
+        from eth_tools.room_allocation.batch import parse_query, search_batch
+        from eth_tools.room_allocation.result_cache import ResultCache
+
+        query = parse_query(
+            dict(
+                location=args.location,
+                building=args.building,
+                when=args.when,
+                duration=args.duration,
+                top=args.top,
+                free_only=args.free_only,
+                near=args.near,
+                room_type=args.room_type,
+                min_seats=args.min_seats,
+            )
         )
+        scores = search_batch(
+            [query._replace(top=top)],
+            catalog,
+            store,
+            now=from_date,
+            cache=ResultCache.shared(),
+            config=config,
+        )[0]
+    else:
+        if args.free_only:
+            free_rooms = set(FreeRoomIndex.from_store(store).free_rooms(from_date, to_date))
+            target_rooms = [room for room in target_rooms if room_name(room) in free_rooms]
+
+        scores = score_rooms(
+            target_rooms,
+            args.location,
+            (from_date, to_date),
+            store,
+            top=top,
+            travel=catalog.travel_times,
+            near=args.near,
+            config=config,
+        )
+
+    if args.spread:
+        from eth_tools.room_allocation.spreading import LoadSpreader
+
+        scores = LoadSpreader().recommend(scores, args.top)
 
     # ============
     # Print result
     # ============
 
-    sorted_scores = sorted(scores, key=scores.get, reverse=True)
-    try:
-        table_data = [[room, scores[room]] for room in sorted_scores[:args.top]]
-    except ValueError:
-        LOGGER.warning("Less than 10 rooms found.")
-        table_data = [[room, scores[room]] for room in sorted_scores]
+    print_scores(scores, args.top)
+
+def print_profile(trace=None):
+    from tabulate import tabulate
+
+    phases = [
+        [phase["phase"], phase["calls"], phase["total_ms"], phase["mean_ms"], phase["max_ms"]]
+        for phase in PROFILER.phases()
+    ]
+    print(
+        tabulate(
+            phases,
+            headers=["Phase", "Calls", "Total [ms]", "Mean [ms]", "Max [ms]"],
+            floatfmt=".2f",
+            tablefmt="fancy_grid",
+        )
+    )
+    if PROFILER.counters:
+        counters = sorted(PROFILER.counters.items())
+        print(tabulate(counters, headers=["Counter", "Value"], tablefmt="fancy_grid"))
+    if trace:
+        LOGGER.info(f"Chrome trace written to {PROFILER.export_chrome_trace(trace)}")
+
+def print_scores(scores, top):
+    from tabulate import tabulate
+
+    if len(scores) < top:
+        LOGGER.warning(f"Less than {top} rooms found.")
+    table_data = [[room, score] for room, score in scores]
 
     print(tabulate(table_data, headers=["Room", "Score"], tablefmt="fancy_grid"))
 
+def print_free_rooms(free_rooms, when, top):
+    from tabulate import tabulate
+
+    if len(free_rooms) < top:
+        LOGGER.warning(f"Less than {top} rooms found.")
+    if when:
+        start = datetime.datetime.strptime(when, "%Y-%m-%dT%H:%M:%S")
+    else:
+        start = datetime.datetime.now(ZoneInfo("Europe/Zurich")).replace(tzinfo=None)
+    table_data = []
+    for room, until in free_rooms:
+        free_until = datetime.datetime.strptime(until, "%Y-%m-%dT%H:%M:%S")
+        hours = (free_until - start).total_seconds() / 3600
+        table_data.append([room, until.replace("T", " "), hours])
+
+    print(
+        tabulate(
+            table_data,
+            headers=["Room", "Free until", "Free [h]"],
+            floatfmt=".2f",
+            tablefmt="fancy_grid",
+        )
+    )
+
 def main():
     """Run search for best room."""
+    if sys.argv[1:2] == ["serve"]:
+        from eth_tools.room_allocation import server
+
+        server.main(sys.argv[2:])
+        return
+
     parser = argparse.ArgumentParser(
         description="Search script for empty room at ETHZ."
     )
@@ -162,8 +408,7 @@ def main():
         "-l",
         "--location",
         type=str,
-        required=True,
-        help="Location to search room at.",
+        help="Location to search room at (required unless given per query with --batch).",
     )
     parser.add_argument(
         "-d",
@@ -190,11 +435,122 @@ def main():
         type=str,
         help="Constrain search to building.",
     )
+    parser.add_argument(
+        "--type",
+        dest="room_type",
+        type=str,
+        help="Constrain search to a room type (e.g. 'Seminars / Courses').",
+    )
+    parser.add_argument(
+        "--min_seats",
+        type=int,
+        help="Constrain search to rooms with at least this many seats.",
+    )
+    parser.add_argument(
+        "--near",
+        type=str,
+        help=(
+            "Building you are in. Rooms are ranked by the travel time from it where "
+            "building travel times are known (travel_times.json in the data directory)."
+        ),
+    )
+    parser.add_argument(
+        "--scoring",
+        type=str,
+        help=(
+            "Scoring config (JSON with weights, next_slot_hours, evening_hour, type_scores). "
+            "Default is scoring.json in the data directory if present."
+        ),
+    )
+    parser.add_argument(
+        "--weights",
+        type=float,
+        nargs=6,
+        metavar=("AVAILABLE", "DISTANCE", "PREVIOUS", "TYPE", "NEXT_SLOT", "SEATS"),
+        help="Weights of the score features, overriding those of the scoring config.",
+    )
     parser.add_argument(
         "--force_update",
         action="store_true",
         help="Force update room info.",
     )
+    parser.add_argument(
+        "--free_only",
+        action="store_true",
+        help="Only recommend rooms that are free for the whole duration.",
+    )
+    parser.add_argument(
+        "--spread",
+        action="store_true",
+        help=(
+            "Spread students over more rooms: rooms recommended often recently (by the CLI, "
+            "the app or the server) are penalized, and the recommended rooms are counted."
+        ),
+    )
+    parser.add_argument(
+        "--longest_free",
+        action="store_true",
+        help=(
+            "List the rooms free for the longest contiguous time from --when on (at least "
+            "--duration hours) instead of scoring them."
+        ),
+    )
+    parser.add_argument(
+        "--ttl",
+        type=float,
+        default=ALLOCATION_TTL.total_seconds() / 3600,
+        help="Hours after which downloaded room allocations are refreshed.",
+    )
+    parser.add_argument(
+        "--concurrency",
+        type=int,
+        default=MAX_CONCURRENCY,
+        help="Maximum number of concurrent downloads.",
+    )
+    parser.add_argument(
+        "--horizon",
+        type=int,
+        nargs=2,
+        metavar=("PAST", "FUTURE"),
+        default=ALLOCATION_HORIZON,
+        help=(
+            "Keep only the days from PAST days ago to FUTURE days ahead in the downloaded "
+            "allocations (e.g. 1 28). Days outside are pruned when new days are merged."
+        ),
+    )
+    parser.add_argument(
+        "--result_cache",
+        action="store_true",
+        help=(
+            "Reuse the results of identical searches on unchanged data, shared with the "
+            "app (.results in the data directory). Searches for now start at the current "
+            "quarter hour."
+        ),
+    )
+    parser.add_argument(
+        "--batch",
+        type=str,
+        help=(
+            "Answer all queries of a JSON Lines file (fields location, building, when, "
+            "duration, top, free_only; missing fields default to the arguments) and print "
+            "one JSON result per line."
+        ),
+    )
+    parser.add_argument(
+        "--server",
+        type=str,
+        help="Query a running 'find-room serve' instance (e.g. http://127.0.0.1:8765).",
+    )
+    parser.add_argument(
+        "--profile",
+        action="store_true",
+        help="Print the time spent per phase and the counters (requests, files, cache hits).",
+    )
+    parser.add_argument(
+        "--trace",
+        type=str,
+        help="Write a Chrome trace (chrome://tracing, Perfetto) of the run to the given file.",
+    )
     parser.add_argument(
         "-v",
         "--verbose",
@@ -203,6 +559,8 @@ def main():
     )
 
     args = parser.parse_args()
+    if not args.location and not args.batch:
+        parser.error("the following arguments are required: -l/--location")
     run(args)
 
 if __name__ == '__main__':
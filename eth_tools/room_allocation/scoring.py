@@ -0,0 +1,292 @@
+"""
+Batch score calculator for many candidate rooms.
+1. Build the (rooms x features) feature matrix from the allocation store
+2. Score all rooms with one weighted sum over the feature columns
+3. Select the top k rooms without sorting all scores
+4. Score many queries at once, computing the window features of all rooms in one
+   sweep per distinct window
+5. Look up the distances of all candidates with one gather from the travel time
+   matrices (`travel.TravelTimes`), by building where building travel times are known
+6. Keep the feature matrix of the candidates (`CandidateFeatures`) to re-rank them
+   when only the weights of the `ScoringConfig` change
+"""
+from typing import List, NamedTuple, Optional, Sequence, Tuple
+
+import numpy as np
+
+from eth_tools.room_allocation.allocations import AllocationStore
+from eth_tools.room_allocation.catalog import room_name
+from eth_tools.room_allocation.profiling import span, timed
+from eth_tools.room_allocation.scoring_config import (
+    DEFAULT_SCORING,
+    EVENING_HOUR,
+    FEATURES,
+    ScoringConfig,
+)
+from eth_tools.room_allocation.travel import TravelTimes
+
+WEIGHTS = np.array(DEFAULT_SCORING.weights)
+
+
+class WindowFeatures(NamedTuple):
+    """Window dependent features of all rooms of a store, one row per window."""
+
+    available: np.ndarray
+    previous_usage: np.ndarray
+    minutes_to_next_slot: np.ndarray
+
+
+@timed("score.window_features")
+def window_features(
+    windows: Sequence[Tuple], store: AllocationStore, evening_hour: int = EVENING_HOUR
+) -> WindowFeatures:
+    """Returns the window dependent features of all rooms for the given windows
+
+    Arguments:
+        windows {Sequence[tuple]} -- (datetime_from, datetime_to) per window, timezone aware
+        store {AllocationStore} -- Allocations of the rooms
+
+    Keyword Arguments:
+        evening_hour {int} -- Hour at which rooms close (default: {EVENING_HOUR})
+
+    Returns:
+        WindowFeatures -- Arrays of shape (len(windows), rooms)
+    """
+    datetimes_from = [datetime_from for datetime_from, _ in windows]
+    return WindowFeatures(
+        store.is_available_many(windows),
+        store.has_previous_slots_many(datetimes_from),
+        store.minutes_to_next_slot_many(datetimes_from, evening_hour),
+    )
+
+
+def _feature_matrix(
+    candidates: Sequence[dict],
+    current_location: str,
+    ids: np.ndarray,
+    features: WindowFeatures,
+    row: int,
+    travel: Optional[TravelTimes] = None,
+    near: Optional[str] = None,
+    config: ScoringConfig = DEFAULT_SCORING,
+) -> np.ndarray:
+    if travel is None:
+        travel = TravelTimes.from_rooms(candidates)
+    matrix = np.empty((len(candidates), len(FEATURES)))
+    matrix[:, 0] = 100 * features.available[row, ids]
+    matrix[:, 1] = -travel.minutes(current_location, travel.codes(candidates), near)
+    matrix[:, 2] = np.where(features.previous_usage[row, ids], 100, 0)
+    type_score = config.type_score
+    matrix[:, 3] = [type_score(room["type"]) for room in candidates]
+    delta = features.minutes_to_next_slot[row, ids]
+    matrix[:, 4] = np.clip(100 - (config.next_slot_minutes - delta), 0, 100)
+    seats = np.array([int(room.get("seats", 0)) for room in candidates], dtype=np.int64)
+    matrix[:, 5] = np.clip(100 - seats, 0, 100)
+    return matrix
+
+
+@timed("score.features")
+def feature_matrix(
+    candidates: Sequence[dict],
+    current_location: str,
+    window: Tuple,
+    store: AllocationStore,
+    travel: Optional[TravelTimes] = None,
+    near: Optional[str] = None,
+    config: ScoringConfig = DEFAULT_SCORING,
+) -> np.ndarray:
+    """Returns the feature matrix of the given candidate rooms
+
+    Arguments:
+        candidates {Sequence[dict]} -- Room infos of the candidates (all present in store)
+        current_location {str} -- Location of the user
+        window {tuple} -- (datetime_from, datetime_to), timezone aware
+        store {AllocationStore} -- Allocations of the candidates
+
+    Keyword Arguments:
+        travel {TravelTimes} -- Travel times, e.g. `RoomCatalog.travel_times`
+            (default: {None} = location travel times of the candidates)
+        near {str} -- Building of the user, for building travel times (default: {None})
+        config {ScoringConfig} -- Feature parameters, the weights are not used
+            (default: {DEFAULT_SCORING})
+
+    Returns:
+        np.ndarray -- Matrix of shape (len(candidates), len(FEATURES))
+    """
+    ids = store.room_ids(room_name(room) for room in candidates)
+    features = window_features([window], store, config.evening_hour)
+    return _feature_matrix(candidates, current_location, ids, features, 0, travel, near, config)
+
+
+def weighted_sum(features: np.ndarray, weights: Sequence[float]) -> np.ndarray:
+    """Returns the weighted sum of the feature columns for each row
+
+    The columns are accumulated in a fixed order so that a row yields the same
+    score whether it is scored alone (`Room.get_score`) or in a batch, which a
+    BLAS backed `features @ weights` does not guarantee. Columns of weight 0 are
+    skipped, the distance of an unknown location is infinite and 0 * inf is NaN.
+    """
+    scores = np.zeros(len(features))
+    for column, weight in zip(features.T, weights):
+        if weight != 0:
+            scores += column * weight
+    return scores
+
+
+def top_k(scores: np.ndarray, k: Optional[int] = None) -> np.ndarray:
+    """Returns the indices of the k highest scores in descending order
+
+    Ties keep the order of the scores, like a stable descending sort would.
+    """
+    if k is None or k >= len(scores):
+        return np.argsort(-scores, kind="stable")
+    if k <= 0:
+        return np.array([], dtype=np.int64)
+    kth = np.partition(-scores, k - 1)[k - 1]
+    selected = np.flatnonzero(-scores <= kth)
+    return selected[np.argsort(-scores[selected], kind="stable")][:k]
+
+
+class CandidateFeatures(NamedTuple):
+    """Feature matrix of the candidates of one query, to be ranked with any weights."""
+
+    names: List[str]
+    matrix: np.ndarray  # Shape (len(names), len(FEATURES))
+
+    def rank(self, weights: Sequence[float], top: Optional[int] = None) -> List[Tuple[str, float]]:
+        """Returns the top rooms by the weighted sum of their features
+
+        Arguments:
+            weights {Sequence[float]} -- Weight per feature
+
+        Keyword Arguments:
+            top {int} -- Number of rooms to return (default: {None} = all)
+
+        Returns:
+            list -- (room name, score) sorted by descending score
+        """
+        if not self.names:
+            return []
+        scores = weighted_sum(self.matrix, weights)
+        with span("score.top_k"):
+            best = top_k(scores, top)
+        return [(self.names[i], float(scores[i])) for i in best]
+
+
+def score_rooms(
+    candidates: Sequence[dict],
+    location: str,
+    window: Tuple,
+    store: AllocationStore,
+    top: Optional[int] = None,
+    travel: Optional[TravelTimes] = None,
+    near: Optional[str] = None,
+    config: ScoringConfig = DEFAULT_SCORING,
+) -> List[Tuple[str, float]]:
+    """Returns the best candidate rooms with their scores
+
+    Scores are identical to `Room.get_score` for the same location, window and config
+    (unless building travel times are used with near). Candidates without
+    allocation in the store are skipped.
+
+    Arguments:
+        candidates {Sequence[dict]} -- Room infos of the candidates
+        location {str} -- Location of the user
+        window {tuple} -- (datetime_from, datetime_to), timezone aware
+        store {AllocationStore} -- Allocations of the candidates
+
+    Keyword Arguments:
+        top {int} -- Number of rooms to return (default: {None} = all)
+        travel {TravelTimes} -- Travel times, e.g. `RoomCatalog.travel_times`
+            (default: {None} = location travel times of the candidates)
+        near {str} -- Building of the user, for building travel times (default: {None})
+        config {ScoringConfig} -- Weights and parameters of the score
+            (default: {DEFAULT_SCORING})
+
+    Returns:
+        list -- (room name, score) sorted by descending score
+    """
+    with span("score", candidates=len(candidates)):
+        candidates = [room for room in candidates if room_name(room) in store.ids]
+        if not candidates:
+            return []
+        matrix = feature_matrix(candidates, location, window, store, travel, near, config)
+        features = CandidateFeatures([room_name(room) for room in candidates], matrix)
+        return features.rank(config.weights, top)
+
+
+class ScoreQuery(NamedTuple):
+    """One question of `score_batch`."""
+
+    candidates: Sequence[dict]
+    location: str
+    window: Tuple
+    top: Optional[int] = None
+    near: Optional[str] = None  # Building of the user
+
+
+def feature_batch(
+    queries: Sequence[ScoreQuery],
+    store: AllocationStore,
+    travel: Optional[TravelTimes] = None,
+    config: ScoringConfig = DEFAULT_SCORING,
+) -> List[CandidateFeatures]:
+    """Returns the features of the candidates of every query (see `score_batch`)
+
+    Candidates without allocation in the store are skipped. The weights of config
+    are not used, the features can be ranked with any weights.
+    """
+    windows = {}
+    for query in queries:
+        windows.setdefault(query.window, len(windows))
+    with span("score.batch", queries=len(queries), windows=len(windows)):
+        features = window_features(list(windows), store, config.evening_hour)
+        results = []
+        for query in queries:
+            candidates = [room for room in query.candidates if room_name(room) in store.ids]
+            if not candidates:
+                results.append(CandidateFeatures([], np.empty((0, len(FEATURES)))))
+                continue
+            ids = store.room_ids(room_name(room) for room in candidates)
+            matrix = _feature_matrix(
+                candidates,
+                query.location,
+                ids,
+                features,
+                windows[query.window],
+                travel,
+                query.near,
+                config,
+            )
+            results.append(CandidateFeatures([room_name(room) for room in candidates], matrix))
+        return results
+
+
+def score_batch(
+    queries: Sequence[ScoreQuery],
+    store: AllocationStore,
+    travel: Optional[TravelTimes] = None,
+    config: ScoringConfig = DEFAULT_SCORING,
+) -> List[List[Tuple[str, float]]]:
+    """Returns the best candidate rooms with their scores for every query
+
+    The window dependent features of all rooms are computed once per distinct window
+    in one sweep over the store; scores are identical to `score_rooms`.
+
+    Arguments:
+        queries {Sequence[ScoreQuery]} -- Queries to answer
+        store {AllocationStore} -- Allocations of the candidates
+
+    Keyword Arguments:
+        travel {TravelTimes} -- Travel times, e.g. `RoomCatalog.travel_times`
+            (default: {None} = location travel times of the candidates)
+        config {ScoringConfig} -- Weights and parameters of the score
+            (default: {DEFAULT_SCORING})
+
+    Returns:
+        list -- (room name, score) sorted by descending score, per query
+    """
+    return [
+        features.rank(config.weights, query.top)
+        for query, features in zip(queries, feature_batch(queries, store, travel, config))
+    ]
@@ -0,0 +1,150 @@
+"""
+Tunable parameters of the room score.
+1. Weight per feature (see FEATURES), the horizon of the time to next slot,
+   the evening cutoff and the room type scores
+2. Load them from a JSON file (scoring.json in the data directory by default),
+   override them from the command line or the app
+3. Separate the parameters the features depend on from the weights, so that a change
+   of the weights only re-ranks the cached features (`scoring.CandidateFeatures`)
+
+Example scoring.json (missing fields keep their defaults):
+    {"weights": {"available": 0.6, "distance": 0.2}, "next_slot_hours": 3,
+     "type_scores": {"Lecture hall": 80}}
+
+Kept free of numpy, `find-room` imports it before loading the data.
+"""
+import functools
+import json
+import os
+from typing import Dict, NamedTuple, Optional, Sequence, Tuple, Union
+
+from eth_tools.room_allocation.fix_scores import GetTypeScore
+from eth_tools.settings import SCORING_CONFIG
+
+FEATURES = (
+    "available",  # 1. Is room available?
+    "distance",  # 2. Distance to location
+    "previous_usage",  # 3. Has room been used before?
+    "room_type",  # 4. Room type (e.g. prioritise seminar room over lecture hall)
+    "time_to_next_slot",  # 5. Time to next slot (4 hours before next slot yield max points)
+    "seats",  # 6. Room capacity - Larger rooms attract more people
+)
+WEIGHTS = (0.51, 0.15, 0.11, 0.09, 0.09, 0.05)
+NEXT_SLOT_HOURS = 4  # Hours before the next slot that yield max points
+EVENING_HOUR = 22  # Many rooms close at 22:00
+
+
+@functools.lru_cache(maxsize=16)
+def _type_score(overrides: Tuple[Tuple[str, float], ...]) -> GetTypeScore:
+    return GetTypeScore(dict(overrides))
+
+
+class ScoringConfig(NamedTuple):
+    """Parameters of the room score, the defaults are the scores of `Room.get_score`."""
+
+    weights: Tuple[float, ...] = WEIGHTS  # Per feature of FEATURES
+    next_slot_hours: float = NEXT_SLOT_HOURS
+    evening_hour: int = EVENING_HOUR
+    type_scores: Optional[Dict[str, float]] = None  # Overrides of the `GetTypeScore` table
+
+    @property
+    def next_slot_minutes(self) -> int:
+        return round(self.next_slot_hours * 60)
+
+    @property
+    def type_score(self) -> GetTypeScore:
+        """Returns the room type score with the overrides of type_scores."""
+        return _type_score(tuple(sorted((self.type_scores or {}).items())))
+
+    @property
+    def features_key(self) -> list:
+        """Parameters the features depend on, the features of configs with the same key
+        only differ in their weights."""
+        return [self.next_slot_minutes, self.evening_hour, sorted((self.type_scores or {}).items())]
+
+    @property
+    def key(self) -> list:
+        """All parameters, configs with the same key yield the same scores."""
+        return [list(self.weights), *self.features_key]
+
+    def with_weights(self, weights: Union[Sequence[float], Dict[str, float]]) -> "ScoringConfig":
+        """Returns the config with the given weights, a dict only overrides the weights
+        of the features it names."""
+        if isinstance(weights, dict):
+            unknown = set(weights) - set(FEATURES)
+            if unknown:
+                raise ValueError(
+                    f"Unknown features {', '.join(sorted(unknown))}. "
+                    f"Valid features are: {', '.join(FEATURES)}"
+                )
+            weights = [weights.get(name, weight) for name, weight in zip(FEATURES, self.weights)]
+        if len(weights) != len(FEATURES):
+            raise ValueError(f"Expected {len(FEATURES)} weights ({', '.join(FEATURES)}).")
+        return self._replace(weights=tuple(float(weight) for weight in weights))
+
+    def to_dict(self) -> dict:
+        return dict(self._asdict(), weights=dict(zip(FEATURES, self.weights)))
+
+
+DEFAULT_SCORING = ScoringConfig()
+
+
+def parse_scoring_config(data: dict, base: ScoringConfig = DEFAULT_SCORING) -> ScoringConfig:
+    """Returns the config of the given JSON object
+
+    Arguments:
+        data {dict} -- Fields of `ScoringConfig`, weights as list or as dict by feature
+
+    Keyword Arguments:
+        base {ScoringConfig} -- Values of fields missing in data (default: {DEFAULT_SCORING})
+
+    Returns:
+        ScoringConfig -- Parsed config
+    """
+    if not isinstance(data, dict):
+        raise ValueError(f"A scoring config must be an object, got {type(data).__name__}.")
+    unknown = set(data) - set(ScoringConfig._fields)
+    if unknown:
+        raise ValueError(f"Unknown fields {', '.join(sorted(unknown))}.")
+    config = base
+    if data.get("weights") is not None:
+        config = config.with_weights(data["weights"])
+    if data.get("next_slot_hours") is not None:
+        config = config._replace(next_slot_hours=float(data["next_slot_hours"]))
+    if data.get("evening_hour") is not None:
+        evening_hour = int(data["evening_hour"])
+        if not 0 < evening_hour < 24:
+            raise ValueError("evening_hour must be between 1 and 23.")
+        config = config._replace(evening_hour=evening_hour)
+    if data.get("type_scores") is not None:
+        type_scores = dict(config.type_scores or {})
+        type_scores.update({name: float(score) for name, score in data["type_scores"].items()})
+        config = config._replace(type_scores=type_scores)
+    return config
+
+
+def load_scoring_config(filepath: str, base: ScoringConfig = DEFAULT_SCORING) -> ScoringConfig:
+    """Loads the config of the given JSON file (see the module docstring)
+
+    Arguments:
+        filepath {str} -- Path to the scoring file
+
+    Keyword Arguments:
+        base {ScoringConfig} -- Values of fields missing in the file (default: {DEFAULT_SCORING})
+
+    Returns:
+        ScoringConfig -- Loaded config
+    """
+    with open(filepath, "r") as fh:
+        data = json.load(fh)
+    try:
+        return parse_scoring_config(data, base)
+    except ValueError as e:
+        raise ValueError(f"{filepath}: {e}") from None
+
+
+def default_scoring_config(filepath: str = SCORING_CONFIG) -> ScoringConfig:
+    """Returns the config of the given file, DEFAULT_SCORING if there is none."""
+    if not os.path.exists(filepath):
+        return DEFAULT_SCORING
+    return load_scoring_config(filepath)
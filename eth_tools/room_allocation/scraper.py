@@ -2,29 +2,81 @@
 Scraper for ETHZ room allocation data.
 1. Download the global room info
 2. Download the room allocation of a given room and date range
-3. Load the room allocation from a given file
-4. Load the room allocations from a given directory
+3. Download the room allocations of many rooms concurrently, fetching only the
+   date ranges missing on disk and merging them into the stored allocation
+4. Load the room allocation from a given file as compact `Slot`s
+5. Load the room allocations from a given directory
+
+The HTTP clients (requests, asyncio/aiohttp) are imported when the first download
+starts, loading cached data does not pay for them.
 """
+import functools
+import hashlib
 import json
 import logging
 import os
-from typing import Any, Optional
+import time
+from typing import (
+    TYPE_CHECKING,
+    Any,
+    Callable,
+    Dict,
+    Iterable,
+    List,
+    NamedTuple,
+    Optional,
+    Tuple,
+)
 from urllib import parse
-from datetime import date
-
-# from anyio import key
+from datetime import date, datetime, timedelta
 
-
-from eth_tools.eth_requests.session import ETHSession
-from eth_tools.settings import ROOMS_DIR, ROOM_CONFIG
+from eth_tools.room_allocation.profiling import count, span, timed
+from eth_tools.room_allocation.slots import Slot, to_minutes
+from eth_tools.settings import DOWNLOAD_DAYS, ROOMS_DIR, ROOM_CONFIG
 
 ROOM_GLOBAL_INFO = "https://ethz.ch/bin/ethz/roominfo?path=/rooms&lang=en"
 ROOM_ALLOCATION_BASE = "https://ethz.ch/bin/ethz/roominfo?path=/rooms/"
 
-session = ETHSession()
+MAX_CONCURRENCY = 32
+MAX_RETRIES = 4
+RETRY_BACKOFF = 0.5  # seconds, doubled after every attempt
+REQUEST_TIMEOUT = 30  # seconds
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+CHUNK_SIZE = 64 * 1024  # Bytes of a response written to disk at once
+METADATA_SEPARATOR = b', "metadata": '  # Precedes the metadata record at the end of a file
+METADATA_TAIL = 64 * 1024  # Bytes read from the end of a file to find its metadata
+
+if TYPE_CHECKING:
+    import aiohttp
+    from eth_tools.eth_requests.session import ETHSession
+
+
+@functools.lru_cache(maxsize=None)
+def get_session() -> "ETHSession":
+    """Returns the session shared by all synchronous downloads, created on first use."""
+    from eth_tools.eth_requests.session import ETHSession
+
+    return ETHSession()
+
 
+def __getattr__(name: str):
+    # `scraper.session` used to be created at import
+    if name == "session":
+        return get_session()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
-def _get_allocation_url(room: str, from_date: str, to_date: str) -> str:
+
+class Download(NamedTuple):
+    """Result of a room allocation download"""
+
+    filepath: str
+    changed: bool  # False if the server reported the content as unchanged
+    metadata: dict
+
+
+def _get_allocation_url(
+    room: str, from_date: str, to_date: str, base_url: str = ROOM_ALLOCATION_BASE
+) -> str:
     """Returns the url for the room allocation of the given room and date range
 
     Arguments:
@@ -32,11 +84,14 @@ def _get_allocation_url(room: str, from_date: str, to_date: str) -> str:
         from_date {str} -- Start date in format YYYY-MM-DD
         to_date {str} -- End date in format YYYY-MM-DD
 
+    Keyword Arguments:
+        base_url {str} -- Base url of the room endpoint (default: {ROOM_ALLOCATION_BASE})
+
     Returns:
         str -- URL for the room allocation of the given room and date range
     """
     return (
-        ROOM_ALLOCATION_BASE
+        base_url
         + parse.quote(room)
         + "/allocations"
         + "&from="
@@ -46,7 +101,7 @@ def _get_allocation_url(room: str, from_date: str, to_date: str) -> str:
     )
 
 
-def _get_filepath(room: str, output_dir: str) -> str:
+def get_filepath(room: str, output_dir: str) -> str:
     """Returns the filepath for the room allocation of the given room
 
     Arguments:
@@ -58,35 +113,144 @@ def _get_filepath(room: str, output_dir: str) -> str:
     return os.path.join(output_dir, f"{'-'.join(room.split())}.json")
 
 
+def _conditional_headers(url: str, validators: Optional[dict]) -> dict:
+    """Returns the conditional request headers for the validators of a previous download"""
+    if not validators or validators.get("url") != url:
+        return {}
+    headers = {}
+    if validators.get("etag"):
+        headers["If-None-Match"] = validators["etag"]
+    if validators.get("last_modified"):
+        headers["If-Modified-Since"] = validators["last_modified"]
+    return headers
+
+
+def _get_validators(url: str, headers: Any, content_hash: str) -> dict:
+    """Returns the validators of a response, stored in the file metadata"""
+    return dict(
+        url=url,
+        etag=headers.get("ETag"),
+        last_modified=headers.get("Last-Modified"),
+        content_hash=content_hash,
+    )
+
+
+def _is_unchanged(validators: Optional[dict], new_validators: dict) -> bool:
+    """Returns whether the content hash of a response matches the previous download"""
+    return bool(validators) and validators.get("content_hash") == new_validators["content_hash"]
+
+
+class JsonFileWriter:
+    """Streams a JSON response into `{key: <response>, "metadata": {...}}` on disk.
+
+    The response is written to a temporary file next to filepath as it arrives and
+    hashed on the way. `commit` appends the metadata record and atomically renames
+    the temporary file over filepath, so readers never see a partially written file.
+    Leaving the context without commit removes the temporary file.
+    """
+
+    def __init__(self, filepath: str, key: str):
+        self.filepath = filepath
+        self.key = key
+        self.tmp_path = f"{filepath}.{os.getpid()}.{time.time_ns():x}.tmp"
+        self._file = None
+        self.reset()
+
+    def reset(self):
+        """Drops everything written so far (e.g. before retrying a request)."""
+        if self._file is None:
+            self._file = open(self.tmp_path, "wb")
+        self._file.seek(0)
+        self._file.truncate()
+        self._file.write(b"{" + json.dumps(self.key).encode("utf-8") + b": ")
+        self._hash = hashlib.sha256()
+        self._first = self._last = b""
+        self.size = 0
+
+    def write(self, chunk: bytes):
+        if not chunk:
+            return
+        self._file.write(chunk)
+        self._hash.update(chunk)
+        self._first = self._first or chunk.lstrip()[:1]
+        self._last = chunk.rstrip()[-1:] or self._last
+        self.size += len(chunk)
+
+    def content_hash(self) -> str:
+        """Returns the sha256 of the response written so far."""
+        return self._hash.hexdigest()
+
+    def commit(self, metadata: dict) -> str:
+        """Appends the metadata record and replaces filepath with the written file
+
+        Returns:
+            str -- Path to the output file
+        """
+        if (self._first, self._last) not in ((b"[", b"]"), (b"{", b"}")):
+            raise ValueError(f"Incomplete JSON response for {self.filepath}")
+        self._file.write(METADATA_SEPARATOR + json.dumps(metadata).encode("utf-8") + b"}")
+        self._file.close()
+        os.replace(self.tmp_path, self.filepath)
+        return self.filepath
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        if not self._file.closed:
+            self._file.close()
+        if os.path.exists(self.tmp_path):
+            os.remove(self.tmp_path)
+
+
 def download_json(
     url: str,
     filepath: str,
+    key: str,
     metadata: Optional[dict] = None,
-    transform_response: Optional[Any] = None,
+    validators: Optional[dict] = None,
 ) -> str:
-    """Downloads the content of the given url
+    """Downloads the content of the given url, streaming it to disk
+
+    The file holds the response under key and the metadata (with the validators of
+    the response) in a record after it. If validators of a previous download are
+    given, the request is conditional and the file is left untouched (apart from its
+    mtime) when the content is unchanged.
 
     Arguments:
         url {str} -- URL to download
         filepath {str} -- Path to output file
-        metadata {dict} -- Metadata to add to the response
-        transform_response {Any} -- Function to transform the response
+        key {str} -- Field holding the response in the output file
+
+    Keyword Arguments:
+        metadata {dict} -- Metadata to add to the response (default: {None})
+        validators {dict} -- Validators of the previous download (metadata["validators"])
+            (default: {None})
 
     Returns:
         str -- path to output file
     """
-    res = session.get(url)
-    res.raise_for_status()
-    res_obj = res.json()
-    if transform_response is not None:
-        res_obj = transform_response(res_obj)
-    if metadata is not None:
-        if res_obj.get("metadata") is not None:
-            logging.warning("Overwriting response metadata field for %s", filepath)
-        res_obj["metadata"] = metadata
-    with open(filepath, "w") as f:
-        json.dump(res_obj, f, indent=4)
-    return filepath
+    if not os.path.exists(filepath):
+        validators = None  # Deleted since, a 304 would leave no file
+    with span("download.request", url=url):
+        res = get_session().get(url, headers=_conditional_headers(url, validators), stream=True)
+        with res, JsonFileWriter(filepath, key) as writer:
+            count("http.requests")
+            if res.status_code == 304:
+                count("http.not_modified")
+                os.utime(filepath)
+                return filepath
+            res.raise_for_status()
+            for chunk in res.iter_content(CHUNK_SIZE):
+                writer.write(chunk)
+            count("http.bytes", writer.size)
+
+            new_validators = _get_validators(url, res.headers, writer.content_hash())
+            if _is_unchanged(validators, new_validators) and os.path.exists(filepath):
+                count("http.unchanged")
+                os.utime(filepath)
+                return filepath
+            return writer.commit(dict(metadata or {}, validators=new_validators))
 
 
 def download_room_allocation(
@@ -108,24 +272,407 @@ def download_room_allocation(
     """
     assert room.count(" ") == 2, "Room name must be in format BUILDING FLOOR ROOM"
     os.makedirs(output_dir) if not os.path.exists(output_dir) else 1
-    filepath = filepath or _get_filepath(room, output_dir)
-    metadata = dict(room=room, from_date=from_date, to_date=to_date)
+    filepath = filepath or get_filepath(room, output_dir)
     return download_json(
         _get_allocation_url(room, from_date, to_date),
         filepath,
-        transform_response=lambda x: dict(room_allocation=x),
-        metadata=metadata,
+        key="room_allocation",
+        metadata=_allocation_metadata(room, from_date, to_date),
     )
 
 
+def _allocation_metadata(room: str, from_date: str, to_date: str) -> dict:
+    """Returns the metadata stored with a room allocation file"""
+    return dict(
+        room=room,
+        from_date=from_date,
+        to_date=to_date,
+        downloaded_at=datetime.now().isoformat(timespec="seconds"),
+    )
+
+
+def missing_ranges(
+    metadata: Optional[dict], from_date: str, to_date: str, max_gap: int = DOWNLOAD_DAYS
+) -> List[Tuple[str, str]]:
+    """Returns the date ranges of [from_date, to_date] that are not downloaded yet
+
+    A file covers one contiguous date range (from_date to to_date of its metadata).
+    Ranges at most max_gap days away from it are extended to close the gap, a range
+    further away is returned whole and replaces the file when merged.
+
+    Arguments:
+        metadata {dict} -- Metadata of the downloaded file (None if there is none)
+        from_date {str} -- Start date in format YYYY-MM-DD
+        to_date {str} -- End date in format YYYY-MM-DD
+
+    Keyword Arguments:
+        max_gap {int} -- Maximum number of days downloaded to close a gap
+            (default: {DOWNLOAD_DAYS})
+
+    Returns:
+        list -- (from_date, to_date) ranges to download, empty if all are downloaded
+    """
+    if not metadata or "from_date" not in metadata or "to_date" not in metadata:
+        return [(from_date, to_date)]
+    have_from = date.fromisoformat(metadata["from_date"])
+    have_to = date.fromisoformat(metadata["to_date"])
+    want_from, want_to = date.fromisoformat(from_date), date.fromisoformat(to_date)
+    if (have_from - want_to).days > max_gap + 1 or (want_from - have_to).days > max_gap + 1:
+        return [(from_date, to_date)]
+    day = timedelta(days=1)
+    ranges = []
+    if want_from < have_from:
+        ranges.append((from_date, (have_from - day).isoformat()))
+    if want_to > have_to:
+        ranges.append(((have_to + day).isoformat(), to_date))
+    return ranges
+
+
+def _day_minutes(from_date: str, to_date: str) -> Tuple[int, int]:
+    """Returns the date range [from_date 00:00, day after to_date 00:00) in epoch minutes."""
+    return to_minutes(f"{from_date}T00:00:00"), to_minutes(f"{to_date}T00:00:00") + 24 * 60
+
+
+def merge_room_allocation(
+    filepath: str,
+    room: str,
+    fragments: Dict[Tuple[str, str], str],
+    keep: Optional[Tuple[str, str]] = None,
+    horizon: Optional[Tuple[int, int]] = None,
+) -> dict:
+    """Merges downloaded date ranges into the allocation file of a room
+
+    Slots of the file starting within a downloaded range are replaced by the
+    downloaded ones, slots spanning the border of two ranges are de-duplicated.
+    A range not touching the date range of the file replaces the file. The fragment
+    files are removed.
+
+    Arguments:
+        filepath {str} -- Path to the room allocation file
+        room {str} -- Room name in format BUILDING FLOOR ROOM
+        fragments {dict} -- Path to the downloaded allocation per (from_date, to_date)
+
+    Keyword Arguments:
+        keep {tuple} -- (from_date, to_date) never pruned, e.g. the requested range
+            (default: {None})
+        horizon {tuple} -- Days (past, future) around today kept in the file, older
+            and later days are pruned (default: {None} = keep all days)
+
+    Returns:
+        dict -- Metadata of the merged file
+    """
+    ranges = sorted(fragments)  # Disjoint
+    from_date, to_date = ranges[0][0], ranges[-1][1]
+    fetched = [_day_minutes(*date_range) for date_range in ranges]
+    records, downloaded_at = [], datetime.now().isoformat(timespec="seconds")
+
+    existing = read_json(filepath) if os.path.exists(filepath) else None
+    old = existing["metadata"] if existing is not None else {}
+    if "from_date" in old and "to_date" in old:
+        start, end = _day_minutes(old["from_date"], old["to_date"])
+        if start <= fetched[-1][1] and fetched[0][0] <= end:  # Touching or overlapping
+            from_date, to_date = min(from_date, old["from_date"]), max(to_date, old["to_date"])
+            downloaded_at = old.get("downloaded_at")  # Age of the oldest data
+            records = [
+                record
+                for record in existing["room_allocation"]
+                if not any(s <= to_minutes(record["date_from"]) < e for s, e in fetched)
+            ]
+    for date_range in ranges:
+        records.extend(read_json(fragments[date_range])["room_allocation"])
+
+    if horizon is not None:
+        today = date.today()
+        keep_from, keep_to = keep or (ranges[0][0], ranges[-1][1])
+        keep_from = min(keep_from, (today - timedelta(days=horizon[0])).isoformat())
+        keep_to = max(keep_to, (today + timedelta(days=horizon[1])).isoformat())
+        from_date, to_date = max(from_date, keep_from), min(to_date, keep_to)
+    start, end = _day_minutes(from_date, to_date)
+
+    merged, seen = [], set()
+    for record in records:
+        key = json.dumps(record, sort_keys=True)
+        if key in seen:
+            count("merge.duplicates")
+            continue
+        seen.add(key)
+        if to_minutes(record["date_to"]) > start and to_minutes(record["date_from"]) < end:
+            merged.append(record)
+        else:
+            count("merge.pruned")
+
+    metadata = dict(room=room, from_date=from_date, to_date=to_date)
+    if downloaded_at is not None:
+        metadata["downloaded_at"] = downloaded_at
+    with JsonFileWriter(filepath, "room_allocation") as writer:
+        writer.write(json.dumps(merged).encode("utf-8"))
+        writer.commit(metadata)
+    for fragment in fragments.values():
+        os.remove(fragment)
+    return metadata
+
+
+def _fragment_path(filepath: str, from_date: str, to_date: str) -> str:
+    return f"{filepath}.{from_date}.{to_date}.part"
+
+
+def update_room_allocation(
+    room: str,
+    from_date: str,
+    to_date: str,
+    output_dir: str = ROOMS_DIR,
+    horizon: Optional[Tuple[int, int]] = None,
+) -> str:
+    """Downloads the date ranges of the room allocation missing on disk and merges them
+
+    Arguments:
+        room {str} -- Room name in format BUILDING FLOOR ROOM
+        from_date {str} -- Start date in format YYYY-MM-DD
+        to_date {str} -- End date in format YYYY-MM-DD
+
+    Keyword Arguments:
+        output_dir {str} -- Output directory (default: {ROOMS_DIR})
+        horizon {tuple} -- Days (past, future) around today kept in the file
+            (default: {None} = keep all days)
+
+    Returns:
+        str -- Path to the room allocation file
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    filepath = get_filepath(room, output_dir)
+    metadata = load_file_metadata(filepath) if os.path.exists(filepath) else None
+    ranges = missing_ranges(metadata, from_date, to_date)
+    if not ranges:
+        return filepath
+    fragments = {
+        date_range: download_json(
+            _get_allocation_url(room, *date_range),
+            _fragment_path(filepath, *date_range),
+            key="room_allocation",
+        )
+        for date_range in ranges
+    }
+    merge_room_allocation(filepath, room, fragments, keep=(from_date, to_date), horizon=horizon)
+    return filepath
+
+
+async def _fetch(
+    client: "aiohttp.ClientSession",
+    url: str,
+    headers: dict,
+    writer: JsonFileWriter,
+    max_retries: int = MAX_RETRIES,
+) -> tuple:
+    """Fetches the given url into writer, retrying on 429/5xx with exponential backoff
+
+    Returns:
+        tuple -- Status and headers of the response
+    """
+    import asyncio
+
+    import aiohttp
+
+    for attempt in range(max_retries + 1):
+        retry_after = None
+        try:
+            count("http.requests")
+            async with client.get(url, headers=headers) as res:
+                if res.status not in RETRY_STATUSES:
+                    res.raise_for_status()
+                    writer.reset()
+                    async for chunk in res.content.iter_chunked(CHUNK_SIZE):
+                        writer.write(chunk)
+                    count("http.bytes", writer.size)
+                    return res.status, res.headers
+                retry_after = res.headers.get("Retry-After")
+                error = aiohttp.ClientResponseError(
+                    res.request_info, res.history, status=res.status, message=res.reason
+                )
+        except (aiohttp.ClientConnectionError, asyncio.TimeoutError) as e:
+            error = e
+        if attempt == max_retries:
+            raise error
+        count("http.retries")
+        delay = RETRY_BACKOFF * 2**attempt
+        if retry_after is not None and retry_after.isdigit():
+            delay = max(delay, int(retry_after))
+        logging.debug("Retrying %s in %.1fs after %r", url, delay, error)
+        await asyncio.sleep(delay)
+
+
+async def _download_room_allocations(
+    rooms: Iterable[str],
+    from_date: str,
+    to_date: str,
+    output_dir: str,
+    metadata: Dict[str, dict],
+    ranges: Dict[str, List[Tuple[str, str]]],
+    horizon: Optional[Tuple[int, int]],
+    base_url: str,
+    concurrency: int,
+    timeout: float,
+    progress: Optional[Callable[[int, int], None]],
+) -> Dict[str, Download]:
+    import asyncio
+
+    import aiohttp
+
+    from eth_tools.eth_requests.session import DEFAULT_HEADERS
+
+    rooms = list(rooms)
+    semaphore = asyncio.Semaphore(concurrency)
+    downloads = {}
+
+    async def download_file(client, room, filepath):
+        url = _get_allocation_url(room, from_date, to_date, base_url)
+        validators = metadata.get(room, {}).get("validators")
+        if not os.path.exists(filepath):
+            validators = None  # Deleted since, a 304 would leave no file
+        # The temporary file only exists while the request holds the semaphore
+        async with semaphore:
+            with JsonFileWriter(filepath, "room_allocation") as writer:
+                status, headers = await _fetch(
+                    client, url, _conditional_headers(url, validators), writer
+                )
+                file_metadata = _allocation_metadata(room, from_date, to_date)
+                if status == 304:
+                    count("http.not_modified")
+                    file_metadata["validators"] = validators
+                    return Download(filepath, False, file_metadata)
+                file_metadata["validators"] = _get_validators(url, headers, writer.content_hash())
+                if _is_unchanged(validators, file_metadata["validators"]):
+                    count("http.unchanged")
+                    return Download(filepath, False, file_metadata)
+                writer.commit(file_metadata)
+                return Download(filepath, True, file_metadata)
+
+    async def download_ranges(client, room, filepath):
+        if not ranges[room]:  # All days are on disk already
+            return Download(filepath, False, metadata.get(room, {}))
+        fragments = {}
+        try:
+            for date_range in ranges[room]:
+                fragment = _fragment_path(filepath, *date_range)
+                async with semaphore:
+                    with JsonFileWriter(fragment, "room_allocation") as writer:
+                        url = _get_allocation_url(room, *date_range, base_url)
+                        await _fetch(client, url, {}, writer)
+                        fragments[date_range] = writer.commit({})
+            count("http.range_downloads", len(fragments))
+            file_metadata = merge_room_allocation(
+                filepath, room, fragments, keep=(from_date, to_date), horizon=horizon
+            )
+        except Exception:
+            for fragment in fragments.values():
+                if os.path.exists(fragment):
+                    os.remove(fragment)
+            raise
+        return Download(filepath, True, file_metadata)
+
+    async def download(client, room):
+        filepath = get_filepath(room, output_dir)
+        try:
+            if room in ranges:
+                return room, await download_ranges(client, room, filepath)
+            return room, await download_file(client, room, filepath)
+        except Exception as e:
+            count("http.failed")
+            logging.error("Failed to download room %s: %s", room, e)
+            return room, None
+
+    connector = aiohttp.TCPConnector(limit=concurrency)
+    async with aiohttp.ClientSession(
+        connector=connector,
+        headers=DEFAULT_HEADERS,
+        timeout=aiohttp.ClientTimeout(total=timeout),
+    ) as client:
+        tasks = [download(client, room) for room in rooms]
+        for done, result in enumerate(asyncio.as_completed(tasks), 1):
+            room, room_download = await result
+            if room_download is not None:
+                downloads[room] = room_download
+            if progress is not None:
+                progress(done, len(rooms))
+    return downloads
+
+
+def download_room_allocations(
+    rooms: Iterable[str],
+    from_date: str,
+    to_date: str,
+    output_dir: str = ROOMS_DIR,
+    metadata: Optional[Dict[str, dict]] = None,
+    ranges: Optional[Dict[str, List[Tuple[str, str]]]] = None,
+    horizon: Optional[Tuple[int, int]] = None,
+    base_url: str = ROOM_ALLOCATION_BASE,
+    concurrency: int = MAX_CONCURRENCY,
+    timeout: float = REQUEST_TIMEOUT,
+    progress: Optional[Callable[[int, int], None]] = None,
+) -> Dict[str, Download]:
+    """Downloads the room allocations of the given rooms concurrently
+
+    Requests share one keep-alive connection pool and are retried with exponential
+    backoff on 429/5xx responses and connection errors. Rooms that still fail are
+    logged and left out of the result.
+
+    Requests for rooms with validators in their previous metadata are conditional
+    (ETag / Last-Modified). Unchanged content (304 or same content hash) is not
+    written. Responses are streamed to a temporary file and renamed over the
+    allocation file once complete (see `JsonFileWriter`).
+
+    Arguments:
+        rooms {Iterable[str]} -- Room names in format BUILDING FLOOR ROOM
+        from_date {str} -- Start date in format YYYY-MM-DD
+        to_date {str} -- End date in format YYYY-MM-DD
+
+    Keyword Arguments:
+        output_dir {str} -- Output directory (default: {ROOMS_DIR})
+        metadata {dict} -- Metadata of the previous download per room (default: {None})
+        ranges {dict} -- Date ranges missing on disk per room (see `missing_ranges`),
+            downloaded and merged into the file of the room instead of replacing it
+            with [from_date, to_date] (default: {None})
+        horizon {tuple} -- Days (past, future) around today kept in merged files
+            (default: {None} = keep all days)
+        base_url {str} -- Base url of the room endpoint (default: {ROOM_ALLOCATION_BASE})
+        concurrency {int} -- Maximum number of concurrent requests (default: {MAX_CONCURRENCY})
+        timeout {float} -- Timeout per request in seconds (default: {REQUEST_TIMEOUT})
+        progress {Callable} -- Called with (done, total) after every room (default: {None})
+
+    Returns:
+        dict -- Download result per room
+    """
+    import asyncio
+
+    os.makedirs(output_dir, exist_ok=True)
+    with span("download.allocations"):
+        return asyncio.run(
+            _download_room_allocations(
+                rooms,
+                from_date,
+                to_date,
+                output_dir,
+                metadata or {},
+                ranges or {},
+                horizon,
+                base_url,
+                concurrency,
+                timeout,
+                progress,
+            )
+        )
+
+
+@timed("download.room_info")
 def download_global_room_info(
     output_path:str = ROOM_CONFIG,
+    validators: Optional[dict] = None,
 ) -> str:
     """Downloads the global room info
 
     Keyword Arguments:
         output_dir {str} -- Output directory (default: {DEFAULT_OUTPUT_DIR})
         output_name {str} -- Output filename (default: {"room_info.json"})
+        validators {dict} -- Validators of the previous download (default: {None})
 
     Returns:
         str -- Path to output file
@@ -133,9 +680,13 @@ def download_global_room_info(
     os.makedirs(os.path.dirname(output_path)) if not os.path.exists(os.path.dirname(output_path)) else 1
     return download_json(
         ROOM_GLOBAL_INFO,
-        filepath=ROOM_CONFIG,
-        metadata=dict(ts=date.today().isoformat()),
-        transform_response=lambda x: dict(rooms=x),
+        filepath=output_path,
+        key="rooms",
+        metadata=dict(
+            ts=date.today().isoformat(),
+            downloaded_at=datetime.now().isoformat(timespec="seconds"),
+        ),
+        validators=validators,
     )
 
 
@@ -148,8 +699,20 @@ def load_file_metadata(filepath):
     Returns:
         dict -- Metadata of the given file
     """
-    with open(filepath) as f:
-        return json.load(f)["metadata"]
+    # Downloaded files end with their metadata record, read it without parsing the rest
+    with open(filepath, "rb") as f:
+        size = f.seek(0, os.SEEK_END)
+        f.seek(max(0, size - METADATA_TAIL))
+        tail = f.read()
+    position = tail.rfind(METADATA_SEPARATOR)
+    if position >= 0:
+        try:
+            metadata = json.loads(tail[position + len(METADATA_SEPARATOR) :].rstrip()[:-1])
+            if isinstance(metadata, dict):
+                return metadata
+        except ValueError:
+            pass
+    return read_json(filepath)["metadata"]
 
 
 def load_global_room_info(
@@ -164,24 +727,64 @@ def load_global_room_info(
     Returns:
         dict -- Room info from the given file
     """
-    with open(filepath, "r") as fh:
-        return json.load(fh)
+    return read_json(filepath)
+
+
+@functools.lru_cache(maxsize=None)
+def _json_loads() -> Callable[[bytes], Any]:
+    """Returns orjson.loads if orjson is installed (several times faster), else json.loads."""
+    try:
+        import orjson
+    except ImportError:
+        return json.loads
+    return orjson.loads
+
+
+def read_json(filepath: str) -> Any:
+    """Returns the parsed content of the given JSON file."""
+    with open(filepath, "rb") as fh:
+        return _json_loads()(fh.read())
+
+
+def _to_slots(room_allocation: List[dict], keep_raw: bool) -> List[Slot]:
+    """Returns the slots of the given API records, sorted by date_to."""
+    room_allocation.sort(key=lambda x: x["date_to"])
+    return [Slot.from_record(slot, keep_raw) for slot in room_allocation]
 
 
 def load_room_allocation(
     filepath: str,
-) -> dict:
+    keep_raw: bool = False,
+) -> List[Slot]:
     """
     Loads the room allocation from the given file
 
+    Keyword Arguments:
+        keep_raw {bool} -- Keep a reference to the API record in every slot (default: {False})
+
     Returns:
-        dict -- Room allocation from the given file
+        list -- Slots (sorted by date_to) from the given file
     """
-    with open(filepath, "r") as fh:
-        room_allocation = json.load(fh)["room_allocation"]
+    count("files.parsed")
+    return _to_slots(read_json(filepath)["room_allocation"], keep_raw)
 
-    room_allocation.sort(key=lambda x: x["date_to"])
-    return room_allocation
+
+def load_room_file(
+    filepath: str,
+    keep_raw: bool = False,
+) -> tuple:
+    """
+    Loads the metadata and the room allocation from the given file with a single read
+
+    Keyword Arguments:
+        keep_raw {bool} -- Keep a reference to the API record in every slot (default: {False})
+
+    Returns:
+        tuple -- Metadata and slots (sorted by date_to) of the given file
+    """
+    count("files.parsed")
+    content = read_json(filepath)
+    return content["metadata"], _to_slots(content["room_allocation"], keep_raw)
 
 
 def load_room_allocations(
@@ -195,6 +798,8 @@ def load_room_allocations(
     """
     room_allocations = {} if as_dict else []
     for filename in os.listdir(directory):
+        if not filename.endswith(".json"):
+            continue
         if as_dict:
             room_allocations[filename] = load_room_allocation(os.path.join(directory, filename))
         else:
@@ -0,0 +1,342 @@
+"""
+Local HTTP/JSON API of the room search (`find-room serve`).
+1. Load the downloaded data once and keep it in memory
+2. Refresh the data in a background thread on a schedule
+3. Answer GET /search?location=&building=&when=&duration=&top=&free_only=&near=
+   &room_type=&min_seats=&weights=&scoring=&spread=, GET /health and GET /metrics (phase
+   timings and counters, see `--profile`)
+4. Answer GET /free?location=&building=&when=&duration=&top=&room_type=&min_seats=
+   with the rooms free for the longest contiguous time
+5. Answer GET /live with the parameters of /search except when and free_only with the
+   best rooms now, for boards polling every minute (only changed rooms are rescored)
+6. Answer POST /batch with a JSON list of queries (see `batch.parse_query`), or an
+   object {"queries": [...], "scoring": {...}, "weights": [...], "spread": false}
+
+Example:
+    curl "http://127.0.0.1:8765/search?location=Z%C3%BCrich%20Zentrum&top=5"
+"""
+import argparse
+import datetime
+import json
+import logging
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Optional
+from urllib.parse import parse_qs, urlparse
+
+from eth_tools.room_allocation.batch import WHEN_FORMAT, parse_query
+from eth_tools.room_allocation.profiling import PROFILER, span
+from eth_tools.room_allocation.refresh import ALLOCATION_TTL
+from eth_tools.room_allocation.result_cache import ResultCache
+from eth_tools.room_allocation.scoring_config import (
+    ScoringConfig,
+    load_scoring_config,
+    parse_scoring_config,
+)
+from eth_tools.room_allocation.scraper import MAX_CONCURRENCY
+from eth_tools.room_allocation.service import RoomFinder
+from eth_tools.settings import ALLOCATION_HORIZON
+
+LOGGER = logging.getLogger(__name__)
+
+DEFAULT_HOST = "127.0.0.1"
+DEFAULT_PORT = 8765
+REFRESH_INTERVAL = 15 * 60  # Seconds between two background refreshes
+TRUE_VALUES = ("1", "true", "yes", "on")
+
+
+def _scoring_config(
+    base: ScoringConfig, scoring: Optional[dict] = None, weights: Optional[list] = None
+) -> Optional[ScoringConfig]:
+    """Returns the config of a request, None (= the config of the server) if the request
+    has neither scoring (an object as in scoring.json, replacing the config of the server)
+    nor weights (one per feature, overriding those of the config)."""
+    if scoring is None and weights is None:
+        return None
+    if weights is not None and not isinstance(weights, (list, dict)):
+        raise ValueError("weights must be a list with one weight per feature.")
+    try:
+        config = base if scoring is None else parse_scoring_config(scoring)
+        return config if weights is None else config.with_weights(weights)
+    except (TypeError, AttributeError) as e:  # Values of the wrong JSON type
+        raise ValueError(f"Invalid scoring: {e}") from None
+
+
+def _search_params(query: dict, scoring: ScoringConfig) -> dict:
+    """Returns the keyword arguments of `RoomFinder.search` for the given query string,
+    scoring (a JSON object) and weights (comma separated) override the config of the
+    server (see `_scoring_config`)."""
+
+    def get(name: str, default=None) -> Optional[str]:
+        values = query.get(name)
+        return values[0] if values and values[0] != "" else default
+
+    location = get("location")
+    if location is None:
+        raise ValueError("Missing parameter location.")
+    when = get("when")
+    weights = get("weights")
+    custom = get("scoring")
+    return dict(
+        location=location,
+        building=get("building"),
+        when=datetime.datetime.strptime(when, WHEN_FORMAT) if when else None,
+        duration=float(get("duration", 4)),
+        top=int(get("top", 10)),
+        free_only=get("free_only", "").lower() in TRUE_VALUES,
+        near=get("near"),
+        room_type=get("room_type"),
+        min_seats=int(get("min_seats", 0)) or None,
+        scoring=_scoring_config(
+            scoring,
+            json.loads(custom) if custom else None,
+            [float(w) for w in weights.split(",")] if weights else None,
+        ),
+        spread=get("spread", "").lower() in TRUE_VALUES,
+    )
+
+
+class SearchHandler(BaseHTTPRequestHandler):
+    """Request handler answering from the `RoomFinder` of the server."""
+
+    protocol_version = "HTTP/1.1"  # Keep-alive for clients issuing many searches
+
+    def _send_json(self, status: int, payload: dict):
+        body = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        finder: RoomFinder = self.server.finder
+        url = urlparse(self.path)
+        if url.path == "/health":
+            self._send_json(200, dict(status="ok", version=finder.version))
+            return
+        if url.path == "/metrics":
+            self._send_json(200, dict(enabled=PROFILER.enabled, **PROFILER.snapshot()))
+            return
+        if url.path not in ("/search", "/free", "/live"):
+            self._send_json(404, dict(error=f"Unknown path {url.path}."))
+            return
+
+        start = time.perf_counter()
+        try:
+            params = _search_params(parse_qs(url.query), finder.scoring)
+            if url.path == "/free":
+                params.pop("free_only")
+                params.pop("near")
+                params.pop("scoring")
+                params.pop("spread")
+                with span("query.free"):
+                    results = [
+                        dict(room=room, free_until=until.strftime(WHEN_FORMAT))
+                        for room, until in finder.longest_free(**params)
+                    ]
+            elif url.path == "/live":
+                if params.pop("when") is not None:
+                    raise ValueError("Live rankings are always for now, remove parameter when.")
+                params.pop("free_only")
+                params.pop("spread")
+                with span("query.live"):
+                    ranking, _ = finder.live(**params)
+                    results = [dict(room=room, score=score) for room, score in ranking]
+            else:
+                with span("query.search"):
+                    results = [
+                        dict(room=room, score=score) for room, score in finder.search(**params)
+                    ]
+        except ValueError as e:
+            self._send_json(400, dict(error=str(e)))
+            return
+        except RuntimeError as e:
+            self._send_json(503, dict(error=str(e)))
+            return
+        self._send_json(
+            200,
+            dict(
+                version=finder.version,
+                took_ms=(time.perf_counter() - start) * 1000,
+                results=results,
+            ),
+        )
+
+    def do_POST(self):
+        finder: RoomFinder = self.server.finder
+        url = urlparse(self.path)
+        if url.path != "/batch":
+            self._send_json(404, dict(error=f"Unknown path {url.path}."))
+            return
+
+        start = time.perf_counter()
+        try:
+            body = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))))
+            if isinstance(body, dict):
+                unknown = set(body) - {"queries", "scoring", "weights", "spread"}
+                if unknown:
+                    raise ValueError(f"Unknown fields {', '.join(sorted(unknown))}.")
+                scoring = _scoring_config(finder.scoring, body.get("scoring"), body.get("weights"))
+                spread = body.get("spread") or False
+                if not isinstance(spread, bool):
+                    raise ValueError("spread must be true or false.")
+                body = body.get("queries")
+            else:
+                scoring, spread = None, False
+            if not isinstance(body, list):
+                raise ValueError("The body must be a list of queries or an object with queries.")
+            queries = [parse_query(query) for query in body]
+            with span("query.batch", queries=len(queries)):
+                results = finder.search_batch(queries, scoring, spread)
+        except ValueError as e:  # Including invalid JSON
+            self._send_json(400, dict(error=str(e)))
+            return
+        except RuntimeError as e:
+            self._send_json(503, dict(error=str(e)))
+            return
+        self._send_json(
+            200,
+            dict(
+                version=finder.version,
+                took_ms=(time.perf_counter() - start) * 1000,
+                results=[
+                    [dict(room=room, score=score) for room, score in query_results]
+                    for query_results in results
+                ],
+            ),
+        )
+
+    def log_message(self, format, *args):
+        LOGGER.debug(f"{self.address_string()} {format % args}")
+
+
+class SearchServer(ThreadingHTTPServer):
+    """Threaded HTTP server sharing one `RoomFinder` between all requests."""
+
+    daemon_threads = True
+    request_queue_size = 1024  # Listen backlog, the default of 5 drops bursts of clients
+
+    def __init__(self, address, finder: RoomFinder):
+        super().__init__(address, SearchHandler)
+        self.finder = finder
+
+
+def _refresh_periodically(finder: RoomFinder, interval: float, stop: threading.Event):
+    while not stop.wait(interval):
+        try:
+            finder.refresh()
+        except Exception:
+            LOGGER.exception("Background refresh failed, keeping the current data.")
+
+
+def serve(
+    host: str = DEFAULT_HOST,
+    port: int = DEFAULT_PORT,
+    refresh_interval: float = REFRESH_INTERVAL,
+    finder: Optional[RoomFinder] = None,
+):
+    """Serves the search API until interrupted
+
+    Keyword Arguments:
+        host {str} -- Interface to listen on (default: {DEFAULT_HOST})
+        port {int} -- Port to listen on (default: {DEFAULT_PORT})
+        refresh_interval {float} -- Seconds between two background refreshes
+            (default: {REFRESH_INTERVAL}, 0 disables refreshing)
+        finder {RoomFinder} -- Finder to serve (default: {None} = load the downloaded data)
+    """
+    if finder is None:
+        finder = RoomFinder()
+        finder.load()
+
+    stop = threading.Event()
+    if refresh_interval > 0:
+        threading.Thread(
+            target=_refresh_periodically,
+            args=(finder, refresh_interval, stop),
+            name="room-refresh",
+            daemon=True,
+        ).start()
+
+    with SearchServer((host, port), finder) as server:
+        LOGGER.info(f"Serving room search on http://{host}:{server.server_address[1]}")
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            stop.set()
+
+
+def main(argv=None):
+    """Run search server."""
+    parser = argparse.ArgumentParser(
+        prog="find-room serve", description="Serve the room search over a local HTTP API."
+    )
+    parser.add_argument("--host", type=str, default=DEFAULT_HOST, help="Interface to listen on.")
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT, help="Port to listen on.")
+    parser.add_argument(
+        "--refresh_interval",
+        type=float,
+        default=REFRESH_INTERVAL / 60,
+        help="Minutes between two background refreshes (0 disables refreshing).",
+    )
+    parser.add_argument(
+        "--ttl",
+        type=float,
+        default=ALLOCATION_TTL.total_seconds() / 3600,
+        help="Hours after which downloaded room allocations are refreshed.",
+    )
+    parser.add_argument(
+        "--concurrency",
+        type=int,
+        default=MAX_CONCURRENCY,
+        help="Maximum number of concurrent downloads.",
+    )
+    parser.add_argument(
+        "--horizon",
+        type=int,
+        nargs=2,
+        metavar=("PAST", "FUTURE"),
+        default=ALLOCATION_HORIZON,
+        help="Keep only the days from PAST days ago to FUTURE days ahead (e.g. 1 28).",
+    )
+    parser.add_argument(
+        "--scoring",
+        type=str,
+        help=(
+            "Scoring config (JSON) of searches without weights (default: scoring.json in "
+            "the data directory)."
+        ),
+    )
+    parser.add_argument(
+        "--result_cache",
+        action="store_true",
+        help="Share the cached search results with the CLI and the app (on disk).",
+    )
+    parser.add_argument(
+        "--profile",
+        action="store_true",
+        help="Collect phase timings and counters, served on /metrics.",
+    )
+    parser.add_argument(
+        "-v",
+        "--verbose",
+        action="store_true",
+        help="Enable verbose logging.",
+    )
+
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.DEBUG if args.verbose else logging.INFO)
+    PROFILER.enable(args.profile)
+
+    finder = RoomFinder(
+        ttl=datetime.timedelta(hours=args.ttl),
+        concurrency=args.concurrency,
+        horizon=args.horizon,
+        result_cache=ResultCache.shared() if args.result_cache else None,
+        scoring=load_scoring_config(args.scoring) if args.scoring else None,
+    )
+    finder.load()
+    serve(args.host, args.port, args.refresh_interval * 60, finder)
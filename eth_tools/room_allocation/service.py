@@ -0,0 +1,447 @@
+"""
+Room search with warm in-memory state for long-running processes.
+1. Load the room catalog, the allocation store, the free room index and the free
+   timelines once
+2. Answer searches from the loaded snapshot without touching the disk, repeated
+   searches from a result cache that is dropped with the snapshot's data version.
+   Searches outside the downloaded date ranges fail (`WindowNotCovered`) and download
+   the missing rooms in the background
+3. Keep the features of recent searches to re-rank them instantly when only the
+   scoring weights change
+4. Keep live rankings (`live.LiveRanking`) of boards that search for now every minute
+5. Spread students over more rooms on request (`spreading.LoadSpreader`), with the
+   recommendation counts shared with the other processes
+6. Refresh the data in the background and swap in the new snapshot atomically, the
+   free room index only re-indexes the downloaded rooms
+"""
+import datetime
+import json
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Callable, Iterable, List, NamedTuple, Optional, Tuple
+
+from eth_tools.room_allocation.allocations import CET, AllocationStore
+from eth_tools.room_allocation.allocation_cache import get_allocation_store
+from eth_tools.room_allocation.batch import (
+    Query,
+    candidate_rooms,
+    parse_query,
+    search_batch,
+    search_free,
+)
+from eth_tools.room_allocation.bucket_index import FreeRoomIndex
+from eth_tools.room_allocation.catalog import RoomCatalog, load_room_catalog, room_name
+from eth_tools.room_allocation.live import LiveRanking
+from eth_tools.room_allocation.refresh import (
+    ALLOCATION_TTL,
+    DOWNLOAD_DAYS,
+    covers,
+    refresh_allocations,
+    refresh_room_info,
+)
+from eth_tools.room_allocation.result_cache import ResultCache
+from eth_tools.room_allocation.scoring_config import ScoringConfig, default_scoring_config
+from eth_tools.room_allocation.scraper import MAX_CONCURRENCY
+from eth_tools.room_allocation.spreading import LoadSpreader
+from eth_tools.room_allocation.timeline import FreeTimeline
+from eth_tools.settings import ALLOCATION_HORIZON, ROOM_CONFIG
+
+LOGGER = logging.getLogger(__name__)
+
+FEATURE_CACHE_SIZE = 64  # Searches whose features are kept, up to 48 bytes per candidate
+LIVE_RANKINGS = 64  # Live rankings kept, one per board
+
+
+class Snapshot(NamedTuple):
+    catalog: RoomCatalog
+    store: AllocationStore
+    index: FreeRoomIndex
+    timeline: FreeTimeline
+    coverage: Tuple[str, str]  # Dates (from, to) downloaded for every room of the store
+
+
+class WindowNotCovered(RuntimeError):
+    """The downloaded allocations of some candidates do not cover the searched window."""
+
+    def __init__(self, rooms: List[str], window: Tuple):
+        self.rooms = rooms
+        self.window = window
+        super().__init__(
+            f"The window {window[0]:%Y-%m-%d %H:%M} - {window[1]:%Y-%m-%d %H:%M} is not "
+            f"covered by the downloaded allocations of {len(rooms)} rooms, they are being "
+            "downloaded. Retry later."
+        )
+
+
+class RoomFinder:
+    """Searches rooms on a snapshot of the downloaded data.
+
+    Searches read `self.snapshot` once, so a concurrent refresh never mixes the
+    catalog, store or index of two different versions.
+    """
+
+    def __init__(
+        self,
+        ttl: datetime.timedelta = ALLOCATION_TTL,
+        concurrency: int = MAX_CONCURRENCY,
+        horizon: Optional[Tuple[int, int]] = ALLOCATION_HORIZON,
+        result_cache: Optional[ResultCache] = None,
+        scoring: Optional[ScoringConfig] = None,
+        spreader: Optional[LoadSpreader] = None,
+    ):
+        self.ttl = ttl
+        self.concurrency = concurrency
+        self.horizon = horizon
+        # In memory by default, `ResultCache.shared()` shares results with the CLI
+        self.result_cache = result_cache if result_cache is not None else ResultCache()
+        self.feature_cache = ResultCache(FEATURE_CACHE_SIZE, name="feature_cache")
+        # Default config of searches, scoring.json in the data directory if there is one
+        self.scoring = scoring if scoring is not None else default_scoring_config()
+        self._live = OrderedDict()
+        self._live_lock = threading.Lock()
+        self._spreader = spreader
+        self._spreader_lock = threading.Lock()
+        self.snapshot: Optional[Snapshot] = None
+        self.refreshed_at: Optional[float] = None  # time.monotonic() of the last refresh
+        self._refresh_lock = threading.Lock()
+
+    @property
+    def spreader(self) -> LoadSpreader:
+        """Recommendation counts, opened on first use (shared SQLite file by default)."""
+        with self._spreader_lock:
+            if self._spreader is None:
+                self._spreader = LoadSpreader()
+            return self._spreader
+
+    @property
+    def version(self) -> Optional[str]:
+        snapshot = self.snapshot
+        return snapshot.store.version if snapshot is not None else None
+
+    def _swap(self, catalog: RoomCatalog, store: Optional[AllocationStore]):
+        if store is None:
+            store = AllocationStore.from_allocations({})
+        snapshot = self.snapshot
+        if snapshot is not None and store.version and store.version == snapshot.store.version:
+            index, timeline = snapshot.index, snapshot.timeline  # Only metadata changed
+        elif (
+            snapshot is not None
+            and store.merged is not None
+            and snapshot.store.version is not None
+            and store.merged[0] == snapshot.store.version
+        ):
+            # Merged into the current store, re-index the downloaded rooms only
+            index = snapshot.index.copy()
+            index.update(store, store.merged[1])
+            timeline = FreeTimeline.from_store(store)
+        else:
+            index, timeline = FreeRoomIndex.from_store(store), FreeTimeline.from_store(store)
+        dates = store.metadata.values()
+        coverage = (
+            max((metadata["from_date"] for metadata in dates), default="9999-12-31"),
+            min((metadata["to_date"] for metadata in dates), default="0000-01-01"),
+        )
+        self.snapshot = Snapshot(catalog, store, index, timeline, coverage)
+        LOGGER.info(f"Loaded {len(catalog)} rooms, allocation version {store.version}.")
+
+    def load(self):
+        """Loads the downloaded data, downloading only a missing room info."""
+        with self._refresh_lock:
+            catalog = (
+                load_room_catalog() if os.path.exists(ROOM_CONFIG) else refresh_room_info()
+            )
+            self._swap(catalog, get_allocation_store())
+
+    def _refresh(
+        self,
+        force: bool = False,
+        rooms: Optional[Iterable[str]] = None,
+        window: Optional[Tuple] = None,
+        progress: Optional[Callable[[int, int], None]] = None,
+    ):
+        catalog = refresh_room_info(force=force)
+        snapshot = self.snapshot
+        store = snapshot.store if snapshot is not None else get_allocation_store()
+        if window is None:
+            now = datetime.datetime.now(CET)
+            window = (now, now + datetime.timedelta(days=DOWNLOAD_DAYS))
+        store = refresh_allocations(
+            sorted(catalog.by_name) if rooms is None else rooms,
+            store if store is not None and store.version is not None else None,
+            window,
+            ttl=self.ttl,
+            force=force,
+            concurrency=self.concurrency,
+            progress=progress,
+            horizon=self.horizon,
+        )
+        self._swap(catalog, store)
+        if rooms is None:
+            self.refreshed_at = time.monotonic()
+
+    def refresh(
+        self,
+        force: bool = False,
+        rooms: Optional[Iterable[str]] = None,
+        window: Optional[Tuple] = None,
+        progress: Optional[Callable[[int, int], None]] = None,
+    ):
+        """Downloads outdated data and swaps in the new snapshot
+
+        Keyword Arguments:
+            force {bool} -- Download all given rooms (default: {False})
+            rooms {Iterable[str]} -- Rooms to refresh (default: {None} = all rooms)
+            window {tuple} -- (datetime_from, datetime_to) that must be covered
+                (default: {None} = the next DOWNLOAD_DAYS days)
+            progress {Callable} -- Called with (done, total) after every room (default: {None})
+        """
+        with self._refresh_lock:
+            self._refresh(force, rooms, window, progress)
+
+    def refresh_in_background(
+        self, rooms: Optional[Iterable[str]] = None, window: Optional[Tuple] = None
+    ) -> bool:
+        """Starts a refresh unless one is already running
+
+        Keyword Arguments:
+            rooms {Iterable[str]} -- Rooms to refresh (default: {None} = all rooms)
+            window {tuple} -- (datetime_from, datetime_to) that must be covered
+                (default: {None} = the next DOWNLOAD_DAYS days)
+
+        Returns:
+            bool -- Whether a refresh has been started
+        """
+        if not self._refresh_lock.acquire(blocking=False):
+            return False
+
+        def refresh():
+            try:
+                self._refresh(rooms=rooms, window=window)
+            except Exception:
+                LOGGER.exception("Background refresh failed, keeping the current data.")
+            finally:
+                self._refresh_lock.release()
+
+        threading.Thread(target=refresh, name="room-refresh", daemon=True).start()
+        return True
+
+    def is_stale(self, max_age: datetime.timedelta) -> bool:
+        """Returns whether the last refresh of all rooms is older than max_age."""
+        return (
+            self.refreshed_at is None
+            or time.monotonic() - self.refreshed_at > max_age.total_seconds()
+        )
+
+    def uncovered_rooms(self, rooms: Iterable[str], window: Tuple) -> List[str]:
+        """Returns the given rooms whose downloaded allocation does not cover the window."""
+        snapshot = self.snapshot
+        metadata = snapshot.store.metadata if snapshot is not None else {}
+        return [
+            room for room in rooms if room not in metadata or not covers(metadata[room], window)
+        ]
+
+    def _check_coverage(self, snapshot: Snapshot, queries: List[Query], now: datetime.datetime):
+        """Raises `WindowNotCovered` and downloads the missing rooms in the background if
+        the allocations of the candidates of a query do not cover its window
+
+        Candidates never downloaded are skipped by the scoring like in `find-room`, unless
+        none of them is downloaded (e.g. before the first refresh).
+        """
+        covered_from, covered_to = snapshot.coverage
+        metadata = snapshot.store.metadata
+        uncovered, windows = set(), []
+        for query in queries:
+            window = query.window(now)
+            if covered_from <= window[0].date().isoformat() and (
+                window[1].date().isoformat() <= covered_to
+            ):
+                continue  # Covered by all downloaded rooms
+            names = [room_name(room) for room in candidate_rooms(snapshot.catalog, query)]
+            downloaded = [name for name in names if name in metadata]
+            rooms = self.uncovered_rooms(downloaded or names, window)
+            if rooms:
+                uncovered.update(rooms)
+                windows.append(window)
+        if uncovered:
+            window = (min(window[0] for window in windows), max(window[1] for window in windows))
+            self.refresh_in_background(sorted(uncovered), window)
+            raise WindowNotCovered(sorted(uncovered), window)
+
+    def search(
+        self,
+        location: str,
+        building: Optional[str] = None,
+        when: Optional[datetime.datetime] = None,
+        duration: float = 4,
+        top: int = 10,
+        free_only: bool = False,
+        near: Optional[str] = None,
+        room_type: Optional[str] = None,
+        min_seats: Optional[int] = None,
+        scoring: Optional[ScoringConfig] = None,
+        spread: bool = False,
+        record: bool = True,
+    ) -> List[Tuple[str, float]]:
+        """Returns the best rooms for the given search
+
+        Arguments:
+            location {str} -- Location to search room at
+
+        Keyword Arguments:
+            building {str} -- Constrain search to building (default: {None})
+            when {datetime.datetime} -- When the room should be free (default: {None} = now)
+            duration {float} -- Hours that the room should be free (default: {4})
+            top {int} -- Number of rooms to return (default: {10})
+            free_only {bool} -- Only return rooms free for the whole duration (default: {False})
+            near {str} -- Building of the user, ranks by building travel times where
+                known (default: {None})
+            room_type {str} -- Only rooms of this type (default: {None})
+            min_seats {int} -- Only rooms with at least this many seats (default: {None})
+            scoring {ScoringConfig} -- Weights and parameters of the score, a change of
+                the weights only re-ranks recent searches (default: {None} = self.scoring)
+            spread {bool} -- Penalize rooms recommended often recently, scores are the
+                penalized scores (default: {False})
+            record {bool} -- Count the rooms returned with spread as recommended
+                (default: {True})
+
+        Returns:
+            list -- (room name, score) sorted by descending score
+        """
+        query = parse_query(
+            dict(
+                location=location,
+                building=building,
+                when=when,
+                duration=duration,
+                top=top,
+                free_only=free_only,
+                near=near,
+                room_type=room_type,
+                min_seats=min_seats,
+            )
+        )
+        return self.search_batch([query], scoring, spread, record)[0]
+
+    def search_batch(
+        self,
+        queries: List[Query],
+        scoring: Optional[ScoringConfig] = None,
+        spread: bool = False,
+        record: bool = True,
+    ) -> List[List[Tuple[str, float]]]:
+        """Returns the best rooms for every query (see `batch.search_batch` and `search`
+        for spread), raises `WindowNotCovered` if the downloaded allocations do not
+        cover a query."""
+        snapshot = self.snapshot
+        if snapshot is None:
+            raise RuntimeError("No room data loaded yet.")
+        now = datetime.datetime.now(CET)
+        self._check_coverage(snapshot, queries, now)
+        results = search_batch(
+            # All candidates with spread, the penalties may move any of them into the top
+            [query._replace(top=None) for query in queries] if spread else queries,
+            snapshot.catalog,
+            snapshot.store,
+            snapshot.index,
+            now=now,
+            cache=self.result_cache,
+            config=scoring or self.scoring,
+            features=self.feature_cache,
+        )
+        if spread:
+            results = [
+                self.spreader.recommend(scores, query.top, record=record)
+                for query, scores in zip(queries, results)
+            ]
+        return results
+
+    def live(
+        self,
+        location: str,
+        building: Optional[str] = None,
+        duration: float = 4,
+        top: int = 10,
+        near: Optional[str] = None,
+        room_type: Optional[str] = None,
+        min_seats: Optional[int] = None,
+        scoring: Optional[ScoringConfig] = None,
+        now: Optional[datetime.datetime] = None,
+    ) -> Tuple[List[Tuple[str, float]], int]:
+        """Returns the best rooms now, updating the live ranking of the search (see
+        `RoomFinder.search` for the arguments)
+
+        Only rooms whose features changed since the last call of the same search are
+        rescored; the ranking is rebuilt when the snapshot changes.
+
+        Returns:
+            tuple -- (room name, score) sorted by descending score, number of rooms rescored
+        """
+        snapshot = self.snapshot
+        if snapshot is None:
+            raise RuntimeError("No room data loaded yet.")
+        query = parse_query(
+            dict(
+                location=location,
+                building=building,
+                duration=duration,
+                top=top,
+                near=near,
+                room_type=room_type,
+                min_seats=min_seats,
+            )
+        )
+        config = scoring or self.scoring
+        key = (query, json.dumps(config.key))
+        with self._live_lock:
+            ranking = self._live.get(key)
+            if ranking is None or ranking.store is not snapshot.store:
+                ranking = LiveRanking(
+                    candidate_rooms(snapshot.catalog, query),
+                    query.location,
+                    snapshot.store,
+                    query.duration,
+                    query.top,
+                    snapshot.catalog.travel_times,
+                    query.near,
+                    config,
+                )
+                self._live[key] = ranking
+            self._live.move_to_end(key)
+            while len(self._live) > LIVE_RANKINGS:
+                self._live.popitem(last=False)
+            return ranking.tick(now), ranking.rescored
+
+    def longest_free(
+        self,
+        location: str,
+        building: Optional[str] = None,
+        when: Optional[datetime.datetime] = None,
+        duration: float = 4,
+        top: int = 10,
+        room_type: Optional[str] = None,
+        min_seats: Optional[int] = None,
+    ) -> List[Tuple[str, datetime.datetime]]:
+        """Returns the rooms free for the longest contiguous time (see `RoomFinder.search`
+        for the arguments, rooms must be free for at least duration hours)
+
+        Returns:
+            list -- (room name, free until) sorted by descending free time
+        """
+        snapshot = self.snapshot
+        if snapshot is None:
+            raise RuntimeError("No room data loaded yet.")
+        query = parse_query(
+            dict(
+                location=location,
+                building=building,
+                when=when,
+                duration=duration,
+                top=top,
+                room_type=room_type,
+                min_seats=min_seats,
+            )
+        )
+        return search_free(query, snapshot.catalog, snapshot.timeline)
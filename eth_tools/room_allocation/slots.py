@@ -0,0 +1,139 @@
+"""
+Compact representation of the slots of a room allocation.
+1. Convert allocation dates (2023-09-01T08:00:00) to integer minutes since 1970-01-01
+   on the Zurich wall clock
+2. Classify the belegungstyp of every slot as `SlotType` member, keeping the number
+3. Keep only start, end and type per slot (`Slot` uses __slots__), the raw API
+   record only on request
+
+Kept free of numpy, `find-room --help` imports it through the scraper.
+"""
+import datetime
+import enum
+import functools
+from typing import Optional, Tuple
+from zoneinfo import ZoneInfo
+
+CET = ZoneInfo("Europe/Zurich")
+
+_DAY_SECONDS = 24 * 60 * 60
+_EPOCH = datetime.datetime(1970, 1, 1)
+
+
+@functools.lru_cache(maxsize=1 << 16)  # Slots share few distinct dates
+def to_minutes(date_str: str) -> int:
+    """Returns the given allocation date (2023-09-01T08:00:00) in epoch minutes."""
+    delta = datetime.datetime.fromisoformat(date_str) - _EPOCH
+    return delta.days * 24 * 60 + delta.seconds // 60
+
+
+def from_minutes(minutes: int) -> datetime.datetime:
+    """Returns the given epoch minutes as timezone aware datetime."""
+    return (_EPOCH + datetime.timedelta(minutes=minutes)).replace(tzinfo=CET)
+
+
+def epoch_seconds(dt: datetime.datetime) -> Tuple[int, int]:
+    """Returns the floor and ceil of the given timezone aware datetime in epoch seconds."""
+    delta = dt.astimezone(CET).replace(tzinfo=None) - _EPOCH
+    floor = delta.days * _DAY_SECONDS + delta.seconds
+    return floor, floor + (1 if delta.microseconds else 0)
+
+
+def window_minutes(
+    datetime_from: datetime.datetime, datetime_to: datetime.datetime
+) -> Tuple[int, int]:
+    """Returns the closed window [datetime_from, datetime_to] in epoch minutes.
+
+    A slot with minute aligned bounds overlaps the window iff
+    `start <= to_minute and end >= from_minute`.
+    """
+    _, from_ceil = epoch_seconds(datetime_from)
+    to_floor, _ = epoch_seconds(datetime_to)
+    return -(-from_ceil // 60), to_floor // 60
+
+
+def belegungstyp(slot: dict) -> int:
+    """Returns the belegungstyp of the given API record, -1 if it has none."""
+    value = slot.get("belegungsserie", {}).get("belegungstyp")
+    return -1 if value is None else value
+
+
+class SlotType(enum.IntEnum):
+    """Type of a slot, by the belegungstyp of the types the scores distinguish."""
+
+    UNKNOWN = -1  # Missing or any other belegungstyp (lectures, exams, events, ...)
+    FREE = 7  # "frei"
+    CLOSED = 8  # "geschlossen"
+    WORKSPACE = 15  # "Studierendenarbeitsplätze"
+
+    @classmethod
+    def of(cls, value: int) -> "SlotType":
+        """Returns the type of the given belegungstyp."""
+        try:
+            return cls(value)
+        except ValueError:
+            return cls.UNKNOWN
+
+
+FREE_TYPES = (SlotType.FREE, SlotType.WORKSPACE)
+
+
+class Slot:
+    """One slot of a room allocation.
+
+    Attributes:
+        start {int} -- Start in epoch minutes
+        end {int} -- End in epoch minutes
+        type {SlotType} -- Type of the slot
+        belegungstyp {int} -- belegungstyp of the API record (-1 if it has none)
+        raw {dict} -- API record of the slot (None unless requested when loading)
+    """
+
+    __slots__ = ("start", "end", "type", "belegungstyp", "raw")
+
+    def __init__(self, start: int, end: int, belegungstyp: int, raw: Optional[dict] = None):
+        self.start = start
+        self.end = end
+        self.type = SlotType.of(belegungstyp)
+        self.belegungstyp = belegungstyp
+        self.raw = raw
+
+    @classmethod
+    def from_record(cls, slot: dict, keep_raw: bool = False) -> "Slot":
+        """Returns the slot of the given API record (date_from, date_to, belegungsserie)."""
+        return cls(
+            to_minutes(slot["date_from"]),
+            to_minutes(slot["date_to"]),
+            belegungstyp(slot),
+            slot if keep_raw else None,
+        )
+
+    @property
+    def date_from(self) -> datetime.datetime:
+        return from_minutes(self.start)
+
+    @property
+    def date_to(self) -> datetime.datetime:
+        return from_minutes(self.end)
+
+    @property
+    def is_free(self) -> bool:
+        return self.type in FREE_TYPES
+
+    def __repr__(self):
+        date_format = "%Y-%m-%dT%H:%M"
+        name = self.type.name
+        if self.type is SlotType.UNKNOWN and self.belegungstyp != -1:
+            name = f"TYPE_{self.belegungstyp}"
+        return (
+            f"Slot({self.date_from:{date_format}}, {self.date_to:{date_format}}, {name})"
+        )
+
+    def __eq__(self, other):
+        if not isinstance(other, Slot):
+            return NotImplemented
+        return (self.start, self.end, self.belegungstyp) == (
+            other.start,
+            other.end,
+            other.belegungstyp,
+        )
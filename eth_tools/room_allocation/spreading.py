@@ -0,0 +1,183 @@
+"""
+Load-spreading recommendations that spread students over more rooms.
+1. Count how often each room has been recommended, decaying the counts exponentially
+   with a half-life so that only recent recommendations weigh
+2. Penalize the score of recommended rooms by their count (saturating at max_penalty),
+   so that heavily recommended rooms rotate out of the top rooms
+3. Share the counts between the CLI, the app and the server through a SQLite file
+   in the data directory
+
+Counts are stored relative to a landmark time (forward decay): a recommendation at t
+adds 2^((t - landmark) / half_life), the count at now is the stored weight times
+2^(-(now - landmark) / half_life). Recording a recommendation is one B-tree upsert,
+O(log n), and never touches the other rooms; the landmark is moved forward (rescaling
+all weights) once the weights grow too large.
+"""
+import datetime
+import os
+import sqlite3
+import threading
+import time
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+from eth_tools.room_allocation.profiling import count, span
+from eth_tools.settings import (
+    RECOMMENDATIONS,
+    SPREAD_HALF_LIFE,
+    SPREAD_HALF_LOAD,
+    SPREAD_PENALTY,
+)
+
+MAX_EXPONENT = 512  # Half-lives after the landmark before rescaling, 2^512 fits a float
+MIN_WEIGHT = 1e-3  # Counts below are dropped when rescaling
+SQLITE_TIMEOUT = 5  # Seconds to wait for a concurrent writer
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS counters (room TEXT PRIMARY KEY, weight REAL NOT NULL);
+CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value REAL NOT NULL);
+INSERT OR IGNORE INTO meta VALUES ('landmark', 0);
+"""
+
+
+class LoadSpreader:
+    """Time-decayed recommendation counts per room and the scores penalized by them."""
+
+    def __init__(
+        self,
+        path: str = RECOMMENDATIONS,
+        half_life: datetime.timedelta = SPREAD_HALF_LIFE,
+        max_penalty: float = SPREAD_PENALTY,
+        half_load: float = SPREAD_HALF_LOAD,
+    ):
+        """Opens (or creates) the counts at the given path
+
+        Keyword Arguments:
+            path {str} -- SQLite file shared between processes, ":memory:" keeps the
+                counts in this process (default: {RECOMMENDATIONS})
+            half_life {datetime.timedelta} -- Time after which a recommendation counts
+                half (default: {SPREAD_HALF_LIFE})
+            max_penalty {float} -- Score points subtracted from rooms recommended very
+                often (default: {SPREAD_PENALTY})
+            half_load {float} -- Count at which half of max_penalty is subtracted
+                (default: {SPREAD_HALF_LOAD})
+        """
+        self.path = str(path)
+        self.half_life = half_life.total_seconds()
+        self.max_penalty = max_penalty
+        self.half_load = half_load
+        if self.path != ":memory:":
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        # One connection shared by the threads of this process, serialized by the lock
+        self._connection = sqlite3.connect(
+            self.path, timeout=SQLITE_TIMEOUT, isolation_level=None, check_same_thread=False
+        )
+        self._lock = threading.Lock()
+        with self._lock:
+            if self.path != ":memory:":
+                self._connection.execute("PRAGMA journal_mode=WAL")  # Readers never block
+                self._connection.execute("PRAGMA synchronous=NORMAL")
+            self._connection.executescript(_SCHEMA)
+
+    def close(self):
+        with self._lock:
+            self._connection.close()
+
+    def _landmark(self) -> float:
+        (landmark,) = self._connection.execute(
+            "SELECT value FROM meta WHERE key = 'landmark'"
+        ).fetchone()
+        return landmark
+
+    def _rescale(self, now: float) -> float:
+        """Moves the landmark to now, returns it (within a write transaction)."""
+        factor = 2 ** (-(now - self._landmark()) / self.half_life)
+        self._connection.execute("UPDATE counters SET weight = weight * ?", (factor,))
+        self._connection.execute("DELETE FROM counters WHERE weight < ?", (MIN_WEIGHT,))
+        self._connection.execute("UPDATE meta SET value = ? WHERE key = 'landmark'", (now,))
+        count("spread.rescales")
+        return now
+
+    def loads(self, rooms: Iterable[str], now: Optional[float] = None) -> Dict[str, float]:
+        """Returns the decayed recommendation count of the given rooms at now (seconds
+        since the epoch, default: now), rooms never recommended are missing."""
+        now = time.time() if now is None else now
+        rooms = list(rooms)
+        with self._lock:
+            landmark = self._landmark()
+            weights = {}
+            for i in range(0, len(rooms), 500):  # SQLite limits the number of parameters
+                chunk = rooms[i : i + 500]
+                weights.update(
+                    self._connection.execute(
+                        f"SELECT room, weight FROM counters WHERE room IN "
+                        f"({', '.join('?' * len(chunk))})",
+                        chunk,
+                    ).fetchall()
+                )
+        decay = 2 ** (-(now - landmark) / self.half_life)
+        return {room: weight * decay for room, weight in weights.items()}
+
+    def record(self, rooms: Iterable[str], now: Optional[float] = None):
+        """Counts one recommendation of each given room at now (seconds since the epoch,
+        default: now)."""
+        now = time.time() if now is None else now
+        rooms = list(rooms)
+        with self._lock:
+            self._connection.execute("BEGIN IMMEDIATE")
+            try:
+                landmark = self._landmark()
+                if (now - landmark) / self.half_life > MAX_EXPONENT:
+                    landmark = self._rescale(now)
+                increment = 2 ** ((now - landmark) / self.half_life)
+                self._connection.executemany(
+                    "INSERT INTO counters VALUES (?, ?) "
+                    "ON CONFLICT(room) DO UPDATE SET weight = weight + excluded.weight",
+                    [(room, increment) for room in rooms],
+                )
+                self._connection.execute("COMMIT")
+            except BaseException:
+                self._connection.execute("ROLLBACK")
+                raise
+        count("spread.recorded", len(rooms))
+
+    def penalty(self, load: float) -> float:
+        """Returns the score points subtracted from a room with the given count."""
+        return self.max_penalty * load / (load + self.half_load)
+
+    def recommend(
+        self,
+        scores: Sequence[Tuple[str, float]],
+        top: int = 10,
+        now: Optional[float] = None,
+        record: bool = True,
+    ) -> List[Tuple[str, float]]:
+        """Returns the top rooms by their penalized scores and counts them as recommended
+
+        Arguments:
+            scores {Sequence[tuple]} -- (room name, score) of all candidates, sorted by
+                descending score (e.g. `score_rooms` without top)
+
+        Keyword Arguments:
+            top {int} -- Number of rooms to recommend (default: {10})
+            now {float} -- Seconds since the epoch (default: {None} = now)
+            record {bool} -- Count the returned rooms as recommended (default: {True})
+
+        Returns:
+            list -- (room name, penalized score) sorted by descending penalized score
+        """
+        now = time.time() if now is None else now
+        if len(scores) > top > 0:
+            # Rooms scoring more than max_penalty below the top rooms stay out of the top
+            threshold = scores[top - 1][1] - self.max_penalty
+            scores = [(room, score) for room, score in scores if score >= threshold]
+        with span("spread.recommend", candidates=len(scores)):
+            loads = self.loads((room for room, _ in scores), now)
+            penalized = [
+                (room, score - self.penalty(loads[room]) if room in loads else score)
+                for room, score in scores
+            ]
+            # Stable, rooms with equal penalized scores keep their order
+            best = sorted(penalized, key=lambda x: -x[1])[:top]
+            if record:
+                self.record((room for room, _ in best), now)
+        return best
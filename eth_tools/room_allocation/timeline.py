@@ -0,0 +1,198 @@
+"""
+Precomputed free-interval timelines of many rooms.
+1. Compile the allocation of every room once into sorted, merged free intervals:
+   slots of type "frei" and "Studierendenarbeitsplätze" are free, all other slots
+   (including closures) are busy, and the downloaded date range bounds the timeline
+2. Answer next-free and free-until queries with one binary search per room
+3. Rank rooms by their remaining free time with a heap across rooms
+
+Intervals are half-open [start, end) in epoch minutes (see `allocations`), so a room
+whose lecture ends at 10:00 is free from 10:00. Rooms without any slot have no
+timeline (probably not open rooms).
+"""
+import datetime
+import heapq
+from typing import Iterable, List, Optional, Tuple
+
+import numpy as np
+
+from eth_tools.room_allocation.allocations import FREE_TYPES, AllocationStore
+from eth_tools.room_allocation.profiling import timed
+from eth_tools.room_allocation.slots import epoch_seconds, from_minutes, to_minutes
+
+_SPAN = 1 << 32  # Room id stride of the (room, minute) search keys, above any epoch minute
+
+
+def _coverage(store: AllocationStore) -> Tuple[np.ndarray, np.ndarray]:
+    """Returns per room the start and end (epoch minutes) of its downloaded date range
+
+    The range is [from_date 00:00, day after to_date 00:00) as in `refresh.covers`,
+    rooms without metadata are covered from their first to their last slot.
+    """
+    n_rooms = len(store.names)
+    first = np.full(n_rooms, np.iinfo(np.int64).max, dtype=np.int64)
+    last = np.full(n_rooms, np.iinfo(np.int64).min, dtype=np.int64)
+    np.minimum.at(first, store.room, store.start)
+    np.maximum.at(last, store.room, store.end)
+    for name, metadata in store.metadata.items():
+        if name in store.ids and "from_date" in metadata and "to_date" in metadata:
+            room = store.ids[name]
+            first[room] = to_minutes(f"{metadata['from_date']}T00:00:00")
+            last[room] = to_minutes(f"{metadata['to_date']}T00:00:00") + 24 * 60
+    return first, last
+
+
+def _merge(room: np.ndarray, start: np.ndarray, end: np.ndarray) -> Tuple:
+    """Returns the union of the given slots per room as (room, start, end) sorted by
+    (room, start), merging overlapping and touching slots."""
+    order = np.lexsort((start, room))
+    room, start, end = room[order].astype(np.int64), start[order], end[order]
+    if not len(room):
+        return room, start, end
+    # Running maximum of the end per room, rooms are offset by _SPAN to keep it
+    # from leaking into the next room
+    reach = np.maximum.accumulate(room * _SPAN + end) - room * _SPAN
+    new_group = np.r_[True, (room[1:] != room[:-1]) | (start[1:] > reach[:-1])]
+    firsts = np.flatnonzero(new_group)
+    lasts = np.r_[firsts[1:], len(room)] - 1
+    return room[firsts], start[firsts], reach[lasts]
+
+
+class FreeTimeline:
+    """Free intervals of many rooms, grouped by room and sorted by start.
+
+    Attributes:
+        names {list} -- Room names, indexed by room id (same ids as the store)
+        room {np.ndarray} -- Room id of each free interval
+        start {np.ndarray} -- Start of each free interval in epoch minutes
+        end {np.ndarray} -- End (exclusive) of each free interval in epoch minutes
+    """
+
+    def __init__(self, names, room, start, end):
+        """Wraps free intervals that are already sorted by (room, start) and disjoint."""
+        self.names = list(names)
+        self.ids = {name: i for i, name in enumerate(self.names)}
+        self.room = room
+        self.start = start
+        self.end = end
+        self._keys = room.astype(np.int64) * _SPAN + end
+
+    def __len__(self):
+        return len(self.names)
+
+    @classmethod
+    @timed("index.free_timeline")
+    def from_store(cls, store: AllocationStore) -> "FreeTimeline":
+        """Compiles the free intervals of all rooms of the given store."""
+        busy = ~np.isin(store.typ, FREE_TYPES)
+        busy_room, busy_start, busy_end = _merge(
+            store.room[busy], store.start[busy], store.end[busy]
+        )
+
+        # Free intervals are the gaps around the busy intervals within the coverage
+        coverage_start, coverage_end = _coverage(store)
+        rooms, room_firsts, counts = np.unique(busy_room, return_index=True, return_counts=True)
+        free_room = np.insert(busy_room, room_firsts, rooms)
+        free_start = np.insert(busy_end, room_firsts, coverage_start[rooms])
+        free_end = np.insert(busy_start, room_firsts + counts, coverage_end[rooms])
+
+        # Rooms with only free slots are free during their whole coverage
+        idle = np.setdiff1d(np.unique(store.room), rooms).astype(np.int64)
+        free_room = np.concatenate([free_room, idle])
+        free_start = np.concatenate([free_start, coverage_start[idle]])
+        free_end = np.concatenate([free_end, coverage_end[idle]])
+
+        keep = free_end > free_start
+        order = np.lexsort((free_start[keep], free_room[keep]))
+        return cls(
+            store.names, free_room[keep][order], free_start[keep][order], free_end[keep][order]
+        )
+
+    def _locate(self, ids: np.ndarray, minute: int) -> Tuple[np.ndarray, np.ndarray]:
+        """Returns per room the index of its first free interval ending after minute and
+        whether such an interval exists."""
+        if not len(self._keys):
+            return np.zeros(len(ids), dtype=np.int64), np.zeros(len(ids), dtype=bool)
+        i = np.searchsorted(self._keys, ids * _SPAN + minute, side="right")
+        valid = i < len(self._keys)
+        i = np.where(valid, i, 0)
+        return i, valid & (self.room[i] == ids)
+
+    def room_ids(self, names: Optional[Iterable[str]] = None) -> np.ndarray:
+        """Returns the room ids of the given room names (all rooms by default)."""
+        if names is None:
+            return np.arange(len(self.names), dtype=np.int64)
+        return np.array([self.ids[name] for name in names if name in self.ids], dtype=np.int64)
+
+    def free_until_many(
+        self, datetime_from: datetime.datetime, ids: np.ndarray
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """Returns per room whether it is free at datetime_from and until when
+
+        Arguments:
+            datetime_from {datetime.datetime} -- Timezone aware start
+            ids {np.ndarray} -- Room ids to query
+
+        Returns:
+            tuple -- Boolean array of free rooms, end of their free interval in epoch minutes
+        """
+        minute = epoch_seconds(datetime_from)[0] // 60
+        i, valid = self._locate(ids, minute)
+        free = valid & (self.start[i] <= minute)
+        return free, np.where(free, self.end[i], minute)
+
+    def next_free(self, name: str, datetime_from: datetime.datetime):
+        """Returns when the room is free next (datetime_from if it is free already),
+        None if it is not free again within its downloaded date range."""
+        if name not in self.ids:
+            return None
+        minute = epoch_seconds(datetime_from)[0] // 60
+        i, valid = self._locate(np.array([self.ids[name]], dtype=np.int64), minute)
+        if not valid[0]:
+            return None
+        if self.start[i[0]] <= minute:
+            return datetime_from
+        return from_minutes(int(self.start[i[0]]))
+
+    def free_until(self, name: str, datetime_from: datetime.datetime):
+        """Returns until when the room is free from datetime_from on, None if it is not free."""
+        if name not in self.ids:
+            return None
+        free, until = self.free_until_many(
+            datetime_from, np.array([self.ids[name]], dtype=np.int64)
+        )
+        return from_minutes(int(until[0])) if free[0] else None
+
+    @timed("query.longest_free")
+    def longest_free(
+        self,
+        datetime_from: datetime.datetime,
+        top: int = 10,
+        min_duration: datetime.timedelta = datetime.timedelta(0),
+        names: Optional[Iterable[str]] = None,
+    ) -> List[Tuple[str, datetime.datetime]]:
+        """Returns the rooms free for the longest contiguous time from datetime_from on
+
+        Arguments:
+            datetime_from {datetime.datetime} -- Timezone aware start
+
+        Keyword Arguments:
+            top {int} -- Number of rooms to return (default: {10})
+            min_duration {datetime.timedelta} -- Minimal free time (default: {0})
+            names {Iterable[str]} -- Rooms to rank (default: {None} = all rooms)
+
+        Returns:
+            list -- (room name, free until) sorted by descending free time
+        """
+        ids = self.room_ids(names)
+        free, until = self.free_until_many(datetime_from, ids)
+        minute = epoch_seconds(datetime_from)[0] // 60
+        min_minutes = min_duration.total_seconds() / 60
+        candidates = (
+            (int(end) - minute, self.names[room])
+            for room, end in zip(ids[free], until[free])
+            if end - minute >= min_minutes
+        )
+        # Ties are broken by room name to keep the order stable
+        best = heapq.nsmallest(top, candidates, key=lambda x: (-x[0], x[1]))
+        return [(name, from_minutes(minute + minutes)) for minutes, name in best]
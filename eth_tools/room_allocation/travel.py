@@ -0,0 +1,136 @@
+"""
+Travel time lookups between locations and buildings as dense NumPy matrices.
+1. Code every location (areaDesc) and building as integer, buildings know the code
+   of their location (assigned once in the catalog)
+2. Load building-to-building travel times (e.g. walking times within Hönggerberg)
+   from a local data file, if there is one
+3. Look up the travel times from an origin to a whole candidate set with one gather,
+   preferring building times and falling back to location times
+
+Example travel_times.json (minutes, used in both directions unless given):
+    {"HCI": {"HPH": 4, "HIL": 6}, "HPH": {"HIL": 5}}
+"""
+import logging
+import os
+from typing import Iterable, List, Optional
+
+import numpy as np
+
+from eth_tools.room_allocation.fix_scores import GetLocation
+from eth_tools.room_allocation.scraper import read_json
+from eth_tools.settings import TRAVEL_TIMES
+
+LOGGER = logging.getLogger(__name__)
+
+
+class TravelTimes:
+    """Travel times in minutes between locations and buildings.
+
+    Attributes:
+        locations {list} -- Location names, indexed by location code (unknown last)
+        location_minutes {np.ndarray} -- Travel times between locations, inf if unknown
+        buildings {list} -- Building names, indexed by building code (unknown last)
+        building_locations {np.ndarray} -- Location code of each building
+        building_minutes {np.ndarray} -- Travel times between buildings, nan if unknown
+    """
+
+    def __init__(
+        self,
+        buildings: List[str],
+        building_locations: Iterable[str],
+        building_minutes: Optional[dict] = None,
+    ):
+        """Codes the given buildings, located at the given locations (areaDesc).
+
+        building_minutes maps a building to the travel time to other buildings
+        (see the module docstring), buildings missing in buildings are added with an
+        unknown location.
+        """
+        get_location = GetLocation()
+        self.locations = get_location.locations + [None]
+        self.location_codes = get_location.codes
+        self.location_minutes = np.array(get_location.distances, dtype=np.float64)
+
+        building_minutes = building_minutes or {}
+        self.buildings = list(buildings)
+        extra = {
+            building
+            for origin, times in building_minutes.items()
+            for building in (origin, *times)
+        }.difference(self.buildings)
+        self.buildings += sorted(extra) + [None]
+        self.building_codes = {building: i for i, building in enumerate(self.buildings[:-1])}
+        locations = list(building_locations)
+        locations += [None] * (len(self.buildings) - len(locations))
+        self.building_locations = np.array(
+            [get_location.code(location) for location in locations], dtype=np.int64
+        )
+
+        self.building_minutes = np.full((len(self.buildings), len(self.buildings)), np.nan)
+        np.fill_diagonal(self.building_minutes, 0)
+        self.building_minutes[-1, -1] = np.nan
+        for origin, times in building_minutes.items():
+            for building, minutes in times.items():
+                i, j = self.building_codes[origin], self.building_codes[building]
+                self.building_minutes[i, j] = minutes
+                if np.isnan(self.building_minutes[j, i]):
+                    self.building_minutes[j, i] = minutes
+
+    @classmethod
+    def from_catalog(cls, catalog, filepath: str = TRAVEL_TIMES) -> "TravelTimes":
+        """Returns the travel times between the buildings of the given `RoomCatalog`
+
+        Arguments:
+            catalog {RoomCatalog} -- Catalog with the building codes
+
+        Keyword Arguments:
+            filepath {str} -- Building travel times, skipped if missing (default: {TRAVEL_TIMES})
+
+        Returns:
+            TravelTimes -- Travel times of the catalog
+        """
+        building_minutes = None
+        if os.path.exists(filepath):
+            building_minutes = read_json(filepath)
+            LOGGER.debug(f"Loaded travel times of {len(building_minutes)} buildings.")
+        return cls(catalog.buildings, catalog.building_locations, building_minutes)
+
+    @classmethod
+    def from_rooms(cls, rooms: Iterable[dict]) -> "TravelTimes":
+        """Returns the location travel times of the buildings of the given room infos."""
+        locations = {}
+        for room in rooms:
+            locations.setdefault(room["building"], room["location"]["areaDesc"])
+        return cls(list(locations), list(locations.values()))
+
+    def codes(self, rooms: Iterable[dict]) -> np.ndarray:
+        """Returns the building codes of the given room infos."""
+        unknown = len(self.buildings) - 1
+        return np.fromiter(
+            (self.building_codes.get(room["building"], unknown) for room in rooms),
+            dtype=np.int64,
+        )
+
+    def minutes(
+        self, location: str, codes: np.ndarray, building: Optional[str] = None
+    ) -> np.ndarray:
+        """Returns the travel times to the given buildings
+
+        Arguments:
+            location {str} -- Location of the origin
+            codes {np.ndarray} -- Building codes of the destinations
+
+        Keyword Arguments:
+            building {str} -- Building of the origin, its building travel times are
+                used where known (default: {None} = location travel times only)
+
+        Returns:
+            np.ndarray -- Travel time in minutes per destination, inf if unknown
+        """
+        origin = self.location_codes.get(location, len(self.locations) - 1)
+        minutes = self.location_minutes[origin, self.building_locations[codes]]
+        if building is not None and building in self.building_codes:
+            building_minutes = self.building_minutes[self.building_codes[building], codes]
+            known = ~np.isnan(building_minutes)
+            minutes = np.where(known, building_minutes, minutes)
+        return minutes
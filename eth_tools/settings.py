@@ -1,9 +1,26 @@
+import datetime
 import os
 from pathlib import Path
 
 BASE_DIR = Path(__file__).resolve().parent.parent
-DEFAULT_OUTPUT_DIR = Path(os.path.join(BASE_DIR, ".data"))
+DEFAULT_OUTPUT_DIR = Path(os.environ.get("ETH_TOOLS_DATA_DIR", os.path.join(BASE_DIR, ".data")))
 
 # Allocations
 ROOMS_DIR = Path(os.path.join(DEFAULT_OUTPUT_DIR, "room_allocations"))
 ROOM_CONFIG = Path(os.path.join(DEFAULT_OUTPUT_DIR, "room_info.json"))
+ALLOCATION_STORE = Path(os.path.join(ROOMS_DIR, ".store"))
+TRAVEL_TIMES = Path(os.path.join(DEFAULT_OUTPUT_DIR, "travel_times.json"))  # Optional
+SCORING_CONFIG = Path(os.path.join(DEFAULT_OUTPUT_DIR, "scoring.json"))  # Optional
+RECOMMENDATIONS = Path(os.path.join(DEFAULT_OUTPUT_DIR, "recommendations.sqlite"))  # --spread
+RESULT_CACHE = Path(os.path.join(DEFAULT_OUTPUT_DIR, ".results"))  # Shared by the CLI and app
+
+# Refresh
+ALLOCATION_TTL = datetime.timedelta(hours=24)
+ROOM_INFO_TTL = datetime.timedelta(days=7)
+DOWNLOAD_DAYS = 7  # Days downloaded ahead of the requested start
+ALLOCATION_HORIZON = None  # Days (past, future) around today kept on disk, e.g. (1, 28)
+
+# Load spreading
+SPREAD_HALF_LIFE = datetime.timedelta(minutes=30)  # Recommendations count half after
+SPREAD_PENALTY = 20  # Score points subtracted at most from heavily recommended rooms
+SPREAD_HALF_LOAD = 5  # Recent recommendations at which half of the penalty applies
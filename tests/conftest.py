@@ -0,0 +1,38 @@
+import datetime
+import os
+
+import pytest
+
+from benchmarks.fixtures import START_DATE, generate
+from eth_tools.room_allocation.allocations import CET, AllocationStore
+from eth_tools.room_allocation.catalog import load_room_catalog
+
+LOCATION = "Zürich Zentrum"
+
+
+def at(day: int, hour: int, minute: int = 0) -> datetime.datetime:
+    """Returns the given time on the given day of the fixture, Zurich wall clock."""
+    date = START_DATE + datetime.timedelta(days=day)
+    return datetime.datetime.combine(date, datetime.time(hour, minute)).replace(tzinfo=CET)
+
+
+@pytest.fixture(scope="session")
+def fixture(tmp_path_factory):
+    # Windows end on day 2, `Room` looks ahead past the last day of the window
+    return generate(str(tmp_path_factory.mktemp("data")), rooms=60, days=4)
+
+
+@pytest.fixture(scope="session")
+def store(fixture):
+    return AllocationStore.from_files(
+        sorted(
+            os.path.join(fixture.rooms_dir, filename)
+            for filename in os.listdir(fixture.rooms_dir)
+            if filename.endswith(".json")
+        )
+    )
+
+
+@pytest.fixture(scope="session")
+def catalog(fixture):
+    return load_room_catalog(fixture.room_info)
@@ -0,0 +1,64 @@
+import datetime
+import os
+
+import pytest
+
+from benchmarks.fixtures import generate
+from eth_tools.room_allocation import service
+from eth_tools.room_allocation.allocations import AllocationStore
+from eth_tools.room_allocation.bucket_index import FreeRoomIndex
+from eth_tools.room_allocation.service import RoomFinder
+from tests.conftest import at
+
+WINDOWS = [
+    (start, start + datetime.timedelta(hours=hours))
+    for day in range(-1, 5)
+    for start in (at(day, 0) + datetime.timedelta(minutes=m) for m in range(0, 24 * 60, 50))
+    for hours in (0.25, 2)
+]
+
+
+@pytest.fixture(scope="module")
+def update(tmp_path_factory):
+    """Re-downloaded allocations of some rooms of the fixture and two new rooms."""
+    fixture = generate(str(tmp_path_factory.mktemp("update")), rooms=62, days=4, seed=1)
+    filenames = sorted(os.listdir(fixture.rooms_dir))
+    return AllocationStore.from_files(
+        [os.path.join(fixture.rooms_dir, filename) for filename in filenames[::7] + filenames[-2:]]
+    )
+
+
+def assert_same_rooms(index: FreeRoomIndex, expected: FreeRoomIndex):
+    for window in WINDOWS:
+        assert set(index.free_rooms(*window)) == set(expected.free_rooms(*window))
+        assert set(index.workspace_rooms(*window)) == set(expected.workspace_rooms(*window))
+
+
+def test_update_equals_from_store(store, update):
+    merged = store.merge(update)
+    index = FreeRoomIndex.from_store(store)
+    index.update(merged, update.names)
+    assert_same_rooms(index, FreeRoomIndex.from_store(merged))
+
+
+def test_refresh_updates_a_copy_of_the_index(store, catalog, update, monkeypatch):
+    finder = RoomFinder(result_cache=None)
+    store.version = "base"
+    try:
+        finder._swap(catalog, store)
+        previous = finder.snapshot.index
+        merged = store.merge(update)
+        merged.version = "merged"
+
+        def from_store(store):
+            raise AssertionError("The index is rebuilt")
+
+        monkeypatch.setattr(service.FreeRoomIndex, "from_store", from_store)
+        finder._swap(catalog, merged)
+        monkeypatch.undo()
+    finally:
+        store.version = None
+
+    assert finder.snapshot.index is not previous
+    assert_same_rooms(finder.snapshot.index, FreeRoomIndex.from_store(merged))
+    assert_same_rooms(previous, FreeRoomIndex.from_store(store))  # Still read by searches
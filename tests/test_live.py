@@ -0,0 +1,52 @@
+import datetime
+
+import numpy as np
+
+from eth_tools.room_allocation.catalog import room_name
+from eth_tools.room_allocation.live import LiveRanking
+from eth_tools.room_allocation.scoring import score_rooms
+from tests.conftest import LOCATION, at
+
+DURATION = 2
+TOP = 10
+
+
+def test_ticks_equal_full_rescoring(store, catalog):
+    candidates = sorted(catalog.rooms, key=room_name)
+    ranking = LiveRanking(candidates, LOCATION, store, duration=DURATION, top=TOP)
+    rescored = []
+    rescore = ranking._rescore
+
+    def record_rescore(dirty, minute):
+        rescored.append(set(dirty.tolist()))
+        rescore(dirty, minute)
+
+    ranking._rescore = record_rescore
+
+    previous = None
+    total = 0
+    for minute in range(24 * 60):
+        start = at(1, 0) + datetime.timedelta(minutes=minute)
+        window = (start, start + datetime.timedelta(hours=DURATION))
+        # Rooms with an event due at this tick (all rooms at the first tick)
+        due = set(range(len(ranking.names)))
+        if previous is not None:
+            due = set(np.flatnonzero(ranking._due <= ranking.minute + 1).tolist())
+        rescored.clear()
+
+        # Ticks within the minute are truncated to it
+        top = ranking.tick(start + datetime.timedelta(seconds=minute % 60))
+
+        scores = dict(score_rooms(candidates, LOCATION, window, store))
+        assert top == score_rooms(candidates, LOCATION, window, store, top=TOP)
+        assert dict(zip(ranking.names, ranking.scores.tolist())) == scores
+        assert rescored == ([due] if due else [])
+        assert ranking.rescored == len(due)
+        if previous is not None:
+            # Rooms without due event kept their score
+            unchanged = set(range(len(ranking.names))) - due
+            assert all(scores[ranking.names[i]] == previous[ranking.names[i]] for i in unchanged)
+        previous = scores
+        total += len(due)
+
+    assert total < 0.25 * len(ranking.names) * 24 * 60
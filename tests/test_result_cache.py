@@ -0,0 +1,41 @@
+import os
+
+from eth_tools.room_allocation import result_cache
+from eth_tools.room_allocation.result_cache import ResultCache
+
+
+def test_directory_is_scanned_only_to_evict(tmp_path, monkeypatch):
+    scans = []
+    scandir = os.scandir
+
+    def counting_scandir(path):
+        scans.append(path)
+        return scandir(path)
+
+    monkeypatch.setattr(result_cache.os, "scandir", counting_scandir)
+
+    cache = ResultCache(max_entries=1, directory=str(tmp_path), max_files=10)
+    assert scans == []
+    for i in range(30):
+        cache.put(f"key {i}", [i])
+        cache.put(f"key {i}", [i])  # Overwriting does not add a file
+        assert len(os.listdir(tmp_path)) <= 10 + 1  # And the counter file
+    assert len(scans) < 1 + 30 // 2
+
+    # Other processes read the count instead of listing the directory
+    scans.clear()
+    ResultCache(directory=str(tmp_path), max_files=20).put("key 30", [30])
+    assert scans == []
+
+    # The most recently used searches are kept, also for a new process
+    assert ResultCache(directory=str(tmp_path)).get("key 29") == [29]
+    assert ResultCache(directory=str(tmp_path)).get("key 0") is None
+
+
+def test_count_starts_from_existing_files(tmp_path):
+    cache = ResultCache(directory=str(tmp_path), max_files=10)
+    for i in range(10):
+        cache.put(f"key {i}", [i])
+    cache = ResultCache(directory=str(tmp_path), max_files=10)
+    cache.put("key 10", [10])
+    assert len([name for name in os.listdir(tmp_path) if name.endswith(".json")]) == 9
@@ -0,0 +1,79 @@
+import datetime
+
+import numpy as np
+import pytest
+
+from eth_tools.room_allocation.catalog import room_name
+from eth_tools.room_allocation.room import Room
+from eth_tools.room_allocation.scoring import score_rooms, top_k
+from eth_tools.room_allocation.scoring_config import DEFAULT_SCORING
+from tests.conftest import LOCATION, at
+
+WINDOWS = [
+    (at(day, hour, minute), at(day, hour, minute) + datetime.timedelta(hours=hours))
+    for day in (0, 2)
+    for hour, minute in ((6, 0), (9, 30), (13, 15), (17, 45), (21, 0))
+    for hours in (1, 4)
+]
+
+
+@pytest.mark.parametrize("location", [LOCATION, "Hönggerberg"])
+@pytest.mark.parametrize("window", WINDOWS, ids=lambda window: window[0].isoformat())
+def test_score_rooms_matches_room_get_score(fixture, store, catalog, location, window):
+    candidates = sorted(catalog.rooms, key=room_name)
+    scores = dict(score_rooms(candidates, location, window, store))
+
+    expected = {
+        room_name(info): Room.from_info(info, fixture.rooms_dir, fixture.room_info).get_score(
+            location, *window
+        )
+        for info in candidates
+    }
+    assert scores == expected  # Bit-identical, not approximately equal
+
+
+def test_zero_weight_ignores_unknown_distance(fixture, store, catalog):
+    # An unknown location is infinitely far, which must not turn scores into NaN
+    buildings = sorted({info["building"] for info in catalog.rooms})
+    unknown = set(buildings[::2])
+    candidates = [
+        dict(info, location=dict(info["location"], areaDesc="Nowhere"))
+        if info["building"] in unknown
+        else info
+        for info in sorted(catalog.rooms, key=room_name)
+    ]
+    config = DEFAULT_SCORING.with_weights(dict(distance=0))
+    window = WINDOWS[2]
+    scores = dict(score_rooms(candidates, LOCATION, window, store, config=config))
+
+    expected = {
+        room_name(info): Room.from_info(info, fixture.rooms_dir, fixture.room_info).get_score(
+            LOCATION, *window, config=config
+        )
+        for info in candidates
+    }
+    assert scores == expected
+    assert np.isfinite(list(scores.values())).all()
+    # Weighted, the unknown distance ranks these rooms last instead
+    scores = dict(score_rooms(candidates, LOCATION, window, store))
+    far = [room_name(info) for info in candidates if info["building"] in unknown]
+    assert {scores[room] for room in far} == {-np.inf}
+
+
+def test_score_rooms_top_keeps_order_of_full_sort(store, catalog):
+    candidates = sorted(catalog.rooms, key=room_name)
+    window = WINDOWS[2]
+    scores = dict(score_rooms(candidates, LOCATION, window, store))
+    expected = sorted(scores, key=scores.get, reverse=True)[:10]
+    top = score_rooms(candidates, LOCATION, window, store, top=10)
+    assert [room for room, _ in top] == expected
+
+
+@pytest.mark.parametrize("k", [None, 0, 1, 3, 7, 20, 50])
+def test_top_k_breaks_ties_like_sorted(k):
+    rng = np.random.default_rng(0)
+    scores = rng.choice([10.0, 20.5, 20.5, 30.0, -1.0], size=40)
+    expected = sorted(range(len(scores)), key=lambda i: scores[i], reverse=True)
+    if k is not None:
+        expected = expected[:k]
+    assert top_k(scores, k).tolist() == expected
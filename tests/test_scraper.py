@@ -0,0 +1,162 @@
+import json
+import logging
+import os
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib import parse
+
+import pytest
+
+from eth_tools.room_allocation import scraper
+from eth_tools.room_allocation.scraper import (
+    download_json,
+    download_room_allocations,
+    load_room_file,
+)
+
+FROM_DATE, TO_DATE = "2024-03-04", "2024-03-11"
+ALLOCATION = [
+    dict(
+        date_from="2024-03-04T08:00:00",
+        date_to="2024-03-04T10:00:00",
+        belegungsserie=dict(belegungstyp=1),
+    )
+]
+
+
+class StubServer(ThreadingHTTPServer):
+    """Room endpoint answering every room with its queued responses, the last one repeats.
+
+    A response is (status, headers, body), a body of None answers the allocation, or a
+    function of the request headers returning the response.
+    """
+
+    def __init__(self):
+        super().__init__(("127.0.0.1", 0), StubHandler)
+        self.responses = {}
+        self.requests = []  # (room, request headers)
+
+    @property
+    def base_url(self) -> str:
+        return f"http://127.0.0.1:{self.server_address[1]}/bin/ethz/roominfo?path=/rooms/"
+
+    def requests_of(self, room: str) -> list:
+        return [headers for requested, headers in self.requests if requested == room]
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        path = parse.parse_qs(parse.urlsplit(self.path).query)["path"][0]
+        room = path.split("/")[2]
+        self.server.requests.append((room, dict(self.headers)))
+        queue = self.server.responses[room]
+        response = queue.pop(0) if len(queue) > 1 else queue[0]
+        if callable(response):
+            response = response(self.headers)
+        status, headers, body = response
+        body = json.dumps(ALLOCATION if body is None else body).encode("utf-8")
+        self.send_response(status)
+        for name, value in headers.items():
+            self.send_header(name, value)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def server(monkeypatch):
+    monkeypatch.setattr(scraper, "RETRY_BACKOFF", 0.01)
+    server = StubServer()
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def download(server, output_dir, rooms, **kwargs):
+    return download_room_allocations(
+        rooms, FROM_DATE, TO_DATE, str(output_dir), base_url=server.base_url, **kwargs
+    )
+
+
+def test_retries_honour_retry_after(server, tmp_path):
+    server.responses = {
+        "A 0 1": [(503, {"Retry-After": "1"}, {}), (200, {}, None)],
+        "B 0 1": [(429, {"Retry-After": "1"}, {}), (200, {}, None)],
+    }
+    start = time.monotonic()
+    downloads = download(server, tmp_path, ["A 0 1", "B 0 1"])
+    assert time.monotonic() - start >= 1  # Waited Retry-After, not the short backoff
+
+    assert sorted(downloads) == ["A 0 1", "B 0 1"]
+    for room, room_download in downloads.items():
+        assert room_download.changed
+        assert len(server.requests_of(room)) == 2
+        metadata, slots = load_room_file(room_download.filepath)
+        assert metadata["room"] == room
+        assert len(slots) == 1
+
+
+def test_permanent_client_error_is_dropped_and_logged(server, tmp_path, caplog):
+    server.responses = {"A 0 1": [(200, {}, None)], "C 0 1": [(404, {}, {})]}
+    with caplog.at_level(logging.ERROR):
+        downloads = download(server, tmp_path, ["A 0 1", "C 0 1"])
+
+    assert list(downloads) == ["A 0 1"]
+    assert len(server.requests_of("C 0 1")) == 1  # Not retried
+    assert "Failed to download room C 0 1" in caplog.text
+    assert sorted(os.listdir(tmp_path)) == ["A-0-1.json"]  # No partial or temporary file
+
+
+def test_unchanged_responses_are_not_written(server, tmp_path):
+    def conditional(headers):
+        if headers.get("If-None-Match") == '"v1"':
+            return 304, {"ETag": '"v1"'}, {}
+        return 200, {"ETag": '"v1"'}, None
+
+    server.responses = {"A 0 1": [conditional], "B 0 1": [(200, {}, None)]}
+    first = download(server, tmp_path, ["A 0 1", "B 0 1"])
+    assert all(room_download.changed for room_download in first.values())
+    mtimes = {room: os.stat(d.filepath).st_mtime_ns for room, d in first.items()}
+
+    metadata = {room: room_download.metadata for room, room_download in first.items()}
+    second = download(server, tmp_path, ["A 0 1", "B 0 1"], metadata=metadata)
+
+    # A: 304 on the ETag, B: no validators but the same content hash
+    assert server.requests_of("A 0 1")[-1]["If-None-Match"] == '"v1"'
+    assert "If-None-Match" not in server.requests_of("B 0 1")[-1]
+    for room, room_download in second.items():
+        assert not room_download.changed
+        assert room_download.metadata["validators"] == metadata[room]["validators"]
+        assert os.stat(room_download.filepath).st_mtime_ns == mtimes[room]
+    assert sorted(os.listdir(tmp_path)) == ["A-0-1.json", "B-0-1.json"]
+
+
+def test_missing_files_are_downloaded_unconditionally(server, tmp_path):
+    def conditional(headers):
+        if headers.get("If-None-Match") == '"v1"':
+            return 304, {"ETag": '"v1"'}, {}
+        return 200, {"ETag": '"v1"'}, None
+
+    server.responses = {"A 0 1": [conditional]}
+    first = download(server, tmp_path, ["A 0 1"])
+    os.remove(first["A 0 1"].filepath)  # E.g. evicted by the horizon
+
+    metadata = {"A 0 1": first["A 0 1"].metadata}
+    second = download(server, tmp_path, ["A 0 1"], metadata=metadata)
+    assert "If-None-Match" not in server.requests_of("A 0 1")[-1]
+    assert second["A 0 1"].changed
+    assert load_room_file(second["A 0 1"].filepath)[0]["room"] == "A 0 1"
+
+    # Same for the synchronous download
+    url = server.base_url + "A%200%201/allocations"
+    filepath = str(tmp_path / "room.json")
+    validators = dict(url=url, etag='"v1"', last_modified=None, content_hash=None)
+    assert download_json(url, filepath, "room_allocation", validators=validators) == filepath
+    assert "If-None-Match" not in server.requests_of("A 0 1")[-1]
+    assert len(load_room_file(filepath)[1]) == 1
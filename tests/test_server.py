@@ -0,0 +1,139 @@
+import json
+import threading
+from http.client import HTTPConnection
+from urllib.parse import urlencode
+
+import pytest
+
+from eth_tools.room_allocation.server import SearchServer
+from eth_tools.room_allocation.service import RoomFinder
+from eth_tools.room_allocation.spreading import LoadSpreader
+from tests.conftest import LOCATION
+
+
+@pytest.fixture
+def server(store, catalog):
+    finder = RoomFinder(spreader=LoadSpreader(path=":memory:"))
+    finder._swap(catalog, store)
+    finder.refreshes = []
+    finder.refresh_in_background = lambda rooms=None, window=None: finder.refreshes.append(
+        (rooms, window)
+    )
+    server = SearchServer(("127.0.0.1", 0), finder)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def request(server, method: str, path: str, body=None):
+    connection = HTTPConnection(*server.server_address, timeout=10)
+    try:
+        connection.request(method, path, body=body)
+        response = connection.getresponse()
+        return response.status, json.loads(response.read())
+    finally:
+        connection.close()
+
+
+def search(server, **params):
+    return request(server, "GET", f"/search?{urlencode(dict(location=LOCATION, **params))}")
+
+
+def search_results(server, **params):
+    status, payload = search(server, **params)
+    assert status == 200
+    return [(result["room"], result["score"]) for result in payload["results"]]
+
+
+def test_search_within_coverage(server):
+    status, payload = search(server, when="2024-03-05T10:00:00", top=3)
+    assert status == 200
+    assert len(payload["results"]) == 3
+    assert server.finder.refreshes == []
+
+
+@pytest.mark.parametrize("when", ["2024-03-20T10:00:00", "2024-02-01T10:00:00"])
+def test_search_beyond_coverage_is_unavailable(server, when):
+    status, payload = search(server, when=when)
+    assert status == 503
+    assert "not covered" in payload["error"]
+
+    # The candidates are downloaded in the background for the window
+    [(rooms, window)] = server.finder.refreshes
+    assert rooms and window[0].strftime("%Y-%m-%dT%H:%M:%S") == when
+
+    queries = [
+        dict(location=LOCATION, when="2024-03-05T10:00:00"),
+        dict(location=LOCATION, when=when),
+    ]
+    assert request(server, "POST", "/batch", json.dumps(queries))[0] == 503
+
+
+def test_search_before_the_first_refresh_is_unavailable(server, catalog):
+    server.finder._swap(catalog, None)  # Nothing downloaded yet
+    status, payload = search(server)
+    assert status == 503
+    [(rooms, _)] = server.finder.refreshes
+    assert len(rooms) == len(catalog.select(LOCATION))
+
+
+@pytest.mark.parametrize(
+    "body",
+    [
+        "x",
+        "5",
+        '"x"',
+        "[1]",
+        '["x"]',
+        "{}",
+        '[{"location": 5}]',
+        '[{"location": "Zürich Zentrum", "duration": [1]}]',
+        '[{"location": "Zürich Zentrum", "when": 5}]',
+        '[{"location": "Zürich Zentrum", "building": {"a": 1}}]',
+        '{"queries": {}}',
+        '{"queries": [], "scoring": 5}',
+        '{"queries": [], "scoring": {"weights": "x"}}',
+        '{"queries": [], "scoring": {"type_scores": [1]}}',
+        '{"queries": [], "weights": [1, 2]}',
+        '{"queries": [], "weights": 5}',
+        '{"queries": [], "spread": "yes"}',
+        '{"queries": [], "top": 5}',
+    ],
+)
+def test_batch_rejects_invalid_bodies(server, body):
+    status, payload = request(server, "POST", "/batch", body.encode("utf-8"))
+    assert status == 400
+    assert payload["error"]
+    # The handler survived
+    assert request(server, "GET", "/health")[0] == 200
+
+
+def test_batch_with_scoring_and_spread(server):
+    queries = [dict(location=LOCATION, when="2024-03-05T10:00:00", top=5)]
+
+    def batch(**options):
+        body = json.dumps(dict(queries=queries, **options))
+        status, payload = request(server, "POST", "/batch", body)
+        assert status == 200
+        [results] = payload["results"]
+        return [(result["room"], result["score"]) for result in results]
+
+    default = batch()
+    assert default == search_results(server, when="2024-03-05T10:00:00", top=5)
+    assert batch(weights=[1, 0, 0, 0, 0, 0]) != default
+    # The scoring object replaces the config of the server, weights override it
+    seats = [0, 0, 0, 0, 0, 1]
+    assert batch(scoring=dict(weights=seats)) == batch(weights=seats)
+    assert batch(scoring=dict(weights=seats), weights=[1, 0, 0, 0, 0, 0]) == batch(
+        weights=[1, 0, 0, 0, 0, 0]
+    )
+    assert search_results(
+        server, when="2024-03-05T10:00:00", top=5, scoring=json.dumps(dict(weights=seats))
+    ) == batch(weights=seats)
+
+    # Spread lowers the rooms recommended before, as for a single search
+    first = batch(spread=True)
+    second = batch(spread=True)
+    assert [score for _, score in first] == [score for _, score in default]
+    assert second != first
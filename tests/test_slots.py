@@ -0,0 +1,58 @@
+import os
+
+import numpy as np
+import pytest
+
+from eth_tools.room_allocation.allocations import AllocationStore
+from eth_tools.room_allocation.scraper import load_room_allocation
+from eth_tools.room_allocation.slots import Slot, SlotType
+
+
+def record(belegungstyp=None) -> dict:
+    slot = dict(date_from="2024-03-04T08:00:00", date_to="2024-03-04T09:30:00")
+    if belegungstyp is not None:
+        slot["belegungsserie"] = dict(belegungstyp=belegungstyp)
+    return slot
+
+
+@pytest.mark.parametrize(
+    "belegungstyp, slot_type",
+    [
+        (7, SlotType.FREE),
+        (8, SlotType.CLOSED),
+        (15, SlotType.WORKSPACE),
+        (1, SlotType.UNKNOWN),
+        (99, SlotType.UNKNOWN),
+        (None, SlotType.UNKNOWN),
+    ],
+)
+def test_slot_types(belegungstyp, slot_type):
+    slot = Slot.from_record(record(belegungstyp))
+    assert slot.type is slot_type
+    assert slot.belegungstyp == (-1 if belegungstyp is None else belegungstyp)
+    assert (slot.start, slot.end) == (28492320, 28492410)
+    assert slot.is_free == (slot_type in (SlotType.FREE, SlotType.WORKSPACE))
+
+
+def test_other_types_do_not_create_members():
+    Slot.from_record(record(42))
+    assert [member.value for member in SlotType] == [-1, 7, 8, 15]
+    with pytest.raises(ValueError):
+        SlotType(42)
+    assert repr(Slot.from_record(record(42))).endswith(", TYPE_42)")
+
+
+def test_store_of_slots_equals_store_of_files(fixture):
+    filepaths = sorted(
+        os.path.join(fixture.rooms_dir, filename) for filename in os.listdir(fixture.rooms_dir)
+    )[:10]
+    allocations = {
+        os.path.basename(filepath): load_room_allocation(filepath) for filepath in filepaths
+    }
+    from_slots = AllocationStore.from_allocations(allocations)
+    from_files = AllocationStore.from_files(filepaths, workers=1)
+    for column in ("start", "end", "typ"):
+        assert np.array_equal(
+            np.sort(getattr(from_slots, column)), np.sort(getattr(from_files, column))
+        )
+    assert set(from_files.typ.tolist()) - {7, 8, 15}  # Other types are kept
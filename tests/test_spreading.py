@@ -0,0 +1,48 @@
+import pytest
+
+from eth_tools.room_allocation.spreading import LoadSpreader
+from eth_tools.settings import SPREAD_HALF_LIFE
+
+HALF_LIFE = SPREAD_HALF_LIFE.total_seconds()
+NOW = 1_700_000_000.0
+SCORES = [("A", 90.0), ("B", 89.0), ("C", 88.0), ("D", 60.0)]
+
+
+@pytest.fixture
+def spreader():
+    spreader = LoadSpreader(path=":memory:")
+    yield spreader
+    spreader.close()
+
+
+def test_counts_halve_after_one_half_life(spreader):
+    spreader.record(["A", "A", "B"], NOW)
+    spreader.record(["A"], NOW)
+    assert spreader.loads(["A", "B", "C"], NOW) == pytest.approx(dict(A=3, B=1))
+    assert spreader.loads(["A", "B"], NOW + HALF_LIFE) == pytest.approx(dict(A=1.5, B=0.5))
+    assert spreader.loads(["A"], NOW + 3 * HALF_LIFE) == pytest.approx(dict(A=3 / 8))
+
+
+def test_counts_survive_rescaling(spreader):
+    spreader.record(["A"], NOW)
+    later = NOW + 1000 * HALF_LIFE  # Moves the landmark
+    spreader.record(["B"], later)
+    assert spreader.loads(["A", "B"], later) == pytest.approx(dict(B=1))
+    assert spreader.loads(["B"], later + HALF_LIFE) == pytest.approx(dict(B=0.5))
+
+
+def test_recommend_demotes_just_recommended_rooms(spreader):
+    first = spreader.recommend(SCORES, top=1, now=NOW)
+    assert first == [("A", 90.0)]
+    second = spreader.recommend(SCORES, top=1, now=NOW + 1)
+    assert [room for room, _ in second] == ["B"]
+    third = spreader.recommend(SCORES, top=2, now=NOW + 2)
+    assert [room for room, _ in third] == ["C", "A"]
+    assert third[1][1] == pytest.approx(90 - spreader.penalty(2 ** (-2 / HALF_LIFE)))
+    # Far below the top, never recommended
+    assert spreader.loads(["D"], NOW + 2) == {}
+
+
+def test_recommend_without_record(spreader):
+    spreader.recommend(SCORES, top=2, now=NOW, record=False)
+    assert spreader.loads(["A", "B"], NOW) == {}